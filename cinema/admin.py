@@ -1,9 +1,14 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.utils import timezone
 from .models import (
     User, City, Genre, Movie, Cinema, Hall,
-    ShowTime, Ticket, Review, Promotion, Rule
+    ShowTime, Ticket, Review, Promotion, PriceRule, Rule, RemoteImage,
+    MovieSimilarity, RecommenderRun, Job, TicketEvent
 )
+from .forms import HallForm
+from .moderation import apply_bulk_action, refresh_rating_summaries
+from .ticket_events import log_event, log_status
 
 
 @admin.register(User)
@@ -53,9 +58,11 @@ class CinemaAdmin(admin.ModelAdmin):
 
 @admin.register(Hall)
 class HallAdmin(admin.ModelAdmin):
+    form = HallForm
     list_display = ['name', 'cinema', 'rows', 'seats_per_row', 'total_seats']
     list_filter = ['cinema']
     search_fields = ['name', 'cinema__name']
+    readonly_fields = ['capacity']
 
 
 @admin.register(ShowTime)
@@ -66,12 +73,39 @@ class ShowTimeAdmin(admin.ModelAdmin):
     date_hierarchy = 'start_time'
 
 
+class TicketEventInline(admin.TabularInline):
+    model = TicketEvent
+    fields = ['created_at', 'kind', 'price', 'actor']
+    readonly_fields = fields
+    ordering = ['created_at', 'id']
+    extra = 0
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Ticket)
 class TicketAdmin(admin.ModelAdmin):
-    list_display = ['id', 'showtime', 'user', 'row', 'seat', 'price', 'status', 'booking_date']
+    list_display = ['id', 'showtime', 'user', 'row', 'seat', 'price', 'status', 'booking_date', 'checked_in_at']
     list_filter = ['status', 'booking_date']
     search_fields = ['user__username', 'showtime__movie__title']
     date_hierarchy = 'booking_date'
+    readonly_fields = ['checked_in_at', 'checked_in_by']
+    inlines = [TicketEventInline]
+    
+    def save_model(self, request, obj, form, change):
+        """Смена статуса или цены в админке попадает в журнал билета"""
+        super().save_model(request, obj, form, change)
+        if not change:
+            log_event(obj, TicketEvent.BOOKED, request.user, obj.price)
+            if obj.status != 'booked':
+                log_status(obj, request.user)
+            return
+        if 'status' in form.changed_data:
+            log_status(obj, request.user)
+        if 'price' in form.changed_data:
+            log_event(obj, TicketEvent.PRICE, request.user, obj.price)
 
 
 @admin.register(Review)
@@ -82,12 +116,27 @@ class ReviewAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
     actions = ['approve_reviews', 'disapprove_reviews']
     
+    def save_model(self, request, obj, form, change):
+        if 'is_approved' in form.changed_data:
+            obj.moderated_at = timezone.now()
+        super().save_model(request, obj, form, change)
+        refresh_rating_summaries([obj.movie_id])
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        refresh_rating_summaries([obj.movie_id])
+    
+    def delete_queryset(self, request, queryset):
+        movie_ids = set(queryset.values_list('movie_id', flat=True))
+        super().delete_queryset(request, queryset)
+        refresh_rating_summaries(movie_ids)
+    
     def approve_reviews(self, request, queryset):
-        queryset.update(is_approved=True)
+        apply_bulk_action('approve', queryset.values_list('pk', flat=True))
     approve_reviews.short_description = 'Одобрить выбранные отзывы'
     
     def disapprove_reviews(self, request, queryset):
-        queryset.update(is_approved=False)
+        apply_bulk_action('reject', queryset.values_list('pk', flat=True))
     disapprove_reviews.short_description = 'Снять одобрение с выбранных отзывов'
 
 
@@ -99,9 +148,69 @@ class PromotionAdmin(admin.ModelAdmin):
     date_hierarchy = 'start_date'
 
 
+@admin.register(PriceRule)
+class PriceRuleAdmin(admin.ModelAdmin):
+    list_display = ['name', 'adjustment_percent', 'weekdays', 'time_from', 'time_to', 'hall', 'occupancy_from', 'is_active']
+    list_filter = ['is_active', 'hall__cinema']
+    search_fields = ['name']
+
+
 @admin.register(Rule)
 class RuleAdmin(admin.ModelAdmin):
     list_display = ['title', 'order', 'is_active']
     list_filter = ['is_active']
     search_fields = ['title', 'content']
     ordering = ['order', 'title']
+
+
+@admin.register(RemoteImage)
+class RemoteImageAdmin(admin.ModelAdmin):
+    list_display = ['url', 'file', 'checked_at']
+    search_fields = ['url', 'file']
+    readonly_fields = ['file', 'etag', 'last_modified', 'checked_at']
+
+
+@admin.register(MovieSimilarity)
+class MovieSimilarityAdmin(admin.ModelAdmin):
+    list_display = ['movie', 'rank', 'similar', 'score']
+    list_filter = ['movie']
+    search_fields = ['movie__title', 'similar__title']
+
+
+@admin.register(RecommenderRun)
+class RecommenderRunAdmin(admin.ModelAdmin):
+    list_display = ['started_at', 'finished_at', 'full', 'interactions', 'movies_updated']
+    list_filter = ['full']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'task', 'queue', 'status', 'attempts', 'run_at', 'locked_by']
+    list_filter = ['status', 'queue', 'task']
+    readonly_fields = ['attempts', 'locked_by', 'locked_at', 'last_error', 'created_at']
+    actions = ['retry_jobs']
+    
+    def retry_jobs(self, request, queryset):
+        queryset.exclude(status='running').update(
+            status='pending', run_at=timezone.now(), attempts=0, last_error=''
+        )
+    retry_jobs.short_description = 'Повторить выбранные задачи'
+
+
+@admin.register(TicketEvent)
+class TicketEventAdmin(admin.ModelAdmin):
+    """Журнал только для чтения"""
+    list_display = ['id', 'ticket_id', 'kind', 'price', 'actor', 'created_at']
+    list_filter = ['kind']
+    search_fields = ['=ticket__id']
+    date_hierarchy = 'created_at'
+    list_select_related = ['actor']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
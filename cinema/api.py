@@ -0,0 +1,425 @@
+"""
+JSON API для сайта и мобильного приложения.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.db import connections
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from .broker import get_broker
+from .checkin import ACCEPTED, INVALID, NOT_FOUND, check_in, sync_scans
+from .geo import nearest_cinemas
+from .models import Cinema, ShowTime
+from .occupancy import (
+    find_showtimes_with_seats, get_occupancy, get_versions, seat_changes, seat_channel, version_key,
+)
+from .seat_selection import best_block
+from .sessions import get_selected_city_id
+from .waiting_room import get_position, queue_status
+
+DEFAULT_RADIUS_KM = 10
+MAX_LIMIT = 100
+MAX_ADJACENT_SEATS = 20
+
+
+class ApiError(ValueError):
+    """Некорректные параметры запроса (ответ 400)"""
+
+
+def _float_param(request, name, minimum, maximum, default=None):
+    value = request.GET.get(name)
+    if value in (None, ''):
+        if default is None:
+            raise ApiError(f'Не указан параметр {name}')
+        return default
+    try:
+        value = float(value)
+    except ValueError:
+        raise ApiError(f'Параметр {name} должен быть числом')
+    if not minimum <= value <= maximum:
+        raise ApiError(f'Параметр {name} должен быть от {minimum} до {maximum}')
+    return value
+
+
+def _int_param(request, name, default, maximum=MAX_LIMIT):
+    return int(_float_param(request, name, 1, maximum, default))
+
+
+def api_view(view_func):
+    """GET-представление, возвращающее dict; ApiError - ответ 400, Http404 - 404"""
+    @require_GET
+    def wrapper(request, *args, **kwargs):
+        try:
+            return JsonResponse(view_func(request, *args, **kwargs))
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except Http404:
+            return JsonResponse({'error': 'Не найдено'}, status=404)
+    wrapper.__name__ = view_func.__name__
+    wrapper.__doc__ = view_func.__doc__
+    return wrapper
+
+
+def staff_api_view(view_func):
+    """
+    POST-представление для сотрудников: тело - JSON-объект, передается
+    вторым аргументом; ApiError - ответ 400
+    """
+    @require_POST
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Требуется авторизация'}, status=401)
+        if request.user.role not in ['staff', 'admin']:
+            return JsonResponse({'error': 'Нет доступа'}, status=403)
+        try:
+            payload = json.loads(request.body or b'{}')
+            if not isinstance(payload, dict):
+                raise ApiError('Ожидается JSON-объект')
+            return view_func(request, payload, *args, **kwargs)
+        except ValueError as e:
+            # ApiError и ошибки разбора JSON
+            message = str(e) if isinstance(e, ApiError) else 'Некорректный JSON'
+            return JsonResponse({'error': message}, status=400)
+    wrapper.__name__ = view_func.__name__
+    wrapper.__doc__ = view_func.__doc__
+    return wrapper
+
+
+def _location(request):
+    latitude = _float_param(request, 'lat', -90, 90)
+    longitude = _float_param(request, 'lon', -180, 180)
+    radius = _float_param(request, 'radius', 0.1, 500, DEFAULT_RADIUS_KM)
+    return latitude, longitude, radius
+
+
+@api_view
+def nearest_cinemas_api(request):
+    """Ближайшие кинотеатры: ?lat=&lon=&radius=км&limit="""
+    latitude, longitude, radius = _location(request)
+    found = nearest_cinemas(latitude, longitude, radius, _int_param(request, 'limit', 10))
+    cinemas = Cinema.objects.select_related('city').in_bulk([cinema_id for cinema_id, _ in found])
+    return {
+        'cinemas': [
+            {
+                'id': cinema_id,
+                'name': cinemas[cinema_id].name,
+                'city': cinemas[cinema_id].city.name,
+                'address': cinemas[cinema_id].address,
+                'distance_km': distance,
+            }
+            for cinema_id, distance in found if cinema_id in cinemas
+        ]
+    }
+
+
+@api_view
+def nearest_showtimes_api(request):
+    """Ближайшие по времени сеансы в кинотеатрах в радиусе: ?lat=&lon=&radius=&movie=&limit="""
+    latitude, longitude, radius = _location(request)
+    distances = dict(nearest_cinemas(latitude, longitude, radius, MAX_LIMIT))
+    showtimes = ShowTime.objects.filter(
+        hall__cinema_id__in=distances,
+        is_active=True,
+        start_time__gt=timezone.now()
+    ).select_related('movie', 'hall__cinema').order_by('start_time')
+    if request.GET.get('movie'):
+        showtimes = showtimes.filter(movie_id=_int_param(request, 'movie', None, maximum=2 ** 63))
+    return {
+        'showtimes': [
+            {
+                'id': showtime.id,
+                'movie': {'id': showtime.movie_id, 'title': showtime.movie.title},
+                'cinema': {
+                    'id': showtime.hall.cinema_id,
+                    'name': showtime.hall.cinema.name,
+                    'distance_km': distances[showtime.hall.cinema_id],
+                },
+                'hall': showtime.hall.name,
+                'start_time': timezone.localtime(showtime.start_time).isoformat(),
+                'price': str(showtime.price),
+            }
+            for showtime in showtimes[:_int_param(request, 'limit', 20)]
+        ]
+    }
+
+
+@api_view
+def available_showtimes_api(request):
+    """
+    Ближайшие сеансы фильма, где есть N соседних свободных мест:
+    ?movie=&seats=N&city=&limit= (город по умолчанию - выбранный на сайте)
+    """
+    movie_id = _int_param(request, 'movie', None, maximum=2 ** 63)
+    seats = _int_param(request, 'seats', 1, maximum=MAX_ADJACENT_SEATS)
+    city_id = request.GET.get('city') and _int_param(request, 'city', None, maximum=2 ** 63)
+    found = find_showtimes_with_seats(
+        movie_id,
+        seats,
+        _int_param(request, 'limit', 5, maximum=20),
+        city_id or get_selected_city_id(request),
+    )
+    return {
+        'showtimes': [
+            {
+                'id': showtime.id,
+                'cinema': {'id': showtime.hall.cinema_id, 'name': showtime.hall.cinema.name},
+                'hall': showtime.hall.name,
+                'start_time': timezone.localtime(showtime.start_time).isoformat(),
+                'row': block.row,
+                'seats': block.seats,
+            }
+            for showtime, block in found
+        ]
+    }
+
+
+@api_view
+def best_seats_api(request, pk):
+    """Лучший блок из N соседних свободных мест сеанса: ?seats=N"""
+    showtime = get_object_or_404(
+        ShowTime.objects.select_related('hall'),
+        pk=pk,
+        is_active=True,
+        start_time__gt=timezone.now()
+    )
+    seats = _int_param(request, 'seats', 1, maximum=MAX_ADJACENT_SEATS)
+    occupancy = get_occupancy(showtime)
+    block = best_block(occupancy, seats)
+    return {
+        'showtime': showtime.id,
+        'available': occupancy.available,
+        'block': {
+            'row': block.row,
+            'seats': block.seats,
+            'score': block.score,
+        } if block else None,
+    }
+
+
+@cache_control(private=True, no_store=True)
+@api_view
+def queue_status_api(request, pk):
+    """Место зрителя в очереди на бронирование; читает только кэш"""
+    # Пользователь - из сессии, без запроса к базе
+    user_id = request.session.get(SESSION_KEY)
+    if user_id is None:
+        raise ApiError('Требуется авторизация')
+    position = get_position(request, pk, int(user_id))
+    status = queue_status(pk, position) if position else None
+    if status is None:
+        raise Http404
+    return {
+        'admitted': status.admitted,
+        'ahead': status.ahead,
+        'wait_seconds': status.wait_seconds,
+        # Пропуск выдает страница очереди
+        'redirect': reverse('cinema:waiting_room', args=[pk]) if status.admitted else None,
+    }
+
+
+def _seat_map_etag(request, pk):
+    version = cache.get(version_key(pk))
+    # Счетчик заводится только для существующих сеансов
+    if version is None:
+        if not ShowTime.objects.filter(pk=pk).exists():
+            return None
+        version = get_versions([pk])[pk]
+    return f'{pk}.{version}'
+
+
+@condition(etag_func=_seat_map_etag)
+@cache_control(private=True, no_cache=True)
+@api_view
+def seat_map_api(request, pk):
+    """
+    Занятость мест сеанса: битовая строка занятых мест и версия.
+    ?since=версия - только места, изменившиеся после нее (если журнал
+    изменений позволяет, иначе полный снимок с full=true).
+    """
+    showtime = get_object_or_404(ShowTime.objects.select_related('hall'), pk=pk)
+    if request.GET.get('since'):
+        since = _int_param(request, 'since', None, maximum=2 ** 63)
+        version = get_versions([showtime.pk])[showtime.pk]
+        changes = seat_changes(showtime.pk, since, version)
+        if changes is not None:
+            return {
+                'showtime': showtime.pk,
+                'version': version,
+                'full': False,
+                'changes': [{'row': row, 'seat': seat, 'taken': taken} for row, seat, taken in changes],
+            }
+    return _seat_snapshot(showtime)
+
+
+def _seat_snapshot(showtime):
+    occupancy = get_occupancy(showtime)
+    return {
+        'showtime': showtime.pk,
+        'version': occupancy.version,
+        'full': True,
+        'rows': occupancy.rows,
+        'seats_per_row': occupancy.seats_per_row,
+        'layout': occupancy.layout_code,
+        'booked': occupancy.packed(),
+    }
+
+
+def _sse(event, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _initial_seat_event(pk, last_event_id):
+    """
+    (версия, первое событие потока): изменения после Last-Event-ID, если
+    журнал их хранит, иначе полный снимок.
+    """
+    showtime = get_object_or_404(ShowTime.objects.select_related('hall'), pk=pk)
+    if last_event_id and last_event_id.isdigit():
+        version = get_versions([showtime.pk])[showtime.pk]
+        changes = seat_changes(showtime.pk, int(last_event_id), version)
+        if changes is not None:
+            data = {
+                'showtime': showtime.pk,
+                'version': version,
+                'full': False,
+                'changes': [{'row': row, 'seat': seat, 'taken': taken} for row, seat, taken in changes],
+            }
+            return version, _sse('changes', data, version)
+    data = _seat_snapshot(showtime)
+    return data['version'], _sse('snapshot', data, data['version'])
+
+
+async def _seat_stream(subscription, version, first):
+    try:
+        yield first
+        while not subscription.overflowed:
+            try:
+                message = await subscription.get(settings.SEAT_EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            # События до снимка в нем уже учтены
+            if message['version'] <= version:
+                continue
+            version = message['version']
+            yield _sse('seat', message, version)
+    finally:
+        subscription.close()
+
+
+async def seat_events_api(request, pk):
+    """
+    Живая схема зала (server-sent events): snapshot или changes (после
+    Last-Event-ID или ?since=версия) при подключении, затем seat на
+    каждое занятое или освобожденное место. Каждый открытый поток держит
+    поток ОС процесса, поэтому сверх SEAT_EVENTS_MAX_STREAMS отвечает 503,
+    и страница переходит на опрос.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    # Подписка до чтения состояния, чтобы не потерять события между ними
+    subscription = get_broker().subscribe(seat_channel(pk), settings.SEAT_EVENTS_MAX_STREAMS)
+    if subscription is None:
+        response = JsonResponse({'error': 'Слишком много подключений, схема обновляется опросом'}, status=503)
+        response['Retry-After'] = '60'
+        return response
+    try:
+        # После переподключения браузер сам присылает Last-Event-ID
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('since')
+        version, first = await sync_to_async(_initial_seat_event)(pk, last_event_id)
+    except Http404:
+        subscription.close()
+        return JsonResponse({'error': 'Не найдено'}, status=404)
+    finally:
+        # Поток запроса ждет, пока открыт поток событий; соединение с базой
+        # (его же брали сессия и аутентификация) ему больше не нужно
+        await sync_to_async(connections.close_all)()
+    response = StreamingHttpResponse(
+        _seat_stream(subscription, version, first),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+CHECKIN_STATUS_CODES = {ACCEPTED: 200, INVALID: 400, NOT_FOUND: 404}
+MAX_TOKEN_LENGTH = 100
+
+
+def _token(value):
+    if not isinstance(value, str) or not value or len(value) > MAX_TOKEN_LENGTH:
+        raise ApiError('Не указан токен билета')
+    return value
+
+
+def _checkin_showtime(payload):
+    """Сеанс, на который идет проверка (необязателен)"""
+    value = payload.get('showtime')
+    if value is None:
+        return None
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ApiError('Параметр showtime должен быть числом')
+    return value
+
+
+def _scanned_at(value):
+    if value is None:
+        return None
+    scanned_at = parse_datetime(value) if isinstance(value, str) else None
+    if scanned_at is None:
+        raise ApiError('scanned_at - дата и время в формате ISO 8601')
+    if timezone.is_naive(scanned_at):
+        scanned_at = timezone.make_aware(scanned_at)
+    return scanned_at
+
+
+@staff_api_view
+def checkin_api(request, payload):
+    """
+    Проход по билету: {"token": "KM1...", "showtime": id}. 200 - проход
+    разрешен, 409 - отказ (использован, отменен, другой сеанс), 400/404 -
+    недействительный или несуществующий билет.
+    """
+    result = check_in(_token(payload.get('token')), request.user, _checkin_showtime(payload))
+    return JsonResponse(result.as_dict(), status=CHECKIN_STATUS_CODES.get(result.status, 409))
+
+
+@staff_api_view
+def checkin_sync_api(request, payload):
+    """
+    Синхронизация офлайн-сканера: {"scans": [{"token": ..., "scanned_at":
+    ISO 8601}], "showtime": id}; результаты в порядке сканов.
+    """
+    scans = payload.get('scans')
+    if not isinstance(scans, list) or not scans:
+        raise ApiError('Не указаны сканы')
+    if len(scans) > settings.CHECKIN_SYNC_MAX_SCANS:
+        raise ApiError(f'Не больше {settings.CHECKIN_SYNC_MAX_SCANS} сканов за раз')
+    if not all(isinstance(scan, dict) for scan in scans):
+        raise ApiError('Скан - объект с полями token и scanned_at')
+    results = sync_scans(
+        [(_token(scan.get('token')), _scanned_at(scan.get('scanned_at'))) for scan in scans],
+        request.user,
+        _checkin_showtime(payload),
+    )
+    accepted = sum(result.accepted for result in results)
+    return JsonResponse({
+        'accepted': accepted,
+        'rejected': len(results) - accepted,
+        'results': [result.as_dict() for result in results],
+    })
@@ -5,3 +5,6 @@ class CinemaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cinema'
     verbose_name = 'Кинотеатр'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,131 @@
+"""
+Раздача событий подписчикам внутри процесса.
+
+Брокер держит для каждого канала множество подписок - очередей asyncio,
+по одной на открытое соединение, - и раскладывает по ним сообщения.
+Публиковать можно из любого потока: сообщение передается в цикл событий
+подписчика через ``call_soon_threadsafe``.
+
+Доставку публикаций брокерам процессов выполняет бэкенд
+(``SEAT_EVENTS_BACKEND``): он принимает ``publish`` и вызывает
+``deliver`` брокера в каждом процессе. ``LocalBackend`` доставляет сразу
+в своем процессе - этого достаточно для одного процесса ASGI-сервера.
+При нескольких процессах (воркеры gunicorn, ``run_worker``) события из
+других процессов до подписчика не доходят: страница продолжает опрашивать
+схему зала по версии, а бэкенд на общей шине (например, Redis pub/sub) с
+тем же интерфейсом подключается через настройку.
+
+Сам поток событий асинхронный, но стандартный ASGI-обработчик Django
+держит на каждый запрос свой поток для синхронных middleware (сессии,
+аутентификация) до конца ответа: открытое соединение стоит процессу
+простаивающий поток, около 280 КБ (``load_test_seat_events``). Поэтому
+число подписок процесса ограничено (``SEAT_EVENTS_MAX_STREAMS``), а
+сверх него страница опрашивает схему зала.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class LocalBackend:
+    """Публикации доставляются только в текущем процессе"""
+
+    def start(self, deliver):
+        self.deliver = deliver
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+
+class Subscription:
+    """Очередь сообщений канала для одного соединения"""
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Клиент не успевает читать: соединение закрывается, при
+            # переподключении он получит изменения или полный снимок
+            self.overflowed = True
+
+    async def get(self, timeout):
+        """Следующее сообщение; asyncio.TimeoutError, если его не было timeout секунд"""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    def __init__(self, backend, queue_size):
+        self.queue_size = queue_size
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+        self.backend = backend
+        backend.start(self.deliver)
+
+    def subscribe(self, channel, limit=None):
+        """
+        Подписка текущего цикла событий на канал или None, если в процессе
+        уже limit подписок.
+        """
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            if limit is not None and sum(map(len, self._subscriptions.values())) >= limit:
+                return None
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, channel, message):
+        self.backend.publish(channel, message)
+
+    def deliver(self, channel, message):
+        """Разложить сообщение по подпискам канала в этом процессе"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, message)
+            except RuntimeError:
+                # Цикл событий подписчика уже закрыт
+                self.unsubscribe(subscription)
+        return len(subscriptions)
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscriptions.get(channel, ()))
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Брокер процесса с бэкендом из настроек"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = import_string(settings.SEAT_EVENTS_BACKEND)()
+                _broker = Broker(backend, settings.SEAT_EVENTS_QUEUE_SIZE)
+    return _broker
@@ -0,0 +1,55 @@
+"""
+Кэш в таблице базы с атомарным ``incr``.
+
+Стандартный ``DatabaseCache`` наследует ``incr`` от ``BaseCache``: чтение и
+затем запись, так что два процесса получают одно и то же значение. На нем
+держатся номера очереди, версии занятости мест, пропуска и счетчики лимитов,
+поэтому здесь ``incr`` выполняется в одной транзакции: пустой UPDATE
+сначала блокирует строку ключа (в SQLite - запись в базу), затем значение
+читается и записывается, и конкурент ждет, пока транзакция не завершится.
+"""
+import base64
+import pickle
+
+from django.core.cache.backends.db import DatabaseCache as BaseDatabaseCache
+from django.db import connections, models, router, transaction
+from django.utils.timezone import now as tz_now
+
+
+class DatabaseCache(BaseDatabaseCache):
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        db = router.db_for_write(self.cache_model_class)
+        connection = connections[db]
+        quote_name = connection.ops.quote_name
+        table = quote_name(self._table)
+        cache_key, value_column, expires_column = map(quote_name, ('cache_key', 'value', 'expires'))
+
+        with transaction.atomic(using=db), connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET {expires_column} = {expires_column} WHERE {cache_key} = %s',
+                [key],
+            )
+            row = None
+            if cursor.rowcount:
+                cursor.execute(
+                    f'SELECT {value_column}, {expires_column} FROM {table} WHERE {cache_key} = %s',
+                    [key],
+                )
+                row = cursor.fetchone()
+            if row is None or self._expired(connection, row[1]):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(base64.b64decode(connection.ops.process_clob(row[0]).encode())) + delta
+            encoded = base64.b64encode(pickle.dumps(value, self.pickle_protocol)).decode('latin1')
+            cursor.execute(
+                f'UPDATE {table} SET {value_column} = %s WHERE {cache_key} = %s',
+                [encoded, key],
+            )
+        return value
+
+    def _expired(self, connection, expires):
+        # Дата из курсора приводится так же, как в DatabaseCache.get_many
+        expression = models.Expression(output_field=models.DateTimeField())
+        for converter in connection.ops.get_db_converters(expression) + expression.get_db_converters(connection):
+            expires = converter(expires, expression, connection)
+        return expires < tz_now()
@@ -0,0 +1,191 @@
+"""
+Проверка билетов на входе в зал.
+
+Подпись токена из QR-кода проверяется в памяти (``read_token``):
+поддельный билет или билет на другой сеанс отклоняется без обращения к
+базе. Проход отмечается одним условным UPDATE - он срабатывает, только
+если билет оплачен, еще не использован и его сеанс начинается не позже
+чем через ``CHECKIN_EARLY_MINUTES`` (или начался не раньше
+``CHECKIN_LATE_MINUTES`` назад), поэтому два контролера,
+одновременно сканирующие один билет, не пропустят двоих; в той же
+транзакции пишется событие в журнал билета. Лишний запрос делается
+только при отказе - чтобы объяснить его причину.
+
+Офлайн-режим: сканер без сети копит сканы со временем прохода и затем
+отправляет их пакетом в ``sync_scans``; повторы одного билета в пакете
+и билеты, уже прошедшие через другой вход, возвращаются как
+использованные.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .etickets import TicketTokenError, read_token
+from .models import ShowTime, Ticket
+from .ticket_events import log_check_ins
+
+ACCEPTED = 'accepted'
+USED = 'used'
+CANCELLED = 'cancelled'
+UNPAID = 'unpaid'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+WRONG_SHOWTIME = 'wrong_showtime'
+WRONG_TIME = 'wrong_time'
+
+MESSAGES = {
+    ACCEPTED: 'Проход разрешен',
+    USED: 'Билет уже использован',
+    CANCELLED: 'Билет отменен',
+    UNPAID: 'Билет не оплачен',
+    NOT_FOUND: 'Билет не найден',
+    INVALID: 'Недействительный QR-код',
+    WRONG_SHOWTIME: 'Билет на другой сеанс',
+    WRONG_TIME: 'Сеанс еще не скоро или уже прошел',
+}
+
+
+@dataclass(frozen=True)
+class CheckInResult:
+    status: str
+    ticket_id: int | None = None
+    checked_in_at: datetime | None = None
+
+    @property
+    def accepted(self):
+        return self.status == ACCEPTED
+
+    @property
+    def message(self):
+        return MESSAGES[self.status]
+
+    def as_dict(self):
+        return {
+            'status': self.status,
+            'accepted': self.accepted,
+            'message': self.message,
+            'ticket_id': self.ticket_id,
+            'checked_in_at': timezone.localtime(self.checked_in_at).isoformat() if self.checked_in_at else None,
+        }
+
+
+def _read(token, showtime_id):
+    """(id билета, id сеанса) или CheckInResult с отказом - без базы"""
+    try:
+        ticket_id, token_showtime = read_token(token)
+    except TicketTokenError:
+        return CheckInResult(INVALID)
+    if showtime_id is not None and token_showtime != showtime_id:
+        return CheckInResult(WRONG_SHOWTIME, ticket_id)
+    return ticket_id, token_showtime
+
+
+def _window(at):
+    """Границы начала сеансов, на которые пускают в момент at"""
+    return (
+        at - timedelta(minutes=settings.CHECKIN_LATE_MINUTES),
+        at + timedelta(minutes=settings.CHECKIN_EARLY_MINUTES),
+    )
+
+
+def _admit(ticket_id, showtime_id, staff, at):
+    # Сеанс - подзапросом по showtime_id, а не JOIN: условия на строку
+    # билета остаются в самом UPDATE и перепроверяются при конкуренции
+    return Ticket.objects.filter(
+        pk=ticket_id,
+        showtime__in=ShowTime.objects.filter(pk=showtime_id, start_time__range=_window(at)),
+        status='paid',
+        checked_in_at__isnull=True,
+    ).update(checked_in_at=at, checked_in_by=staff)
+
+
+def _rejection(ticket):
+    """Причина отказа по строке билета (dict из values) или None"""
+    if ticket is None:
+        return CheckInResult(NOT_FOUND)
+    if ticket['checked_in_at']:
+        return CheckInResult(USED, ticket['pk'], ticket['checked_in_at'])
+    if ticket['status'] == 'cancelled':
+        return CheckInResult(CANCELLED, ticket['pk'])
+    if ticket['status'] != 'paid':
+        return CheckInResult(UNPAID, ticket['pk'])
+    # Оплачен и не использован - не прошел по времени сеанса
+    return CheckInResult(WRONG_TIME, ticket['pk'])
+
+
+def _ticket_rows(pairs):
+    """{id билета: строка} для пар (билет, сеанс) из токенов"""
+    rows = Ticket.objects.filter(pk__in={ticket_id for ticket_id, _ in pairs}).values(
+        'pk', 'showtime_id', 'status', 'checked_in_at'
+    )
+    showtimes = dict(pairs)
+    # Токен с чужим сеансом не подделать, но билет могли перенести
+    return {row['pk']: row for row in rows if showtimes[row['pk']] == row['showtime_id']}
+
+
+def check_in(token, staff=None, showtime_id=None, at=None):
+    """
+    Пропустить по токену из QR-кода. showtime_id - сеанс, на который
+    идет проверка (None - любой из тех, на которые сейчас пускают).
+    """
+    parsed = _read(token, showtime_id)
+    if isinstance(parsed, CheckInResult):
+        return parsed
+    ticket_id, token_showtime = parsed
+    at = at or timezone.now()
+    with transaction.atomic():
+        if _admit(ticket_id, token_showtime, staff, at):
+            log_check_ins({ticket_id: at}, staff)
+            return CheckInResult(ACCEPTED, ticket_id, at)
+    rows = _ticket_rows([parsed])
+    return _rejection(rows.get(ticket_id))
+
+
+def sync_scans(scans, staff=None, showtime_id=None):
+    """
+    Провести пакет офлайн-сканов: [(токен, время скана или None)].
+    Результаты - в порядке сканов. Из повторов одного билета проходит
+    самый ранний скан, время в будущем заменяется текущим.
+    """
+    now = timezone.now()
+    results = [None] * len(scans)
+    first = {}
+    duplicates = []
+    for index, (token, scanned_at) in enumerate(scans):
+        parsed = _read(token, showtime_id)
+        if isinstance(parsed, CheckInResult):
+            results[index] = parsed
+            continue
+        at = min(scanned_at or now, now)
+        earlier = first.get(parsed[0])
+        if earlier is None or at < earlier[2]:
+            if earlier is not None:
+                duplicates.append((earlier[0], parsed[0]))
+            first[parsed[0]] = (index, parsed[1], at)
+        else:
+            duplicates.append((index, parsed[0]))
+
+    with transaction.atomic():
+        admitted = {
+            ticket_id
+            for ticket_id, (_, token_showtime, at) in first.items()
+            if _admit(ticket_id, token_showtime, staff, at)
+        }
+        log_check_ins({ticket_id: first[ticket_id][2] for ticket_id in admitted}, staff)
+    rejected = [(ticket_id, token_showtime) for ticket_id, (_, token_showtime, _) in first.items()
+                if ticket_id not in admitted]
+    rows = _ticket_rows(rejected) if rejected else {}
+
+    for ticket_id, (index, _, at) in first.items():
+        if ticket_id in admitted:
+            results[index] = CheckInResult(ACCEPTED, ticket_id, at)
+        else:
+            results[index] = _rejection(rows.get(ticket_id))
+    for index, ticket_id in duplicates:
+        winner = results[first[ticket_id][0]]
+        # Билет прошел по более раннему скану этого пакета или раньше
+        results[index] = CheckInResult(USED, ticket_id, winner.checked_in_at) if winner.checked_in_at else winner
+    return results
@@ -0,0 +1,79 @@
+"""
+Проверки конфигурации (``manage.py check``, запуск сервера).
+"""
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+from PIL import ImageFont
+
+MISSING_CHAR = '\U0010fffd'
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+# incr у этих бэкендов - чтение и запись без блокировки
+NON_ATOMIC_CACHE_BACKENDS = (
+    'django.core.cache.backends.db.DatabaseCache',
+    'django.core.cache.backends.filebased.FileBasedCache',
+)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Версии цен и мест, очередь и лимиты работают только на общем кэше"""
+    if settings.DEBUG or settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [
+        Warning(
+            'Кэш по умолчанию не общий для процессов',
+            hint=(
+                'Версии цен, схем залов и геоиндекса, журнал мест, очередь на бронирование '
+                'и лимиты запросов у каждого воркера и run_worker будут свои. Используйте '
+                'cinema.cache.DatabaseCache (по умолчанию) или Redis.'
+            ),
+            id='cinema.W001',
+        )
+    ]
+
+
+@register()
+def check_atomic_cache(app_configs, **kwargs):
+    """Номера очереди, версии мест и лимиты - счетчики на cache.incr"""
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in NON_ATOMIC_CACHE_BACKENDS:
+        return []
+    return [
+        Error(
+            f'У кэша по умолчанию ({backend}) неатомарный incr',
+            hint=(
+                'Параллельные запросы получат одинаковые номера очереди и версии мест, '
+                'лимиты будут недосчитаны. Используйте cinema.cache.DatabaseCache (по умолчанию) или Redis.'
+            ),
+            id='cinema.E002',
+        )
+    ]
+
+
+@register()
+def check_eticket_fonts(app_configs, **kwargs):
+    """Без шрифта с кириллицей электронный билет не нарисовать"""
+    errors = []
+    for setting in ('ETICKET_FONT', 'ETICKET_FONT_BOLD'):
+        path = getattr(settings, setting)
+        try:
+            font = ImageFont.truetype(path, 12)
+        except OSError:
+            errors.append(Error(
+                f'Не удалось загрузить шрифт {setting}: {path}',
+                hint='Укажите путь к TrueType-шрифту или удалите переменную, чтобы взять DejaVu из cinema/fonts.',
+                id='cinema.E001',
+            ))
+            continue
+        # Символа нет в шрифте - рисуется тот же пустой квадрат, что и для
+        # заведомо отсутствующего символа
+        if bytes(font.getmask('Ж')) == bytes(font.getmask(MISSING_CHAR)):
+            errors.append(Error(
+                f'В шрифте {setting} ({path}) нет кириллицы',
+                hint='Текст электронных билетов вышел бы квадратами. Укажите шрифт с кириллицей.',
+                id='cinema.E001',
+            ))
+    return errors
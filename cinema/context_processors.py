@@ -1,12 +1,13 @@
 from .models import City
+from .sessions import get_selected_city_id
 
 
 def city_processor(request):
     """Добавляет список городов в контекст всех шаблонов"""
     cities = City.objects.filter(is_active=True)
     
-    # Получить выбранный город из сессии
-    selected_city_id = request.session.get('selected_city_id')
+    # Получить выбранный город из cookie
+    selected_city_id = get_selected_city_id(request)
     selected_city = None
     
     if selected_city_id:
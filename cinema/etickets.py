@@ -0,0 +1,191 @@
+"""
+Электронные билеты: подписанный QR-код и PNG-билет.
+
+В QR-коде - токен ``KM1.<билет>.<сеанс>.<подпись>``: подпись - HMAC от
+SECRET_KEY (первые 10 байт в base32), поэтому подлинность проверяется
+без базы. Токен состоит только из символов алфавитно-цифрового режима QR
+(цифры, A-Z, точка) и дает код меньшей плотности.
+
+PNG рисуется при первом запросе (или заранее командой
+``prerender_etickets``) и хранится в закрытом хранилище ``ETICKET_ROOT``
+под именем из id билета, статуса и версии макета: смена статуса дает
+новый файл, старые не отдаются.
+"""
+import base64
+import os
+import tempfile
+import textwrap
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+import qrcode
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from PIL import Image, ImageDraw, ImageFont
+
+from .models import Ticket
+from .occupancy import ACTIVE_STATUSES
+
+TOKEN_PREFIX = 'KM1'
+TOKEN_SALT = 'cinema.etickets'
+SIGNATURE_BYTES = 10
+# Увеличивается при изменении макета билета
+ETICKET_VERSION = 1
+
+WIDTH, HEIGHT = 600, 920
+QR_SIZE = 380
+BACKGROUND = (255, 255, 255)
+HEADER = (30, 27, 75)
+ACCENT = (99, 102, 241)
+TEXT = (17, 24, 39)
+MUTED = (107, 114, 128)
+
+
+class TicketTokenError(ValueError):
+    """Поддельный или поврежденный токен билета"""
+
+
+def _signature(payload):
+    digest = salted_hmac(TOKEN_SALT, payload, algorithm='sha256').digest()[:SIGNATURE_BYTES]
+    return base64.b32encode(digest).decode()
+
+
+def make_token(ticket_id, showtime_id):
+    payload = f'{TOKEN_PREFIX}.{ticket_id}.{showtime_id}'
+    return f'{payload}.{_signature(payload)}'
+
+
+def ticket_token(ticket):
+    return make_token(ticket.pk, ticket.showtime_id)
+
+
+def read_token(token):
+    """(id билета, id сеанса) из токена; TicketTokenError при неверной подписи"""
+    parts = token.strip().upper().split('.')
+    if len(parts) != 4 or parts[0] != TOKEN_PREFIX or not parts[1].isdigit() or not parts[2].isdigit():
+        raise TicketTokenError('Неверный формат билета')
+    if not constant_time_compare(parts[3], _signature('.'.join(parts[:3]))):
+        raise TicketTokenError('Неверная подпись билета')
+    return int(parts[1]), int(parts[2])
+
+
+def eticket_storage():
+    return FileSystemStorage(location=settings.ETICKET_ROOT)
+
+
+def eticket_name(ticket):
+    return f'{ticket.pk % 100:02d}/{ticket.pk}-{ticket.status}-v{ETICKET_VERSION}.png'
+
+
+@lru_cache(maxsize=None)
+def _font(size, bold=False):
+    # Наличие шрифтов проверяется при запуске (cinema.E001)
+    return ImageFont.truetype(settings.ETICKET_FONT_BOLD if bold else settings.ETICKET_FONT, size)
+
+
+def _save(storage, name, data):
+    """
+    Записать файл под точным именем: storage.save при занятом имени
+    добавил бы к нему случайный суффикс, а здесь файл подменяется целиком.
+    """
+    path = Path(storage.path(name))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix='.tmp', delete=False) as temporary:
+        temporary.write(data)
+    try:
+        if storage.file_permissions_mode is not None:
+            os.chmod(temporary.name, storage.file_permissions_mode)
+        os.replace(temporary.name, path)
+    except OSError:
+        os.unlink(temporary.name)
+        raise
+
+
+def qr_image(token, size=QR_SIZE):
+    code = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=1, border=2)
+    code.add_data(token.upper())
+    code.make(fit=True)
+    image = code.make_image(fill_color='black', back_color='white').get_image().convert('RGB')
+    # Целое число пикселей на модуль: код остается резким
+    scale = max(1, size // image.width)
+    return image.resize((image.width * scale, image.height * scale), Image.NEAREST)
+
+
+def render_eticket(ticket):
+    """PNG-билет (bytes); ticket - с showtime__movie и showtime__hall__cinema"""
+    showtime = ticket.showtime
+    image = Image.new('RGB', (WIDTH, HEIGHT), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+
+    draw.rectangle((0, 0, WIDTH, 90), fill=HEADER)
+    draw.text((32, 24), 'КиноМир', font=_font(34, bold=True), fill=BACKGROUND)
+    draw.text((WIDTH - 32, 36), f'Билет #{ticket.pk}', font=_font(22), fill=BACKGROUND, anchor='ra')
+
+    y = 120
+    for line in textwrap.wrap(showtime.movie.title, 28)[:2]:
+        draw.text((32, y), line, font=_font(30, bold=True), fill=TEXT)
+        y += 40
+    y += 10
+    details = [
+        ('Кинотеатр', showtime.hall.cinema.name),
+        ('Зал', showtime.hall.name),
+        ('Начало', timezone.localtime(showtime.start_time).strftime('%d.%m.%Y %H:%M')),
+        ('Место', f'ряд {ticket.row}, место {ticket.seat}'),
+        ('Цена', f'{ticket.price} ₽'),
+    ]
+    for label, value in details:
+        draw.text((32, y), label, font=_font(18), fill=MUTED)
+        draw.text((180, y), str(value)[:40], font=_font(20, bold=True), fill=TEXT)
+        y += 34
+
+    code = qr_image(ticket_token(ticket))
+    top = HEIGHT - code.height - 110
+    image.paste(code, ((WIDTH - code.width) // 2, top))
+    draw.line((32, top - 20, WIDTH - 32, top - 20), fill=ACCENT, width=2)
+    draw.text(
+        (WIDTH // 2, HEIGHT - 90),
+        'Покажите QR-код на входе в зал',
+        font=_font(20),
+        fill=MUTED,
+        anchor='ma',
+    )
+    draw.text((WIDTH // 2, HEIGHT - 55), ticket_token(ticket), font=_font(14), fill=MUTED, anchor='ma')
+
+    # В билете несколько цветов и оттенки сглаживания: палитра из 16 цветов
+    # дает файл вчетверо меньше RGB и кодируется быстрее, чем optimize
+    buffer = BytesIO()
+    image.quantize(16, method=Image.Quantize.FASTOCTREE).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def get_eticket(ticket):
+    """
+    Имя файла билета в eticket_storage, при необходимости билет рисуется.
+    None - у отмененного билета электронного билета нет.
+    """
+    if ticket.status not in ACTIVE_STATUSES:
+        return None
+    storage = eticket_storage()
+    name = eticket_name(ticket)
+    if not storage.exists(name):
+        # Параллельные отрисовки того же билета одинаковы: последняя
+        # атомарно заменяет файл, читатель видит только целый PNG
+        _save(storage, name, render_eticket(ticket))
+    return name
+
+
+def render_missing(ticket_ids):
+    """Нарисовать еще не готовые билеты (для пула процессов); число нарисованных"""
+    storage = eticket_storage()
+    rendered = 0
+    tickets = Ticket.objects.filter(pk__in=ticket_ids, status__in=ACTIVE_STATUSES).select_related(
+        'showtime__movie', 'showtime__hall__cinema'
+    )
+    for ticket in tickets:
+        if not storage.exists(eticket_name(ticket)):
+            get_eticket(ticket)
+            rendered += 1
+    return rendered
@@ -1,6 +1,9 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
-from .models import User, Review, Movie, ShowTime, Cinema, Hall, Promotion, Rule
+from django.utils import timezone
+from .layout import LayoutError, default_layout, parse_layout
+from .models import User, Review, Movie, ShowTime, Cinema, Hall, Promotion, Rule, Ticket
+from .scheduling import find_showtime_conflict, ScheduleConflict, make_slot
 
 
 class UserRegistrationForm(UserCreationForm):
@@ -135,7 +138,7 @@ class ShowTimeForm(forms.ModelForm):
     """Форма для создания/редактирования сеанса"""
     class Meta:
         model = ShowTime
-        fields = ['movie', 'hall', 'start_time', 'price', 'is_active']
+        fields = ['movie', 'hall', 'start_time', 'price', 'is_active', 'admission_rate']
         widgets = {
             'movie': forms.Select(attrs={'class': 'form-select'}),
             'hall': forms.Select(attrs={'class': 'form-select'}),
@@ -145,14 +148,107 @@ class ShowTimeForm(forms.ModelForm):
             }),
             'price': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'admission_rate': forms.NumberInput(attrs={'class': 'form-control', 'min': 1}),
         }
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        movie = cleaned_data.get('movie')
+        hall = cleaned_data.get('hall')
+        start_time = cleaned_data.get('start_time')
+        
+        # Неактивный сеанс не занимает зал
+        if movie and hall and start_time and cleaned_data.get('is_active'):
+            conflict = find_showtime_conflict(hall, movie, start_time, exclude_id=self.instance.pk)
+            if conflict is not None:
+                error = ScheduleConflict(make_slot(start_time, movie.duration), conflict)
+                self.add_error('start_time', str(error))
+        return cleaned_data
+
+
+class ShowTimeAutofillForm(forms.Form):
+    """Форма автозаполнения дня зала сеансами"""
+    hall = forms.ModelChoiceField(
+        queryset=Hall.objects.select_related('cinema'),
+        label='Зал',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    date = forms.DateField(
+        label='Дата',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    movies = forms.ModelMultipleChoiceField(
+        queryset=Movie.objects.filter(is_active=True).order_by('title'),
+        label='Фильмы (по кругу)',
+        widget=forms.CheckboxSelectMultiple()
+    )
+    price = forms.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        min_value=0,
+        label='Цена билета',
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'})
+    )
+    opening_time = forms.TimeField(
+        required=False,
+        label='Начало первого сеанса не раньше',
+        widget=forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'})
+    )
+    closing_time = forms.TimeField(
+        required=False,
+        label='Начало последнего сеанса не позже',
+        widget=forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'})
+    )
+
+
+class ShowTimeImportForm(forms.Form):
+    """Форма пакетного импорта расписания"""
+    file = forms.FileField(
+        required=False,
+        label='Файл CSV или JSON',
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,.json'})
+    )
+    text = forms.CharField(
+        required=False,
+        label='Или вставьте содержимое',
+        widget=forms.Textarea(attrs={
+            'class': 'form-control',
+            'rows': 8,
+            'placeholder': 'movie,cinema,halls,times,date_from,date_to,price'
+        })
+    )
+    skip_conflicts = forms.BooleanField(
+        required=False,
+        label='Пропускать пересекающиеся сеансы',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        label='Только проверить, не сохранять',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('file') and not cleaned_data.get('text', '').strip():
+            raise forms.ValidationError('Загрузите файл или вставьте расписание.')
+        return cleaned_data
+    
+    def get_data(self):
+        uploaded = self.cleaned_data.get('file')
+        if uploaded:
+            return uploaded.read()
+        return self.cleaned_data['text']
 
 
 class CinemaForm(forms.ModelForm):
     """Форма для создания/редактирования кинотеатра"""
     class Meta:
         model = Cinema
-        fields = ['name', 'city', 'address', 'phone', 'description', 'facilities', 'image_url', 'is_active']
+        fields = [
+            'name', 'city', 'address', 'phone', 'description', 'facilities',
+            'image_url', 'latitude', 'longitude', 'is_active'
+        ]
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
             'city': forms.Select(attrs={'class': 'form-select'}),
@@ -161,6 +257,8 @@ class CinemaForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
             'facilities': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'image_url': forms.URLInput(attrs={'class': 'form-control', 'placeholder': 'https://i.imgur.com/cinema.jpg'}),
+            'latitude': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.000001', 'placeholder': '55.755826'}),
+            'longitude': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.000001', 'placeholder': '37.617300'}),
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
         labels = {
@@ -172,26 +270,79 @@ class HallForm(forms.ModelForm):
     """Форма для создания/редактирования зала"""
     class Meta:
         model = Hall
-        fields = ['cinema', 'name', 'rows', 'seats_per_row']
+        fields = ['cinema', 'name', 'rows', 'seats_per_row', 'layout']
         widgets = {
             'cinema': forms.Select(attrs={'class': 'form-select'}),
             'name': forms.TextInput(attrs={'class': 'form-control'}),
             'rows': forms.NumberInput(attrs={'class': 'form-control'}),
             'seats_per_row': forms.NumberInput(attrs={'class': 'form-control'}),
+            'layout': forms.Textarea(attrs={'class': 'form-control font-monospace', 'rows': 3}),
         }
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        layout = cleaned_data.get('layout')
+        rows = cleaned_data.get('rows')
+        seats_per_row = cleaned_data.get('seats_per_row')
+        if layout is None or not rows or not seats_per_row:
+            return cleaned_data
+        
+        instance = self.instance
+        resized = {'rows', 'seats_per_row'} & set(self.changed_data)
+        if layout and resized and 'layout' not in self.changed_data:
+            # Прямоугольный зал по умолчанию строится заново по новым размерам,
+            # своя схема сохраняется - ее нужно изменить или очистить явно
+            if instance.pk and layout == default_layout(instance.rows, instance.seats_per_row):
+                layout = cleaned_data['layout'] = ''
+            else:
+                self.add_error(
+                    'layout',
+                    'Размеры зала задаются схемой: измените схему или очистите ее, '
+                    'чтобы построить прямоугольный зал по новым размерам.'
+                )
+                return cleaned_data
+        
+        if instance.pk:
+            try:
+                seat_map = parse_layout(layout or default_layout(rows, seats_per_row))
+            except LayoutError:
+                # Ошибку схемы покажет валидатор поля модели
+                return cleaned_data
+            lost = sorted({
+                (row, seat) for row, seat in Ticket.objects.filter(
+                    showtime__hall=instance,
+                    showtime__start_time__gte=timezone.now(),
+                    status__in=['booked', 'paid']
+                ).values_list('row', 'seat')
+                if not seat_map.is_sellable(row, seat)
+            })
+            if lost:
+                seats = ', '.join(f'ряд {row} место {seat}' for row, seat in lost[:5])
+                more = f' и еще {len(lost) - 5}' if len(lost) > 5 else ''
+                self.add_error(
+                    'layout',
+                    f'На будущие сеансы проданы места, которых нет в новой схеме: {seats}{more}.'
+                )
+        return cleaned_data
 
 
 class PromotionForm(forms.ModelForm):
     """Форма для создания/редактирования акции"""
     class Meta:
         model = Promotion
-        fields = ['title', 'description', 'discount_percent', 'start_date', 'end_date', 'image', 'is_active']
+        fields = [
+            'title', 'description', 'discount_percent', 'start_date', 'end_date',
+            'weekdays', 'time_from', 'time_to', 'image', 'is_active'
+        ]
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
             'discount_percent': forms.NumberInput(attrs={'class': 'form-control'}),
             'start_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'end_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+            'weekdays': forms.TextInput(attrs={'class': 'form-control', 'placeholder': '1,2,3,4,5'}),
+            'time_from': forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}),
+            'time_to': forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}),
             'image': forms.FileInput(attrs={'class': 'form-control'}),
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
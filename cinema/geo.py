@@ -0,0 +1,150 @@
+"""
+Поиск ближайших кинотеатров без PostGIS.
+
+Координаты кинотеатров переводятся в точки на единичной сфере (x, y, z):
+длина хорды между точками монотонно зависит от расстояния по поверхности
+Земли, поэтому обычное KD-дерево в трех измерениях дает точный поиск по
+радиусу и k ближайших без поправок на долготу и переход через 180°.
+
+Дерево строится в памяти процесса из активных кинотеатров с координатами
+и перестраивается при первом обращении после сохранения или удаления
+кинотеатра. Версия дерева хранится в кэше по умолчанию; другие процессы
+замечают ее смену, только если кэш общий (DatabaseCache или Redis, см.
+cinema.W001), с локальным кэшем каждый процесс видит лишь свои изменения.
+"""
+import heapq
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+from django.core.cache import cache
+
+from .models import Cinema
+
+EARTH_RADIUS_KM = 6371.0088
+VERSION_KEY = 'cinema_geo_version'
+
+
+def to_xyz(latitude, longitude):
+    lat = math.radians(float(latitude))
+    lon = math.radians(float(longitude))
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def chord_for_km(distance_km):
+    """Длина хорды единичной сферы для расстояния по поверхности"""
+    angle = min(distance_km / EARTH_RADIUS_KM, math.pi)
+    return 2 * math.sin(angle / 2)
+
+
+def km_for_chord(chord):
+    return 2 * math.asin(min(chord / 2, 1.0)) * EARTH_RADIUS_KM
+
+
+@dataclass(frozen=True)
+class GeoPoint:
+    cinema_id: int
+    city_id: int
+    xyz: tuple
+
+
+class KDTree:
+    """Статическое KD-дерево по точкам GeoPoint (узлы - в плоских списках)"""
+
+    def __init__(self, points):
+        self.points = []
+        self.axes = []
+        self.left = []
+        self.right = []
+        self.root = self._build(list(points), 0)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _build(self, points, depth):
+        if not points:
+            return -1
+        axis = depth % 3
+        points.sort(key=lambda point: point.xyz[axis])
+        middle = len(points) // 2
+        node = len(self.points)
+        self.points.append(points[middle])
+        self.axes.append(axis)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.left[node] = self._build(points[:middle], depth + 1)
+        self.right[node] = self._build(points[middle + 1:], depth + 1)
+        return node
+
+    def nearest(self, xyz, k, max_chord=math.inf):
+        """До k ближайших точек не дальше max_chord: [(хорда, GeoPoint), ...]"""
+        if k <= 0:
+            return []
+        # Куча с обратным знаком: на вершине - самая дальняя из найденных
+        best = []
+        stack = [self.root]
+        points, axes, left, right = self.points, self.axes, self.left, self.right
+        qx, qy, qz = xyz
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                continue
+            point = points[node]
+            px, py, pz = point.xyz
+            distance = math.sqrt((px - qx) ** 2 + (py - qy) ** 2 + (pz - qz) ** 2)
+            limit = -best[0][0] if len(best) == k else max_chord
+            if distance <= limit:
+                if len(best) == k:
+                    heapq.heapreplace(best, (-distance, point.cinema_id, point))
+                else:
+                    heapq.heappush(best, (-distance, point.cinema_id, point))
+                limit = -best[0][0] if len(best) == k else max_chord
+            axis = axes[node]
+            delta = xyz[axis] - point.xyz[axis]
+            near, far = (left[node], right[node]) if delta < 0 else (right[node], left[node])
+            # Дальнее поддерево проверяется, только если плоскость разбиения ближе предела
+            if abs(delta) <= limit:
+                stack.append(far)
+            stack.append(near)
+        return sorted(((-distance, point) for distance, _, point in best), key=lambda item: item[0])
+
+
+_tree = None
+_tree_version = None
+_tree_lock = threading.Lock()
+
+
+def _load_tree():
+    rows = Cinema.objects.filter(
+        is_active=True,
+        latitude__isnull=False,
+        longitude__isnull=False
+    ).values_list('id', 'city_id', 'latitude', 'longitude')
+    return KDTree(
+        GeoPoint(cinema_id, city_id, to_xyz(latitude, longitude))
+        for cinema_id, city_id, latitude, longitude in rows
+    )
+
+
+def get_tree():
+    """KD-дерево кинотеатров (перестраивается после изменения кинотеатров)"""
+    global _tree, _tree_version
+    version = cache.get_or_set(VERSION_KEY, time.time_ns, None)
+    if _tree is None or _tree_version != version:
+        with _tree_lock:
+            if _tree is None or _tree_version != version:
+                _tree = _load_tree()
+                _tree_version = version
+    return _tree
+
+
+def reset_geo_index():
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def nearest_cinemas(latitude, longitude, radius_km=None, limit=10):
+    """[(id кинотеатра, расстояние в км), ...] по возрастанию расстояния"""
+    max_chord = chord_for_km(radius_km) if radius_km else math.inf
+    found = get_tree().nearest(to_xyz(latitude, longitude), limit, max_chord)
+    return [(point.cinema_id, round(km_for_chord(chord), 2)) for chord, point in found]
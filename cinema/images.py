@@ -0,0 +1,160 @@
+"""
+Конвейер изображений: уменьшенные копии постеров и картинок.
+
+Для загруженного файла генерируются варианты WebP и JPEG фиксированной
+ширины (``IMAGE_VARIANT_WIDTHS``). Имена вариантов содержат хэш
+содержимого, поэтому их можно отдавать с долгим кэшированием. Список
+вариантов хранится в JSON-манифесте рядом с ними и в кэше Django.
+Генерация идет в пуле потоков и не блокирует запрос.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+VARIANT_ROOT = 'variants'
+MANIFEST_ROOT = f'{VARIANT_ROOT}/manifests'
+CACHE_PREFIX = 'image_variants:'
+PENDING_PREFIX = 'image_variants_pending:'
+
+VARIANT_FORMATS = {
+    'webp': {'pil_format': 'WEBP', 'mime': 'image/webp', 'options': {'method': 4}},
+    'jpeg': {'pil_format': 'JPEG', 'mime': 'image/jpeg', 'options': {'optimize': True, 'progressive': True}},
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def _source_digest(source_name):
+    return hashlib.sha1(source_name.encode('utf-8')).hexdigest()
+
+
+def manifest_name(source_name):
+    """Путь к манифесту вариантов для исходного файла"""
+    digest = _source_digest(source_name)
+    return f'{MANIFEST_ROOT}/{digest[:2]}/{digest}.json'
+
+
+def get_variants(source_name):
+    """
+    Варианты изображения: {'webp': [[ширина, имя файла], ...], 'jpeg': [...]}.
+    Возвращает None, если варианты еще не сгенерированы.
+    """
+    if not source_name:
+        return None
+    key = CACHE_PREFIX + _source_digest(source_name)
+    manifest = cache.get(key)
+    if manifest is None:
+        name = manifest_name(source_name)
+        if not default_storage.exists(name):
+            return None
+        with default_storage.open(name, 'rb') as fh:
+            manifest = json.load(fh)
+        cache.set(key, manifest, None)
+    return manifest
+
+
+def _encode(image, fmt):
+    spec = VARIANT_FORMATS[fmt]
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    buffer = BytesIO()
+    image.save(buffer, spec['pil_format'], quality=settings.IMAGE_VARIANT_QUALITY, **spec['options'])
+    return buffer.getvalue()
+
+
+def generate_variants(source_name):
+    """Сгенерировать варианты изображения и записать манифест"""
+    with default_storage.open(source_name, 'rb') as fh:
+        image = Image.open(fh)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    widths = sorted({min(width, image.width) for width in settings.IMAGE_VARIANT_WIDTHS})
+    manifest = {fmt: [] for fmt in VARIANT_FORMATS}
+
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for fmt in VARIANT_FORMATS:
+            data = _encode(resized, fmt)
+            digest = hashlib.sha256(data).hexdigest()[:16]
+            name = f'{VARIANT_ROOT}/{stem}-{width}w.{digest}.{fmt if fmt != "jpeg" else "jpg"}'
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(data))
+            manifest[fmt].append([width, name])
+
+    name = manifest_name(source_name)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(json.dumps(manifest).encode('utf-8')))
+    cache.set(CACHE_PREFIX + _source_digest(source_name), manifest, None)
+    return manifest
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PIPELINE_WORKERS,
+                thread_name_prefix='image-variants',
+            )
+        return _executor
+
+
+def _generate_safely(source_name):
+    try:
+        generate_variants(source_name)
+    except (OSError, UnidentifiedImageError, ValueError, Image.DecompressionBombError):
+        logger.exception('Не удалось сгенерировать варианты для %s', source_name)
+    finally:
+        with _executor_lock:
+            _pending.discard(source_name)
+
+
+def schedule_variants(source_name):
+    """Поставить генерацию вариантов в пул потоков (повторные вызовы игнорируются)"""
+    with _executor_lock:
+        if source_name in _pending:
+            return None
+        _pending.add(source_name)
+    return _get_executor().submit(_generate_safely, source_name)
+
+
+def schedule_missing_variants(source_name):
+    """
+    Поставить генерацию для изображения без манифеста не чаще раза в
+    ``IMAGE_VARIANT_RETRY_SECONDS``: метка в общем кэше не дает каждому
+    показу страницы (во всех процессах) снова запускать генерацию, пока
+    она идет или после ее ошибки.
+    """
+    if not cache.add(PENDING_PREFIX + _source_digest(source_name), 1, settings.IMAGE_VARIANT_RETRY_SECONDS):
+        return None
+    return schedule_variants(source_name)
+
+
+def srcset(source_name, fmt):
+    """Строка srcset для формата или пустая строка"""
+    manifest = get_variants(source_name)
+    if not manifest:
+        return ''
+    return ', '.join(
+        f'{default_storage.url(name)} {width}w' for width, name in manifest.get(fmt, [])
+    )
@@ -0,0 +1,182 @@
+"""
+Очередь фоновых задач в таблице ``Job``.
+
+``enqueue`` записывает задачу в той же транзакции, что и данные, к
+которым она относится: задача появится только вместе с ними. Обработчики
+(команда ``run_worker``) забирают готовые задачи пакетами через
+``SELECT ... FOR UPDATE SKIP LOCKED`` - строки, уже взятые другим
+обработчиком, пропускаются без ожидания. Взятие подтверждается условным
+UPDATE с меткой обработчика, поэтому на базах без SKIP LOCKED (SQLite)
+задача тоже не выполнится дважды.
+
+Выполненная задача удаляется. Упавшая повторяется с экспоненциальной
+задержкой ``JOB_RETRY_DELAY`` x 2^(попытка-1) (не больше
+``JOB_RETRY_MAX_DELAY``), после ``max_attempts`` попыток остается со
+статусом failed. Перед выполнением каждой задачи пакета метка ``locked_at``
+обновляется, так что ``JOB_TIMEOUT`` отсчитывается от начала задачи, а не
+пакета. Задачи, зависшие в running дольше ``JOB_TIMEOUT`` (обработчик
+упал или повис на задаче), возвращаются в очередь; это тоже попытка, и
+после ``max_attempts`` задача остается со статусом failed.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+import uuid
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def task_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def enqueue(func, *args, queue='default', delay=None, max_attempts=None, **kwargs):
+    """Поставить вызов func(*args, **kwargs) в очередь; аргументы - JSON"""
+    return Job.objects.create(
+        queue=queue,
+        task=task_name(func),
+        args=list(args),
+        kwargs=kwargs,
+        run_at=timezone.now() + timedelta(seconds=delay or 0),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def claim(queue, batch, worker_id):
+    """Взять до batch готовых задач очереди; [] - готовых задач нет"""
+    token = f'{uuid.uuid4().hex[:8]}:{worker_id}'[:100]
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    while True:
+        now = timezone.now()
+        ready = Job.objects.filter(queue=queue, status='pending', run_at__lte=now).order_by('run_at')
+        # Без SKIP LOCKED (SQLite) строки не блокируются: транзакция с чтением
+        # и записью только ловила бы блокировку базы, конкурентов отсекает UPDATE
+        with transaction.atomic() if skip_locked else nullcontext():
+            if skip_locked:
+                ready = ready.select_for_update(skip_locked=True)
+            ids = list(ready.values_list('id', flat=True)[:batch])
+            if not ids:
+                return []
+            Job.objects.filter(id__in=ids, status='pending').update(
+                status='running',
+                locked_by=token,
+                locked_at=now,
+            )
+        jobs = list(Job.objects.filter(id__in=ids, status='running', locked_by=token).order_by('run_at'))
+        if jobs:
+            return jobs
+        # Все выбранные задачи перехватил другой обработчик - берем следующие
+
+
+def retry_delay(attempt):
+    delay = min(settings.JOB_RETRY_DELAY * 2 ** (attempt - 1), settings.JOB_RETRY_MAX_DELAY)
+    # Разброс, чтобы упавшие вместе задачи не вернулись одновременно
+    return delay * random.uniform(0.5, 1)
+
+
+def run_job(job):
+    """Выполнить задачу; True - успешно (удаляет задачу вызывающий)"""
+    attempt = job.attempts + 1
+    try:
+        func = import_string(job.task)
+        func(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if attempt >= job.max_attempts:
+            logger.error('Задача %s окончательно не выполнена:\n%s', job, error)
+            changes = {'status': 'failed'}
+        else:
+            logger.warning('Задача %s не выполнена (попытка %s), повтор', job, attempt)
+            changes = {
+                'status': 'pending',
+                'run_at': timezone.now() + timedelta(seconds=retry_delay(attempt)),
+            }
+        Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+            attempts=attempt, locked_by='', locked_at=None, last_error=error[-5000:], **changes
+        )
+        return False
+    return True
+
+
+def start_job(job):
+    """Отметить начало задачи; False - ее уже вернули в очередь как зависшую"""
+    return Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(
+        locked_at=timezone.now()
+    ) == 1
+
+
+def run_batch(jobs):
+    """Выполнить взятые задачи; выполненные удаляются одним запросом"""
+    succeeded, failed = [], 0
+    for job in jobs:
+        if not start_job(job):
+            continue
+        if run_job(job):
+            succeeded.append(job.pk)
+        else:
+            failed += 1
+    if succeeded:
+        Job.objects.filter(pk__in=succeeded, locked_by=jobs[0].locked_by).delete()
+    return len(succeeded), failed
+
+
+def requeue_stale():
+    """
+    Вернуть в очередь задачи, которые слишком долго выполняются. Зависание
+    считается попыткой: исчерпавшие max_attempts остаются со статусом failed.
+    Возвращает число возвращенных в очередь задач.
+    """
+    border = timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT)
+    stale = Job.objects.filter(status='running', locked_at__lt=border)
+    changes = {'attempts': F('attempts') + 1, 'locked_by': '', 'locked_at': None}
+    error = f'Не выполнена за JOB_TIMEOUT ({settings.JOB_TIMEOUT} с)'
+    failed = stale.filter(attempts__gte=F('max_attempts') - 1).update(
+        status='failed', last_error=error, **changes
+    )
+    if failed:
+        logger.error('Зависших задач окончательно не выполнено: %s', failed)
+    return stale.update(status='pending', last_error=error, **changes)
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def work(stop, queue='default', batch=10, poll=None, drain=False):
+    """
+    Цикл обработчика: пакеты задач, пока не установлен stop (Event).
+    drain - выйти, когда готовых задач не останется. Возвращает
+    (выполнено, с ошибкой).
+    """
+    poll = settings.JOB_POLL_INTERVAL if poll is None else poll
+    name = worker_id()
+    done = failed = 0
+    try:
+        while not stop.is_set():
+            jobs = claim(queue, batch, name)
+            if not jobs:
+                if drain:
+                    break
+                stop.wait(poll)
+                continue
+            succeeded, errors = run_batch(jobs)
+            done += succeeded
+            failed += errors
+            close_old_connections()
+    finally:
+        # Соединение потока обработчика больше не понадобится
+        connection.close()
+    return done, failed
@@ -0,0 +1,145 @@
+"""
+Схема зала в компактном текстовом виде.
+
+Ряды разделяются ``/``, ряд записывается сериями ``<число><код>``
+(число 1 можно опускать), одинаковые соседние ряды - ``<число>*<ряд>``:
+
+    3*12S/4S_4V_4S/2W8S2W
+
+Коды позиций:
+
+* ``S`` - обычное место, ``V`` - VIP, ``W`` - место для зрителя на
+  коляске, ``X`` - неисправное место (не продается);
+* ``_`` - проход, места нет.
+
+Номер места - номер позиции в ряду, поэтому проходы занимают номера, а
+серии свободных мест по обе стороны прохода не считаются соседними. Для
+каждого кода хранится битовая маска ряда (бит ``seat - 1``), так что
+проверки мест и подсчет вместимости не требуют строки в базе на место.
+"""
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+CATEGORIES = {
+    'S': 'Обычное',
+    'V': 'VIP',
+    'W': 'Для зрителей на коляске',
+    'X': 'Неисправное',
+}
+AISLE = '_'
+# Места, которые можно продать, и места для автоподбора
+SELLABLE = 'SVW'
+AUTO_SELECT = 'SV'
+MAX_WIDTH = 200
+MAX_ROWS = 100
+
+RUN_RE = re.compile(r'(\d*)([SVWX_])')
+ROW_RE = re.compile(r'(?:(\d+)\*)?((?:\d*[SVWX_])+)')
+
+
+class LayoutError(ValueError):
+    """Некорректная запись схемы зала"""
+
+
+@dataclass(frozen=True)
+class HallLayout:
+    code: str
+    seat_rows: tuple
+    masks: dict = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self):
+        masks = {category: [] for category in CATEGORIES}
+        for row in self.seat_rows:
+            for category in CATEGORIES:
+                masks[category].append(
+                    sum(1 << position for position, code in enumerate(row) if code == category)
+                )
+        object.__setattr__(self, 'masks', {category: tuple(values) for category, values in masks.items()})
+
+    @property
+    def height(self):
+        return len(self.seat_rows)
+
+    @property
+    def width(self):
+        return max(len(row) for row in self.seat_rows)
+
+    @property
+    def capacity(self):
+        return sum(bin(self.mask(row)).count('1') for row in range(1, self.height + 1))
+
+    def mask(self, row, categories=SELLABLE):
+        """Битовая маска мест ряда с указанными кодами"""
+        result = 0
+        for category in categories:
+            result |= self.masks[category][row - 1]
+        return result
+
+    def category(self, row, seat):
+        """Код позиции или None вне зала"""
+        if 1 <= row <= self.height and 1 <= seat <= len(self.seat_rows[row - 1]):
+            return self.seat_rows[row - 1][seat - 1]
+        return None
+
+    def is_sellable(self, row, seat):
+        category = self.category(row, seat)
+        return category is not None and category in SELLABLE
+
+
+def _encode_row(row):
+    runs = []
+    position = 0
+    while position < len(row):
+        end = position
+        while end < len(row) and row[end] == row[position]:
+            end += 1
+        count = end - position
+        runs.append(f'{count if count > 1 else ""}{row[position]}')
+        position = end
+    return ''.join(runs)
+
+
+def encode_layout(seat_rows):
+    """Запись схемы по строкам кодов рядов (одинаковые ряды сжимаются)"""
+    parts = []
+    index = 0
+    while index < len(seat_rows):
+        end = index
+        while end < len(seat_rows) and seat_rows[end] == seat_rows[index]:
+            end += 1
+        row = _encode_row(seat_rows[index])
+        parts.append(f'{end - index}*{row}' if end - index > 1 else row)
+        index = end
+    return '/'.join(parts)
+
+
+@lru_cache(maxsize=1024)
+def parse_layout(text):
+    """HallLayout по записи схемы; LayoutError при ошибке"""
+    text = re.sub(r'\s+', '', text or '')
+    if not text:
+        raise LayoutError('Схема зала пуста')
+    seat_rows = []
+    for number, part in enumerate(text.split('/'), start=1):
+        match = ROW_RE.fullmatch(part)
+        if not match:
+            raise LayoutError(f'Не удалось разобрать ряд {number}: "{part}"')
+        runs = [(int(count or 1), code) for count, code in RUN_RE.findall(match.group(2))]
+        if not 1 <= sum(count for count, _ in runs) <= MAX_WIDTH:
+            raise LayoutError(f'В ряду {number} должно быть от 1 до {MAX_WIDTH} позиций')
+        repeat = int(match.group(1) or 1)
+        if len(seat_rows) + repeat > MAX_ROWS:
+            raise LayoutError(f'В зале может быть не больше {MAX_ROWS} рядов')
+        seat_rows.extend([''.join(code * count for count, code in runs)] * repeat)
+    if not seat_rows:
+        raise LayoutError('В схеме нет ни одного ряда')
+    if not any(code in SELLABLE for row in seat_rows for code in row):
+        raise LayoutError('В схеме нет ни одного места')
+    seat_rows = tuple(seat_rows)
+    return HallLayout(encode_layout(seat_rows), seat_rows)
+
+
+def default_layout(rows, seats_per_row):
+    """Прямоугольный зал из обычных мест"""
+    return encode_layout(('S' * seats_per_row,) * rows)
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from cinema.ticket_events import archive_events
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка старых событий билетов в сжатые CSV и удаление их из базы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.TICKET_EVENT_RETENTION_DAYS,
+            help='Архивировать события старше стольких дней'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=50000,
+            help='Событий в одном файле архива'
+        )
+        parser.add_argument(
+            '--root',
+            default=settings.TICKET_EVENT_ARCHIVE_ROOT,
+            help='Каталог архива'
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--days и --chunk-size должны быть положительными')
+        before = timezone.now() - timedelta(days=options['days'])
+        archived, files = archive_events(before, options['chunk_size'], options['root'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ В архив {options["root"]} выгружено событий: {archived}, файлов: {files}'
+        ))
@@ -0,0 +1,118 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from cinema.checkin import ACCEPTED, USED, check_in, sync_scans
+from cinema.etickets import make_token
+from cinema.models import Hall, Movie, ShowTime, Ticket, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк проверки билетов на входе: сканов в минуту и защита от двойного прохода. '
+        'Работает на своих неактивных сеансах, только с DEBUG или на SQLite'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=1000, help='Сколько билетов сканировать')
+        parser.add_argument('--workers', default='1,4', help='Количества параллельных сканеров через запятую')
+        parser.add_argument('--batch', type=int, default=200, help='Сканов в одной офлайн-синхронизации')
+
+    def handle(self, *args, **options):
+        # Проходы попадают в журнал билетов, а он только дополняется
+        if not settings.DEBUG and connection.vendor != 'sqlite':
+            raise CommandError('Бенчмарк пишет в журнал билетов: запускайте его с DEBUG=True или на SQLite')
+        try:
+            pools = [int(value) for value in options['workers'].split(',')]
+        except ValueError:
+            raise CommandError('--workers: числа через запятую')
+        hall = Hall.objects.filter(capacity__gt=0).first()
+        movie = Movie.objects.first()
+        user = User.objects.first()
+        if hall is None or movie is None or user is None:
+            raise CommandError('Нужны зал, фильм и пользователь (manage.py init_data)')
+
+        showtimes = self._create_showtimes(hall, movie, user, options['tickets'])
+        try:
+            tickets = list(
+                Ticket.objects.filter(showtime__in=showtimes).values_list('pk', 'showtime_id')
+            )
+            ids = [pk for pk, _ in tickets]
+            tokens = [make_token(pk, showtime_id) for pk, showtime_id in tickets]
+            self.stdout.write(f'База: {connection.vendor}, билетов: {len(tokens)}')
+
+            for workers in pools:
+                self._reset(ids)
+                # Каждый билет сканируют дважды одновременно - пройти должен один раз
+                elapsed, statuses = self._scan(tokens + tokens, workers)
+                self._check(statuses.count(ACCEPTED), len(tokens), 'двойном скане')
+                self.stdout.write(
+                    f'Сканеров {workers}: {len(statuses) / elapsed * 60:.0f} сканов/мин '
+                    f'({elapsed / len(statuses) * 1000:.2f} мс на скан)'
+                )
+
+            elapsed, statuses = self._scan(tokens, pools[-1])
+            self._check(statuses.count(USED), len(tokens), 'повторном скане')
+            self.stdout.write(f'Повторный проход: {len(statuses) / elapsed * 60:.0f} отказов/мин')
+
+            self._reset(ids)
+            started = time.perf_counter()
+            accepted = 0
+            for start in range(0, len(tokens), options['batch']):
+                chunk = tokens[start:start + options['batch']]
+                accepted += sum(result.accepted for result in sync_scans([(token, None) for token in chunk]))
+            elapsed = time.perf_counter() - started
+            self._check(accepted, len(tokens), 'синхронизации')
+            self.stdout.write(
+                f'Офлайн-синхронизация по {options["batch"]}: {len(tokens) / elapsed * 60:.0f} сканов/мин'
+            )
+        finally:
+            ShowTime.objects.filter(pk__in=[showtime.pk for showtime in showtimes]).delete()
+
+        self.stdout.write(self.style.SUCCESS('✓ Каждый билет пропущен ровно один раз'))
+
+    def _create_showtimes(self, hall, movie, user, count):
+        """Неактивные сеансы, идущие сейчас, с оплаченными билетами на все места"""
+        seat_map = hall.seat_map
+        seats = [
+            (row, seat)
+            for row in range(1, seat_map.height + 1)
+            for seat in range(1, seat_map.width + 1)
+            if seat_map.is_sellable(row, seat)
+        ]
+        showtimes = []
+        tickets = []
+        while len(tickets) < count:
+            showtime = ShowTime.objects.create(
+                movie=movie, hall=hall, start_time=timezone.now(), price=0, is_active=False
+            )
+            showtimes.append(showtime)
+            tickets.extend(
+                Ticket(showtime=showtime, user=user, row=row, seat=seat, price=0, status='paid')
+                for row, seat in seats[:count - len(tickets)]
+            )
+        Ticket.objects.bulk_create(tickets, batch_size=1000)
+        return showtimes
+
+    def _reset(self, ids):
+        Ticket.objects.filter(pk__in=ids).update(checked_in_at=None, checked_in_by=None)
+
+    def _scan(self, tokens, workers):
+        def scan(token):
+            try:
+                return check_in(token).status
+            finally:
+                close_old_connections()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            statuses = list(executor.map(scan, tokens))
+        return time.perf_counter() - started, statuses
+
+    def _check(self, actual, expected, stage):
+        if actual != expected:
+            raise CommandError(f'При {stage}: {actual} из {expected}')
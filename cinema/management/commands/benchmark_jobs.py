@@ -0,0 +1,67 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from cinema.jobs import task_name, work
+from cinema.models import Job
+
+BENCHMARK_QUEUE = 'benchmark'
+
+
+def sleep_task(milliseconds):
+    """Тестовая задача: ожидание, как при отправке письма"""
+    time.sleep(milliseconds / 1000)
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк очереди фоновых задач: пропускная способность обработчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=2000, help='Задач в очереди')
+        parser.add_argument('--workers', default='1,4,8', help='Количества обработчиков через запятую')
+        parser.add_argument('--batch', type=int, default=10, help='Задач за одно обращение к очереди')
+        parser.add_argument('--task-ms', type=float, default=5, help='Длительность одной задачи, мс')
+
+    def handle(self, *args, **options):
+        try:
+            pools = [int(value) for value in options['workers'].split(',')]
+        except ValueError:
+            raise CommandError('--workers: числа через запятую')
+        count = options['jobs']
+        if count < 1 or min(pools) < 1:
+            raise CommandError('Нужны хотя бы одна задача и один обработчик')
+        self.stdout.write(
+            f'База: {connection.vendor}, задач: {count}, длительность задачи {options["task_ms"]} мс, '
+            f'пакет {options["batch"]}'
+        )
+
+        for workers in pools:
+            Job.objects.filter(queue=BENCHMARK_QUEUE).delete()
+            Job.objects.bulk_create(
+                [
+                    Job(queue=BENCHMARK_QUEUE, task=task_name(sleep_task), args=[options['task_ms']])
+                    for _ in range(count)
+                ],
+                batch_size=1000,
+            )
+            stop = threading.Event()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(
+                    lambda _: work(stop, BENCHMARK_QUEUE, options['batch'], drain=True),
+                    range(workers),
+                ))
+            elapsed = time.perf_counter() - started
+            done = sum(result[0] for result in results)
+            left = Job.objects.filter(queue=BENCHMARK_QUEUE).count()
+            if done != count or left:
+                raise CommandError(f'Выполнено {done} из {count}, осталось в очереди {left}')
+            self.stdout.write(
+                f'Обработчиков {workers}: {count / elapsed:.0f} задач/с '
+                f'({elapsed / count * 1000:.2f} мс на задачу)'
+            )
+
+        self.stdout.write(self.style.SUCCESS('✓ Каждая задача выполнена ровно один раз'))
@@ -0,0 +1,95 @@
+import random
+import time
+from datetime import time as dt_time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from cinema.models import ShowTime, PriceRule, Promotion
+from cinema.pricing import compile_price_table, evaluate_price, get_price_table
+
+
+def demo_rules(hall_id):
+    """Несохраненный набор правил, если в базе правил нет"""
+    return [
+        PriceRule(name='Выходные', adjustment_percent=20, weekdays='6,7'),
+        PriceRule(name='Вечер', adjustment_percent=15, time_from=dt_time(18, 0)),
+        PriceRule(name='Утро', adjustment_percent=-30, time_to=dt_time(12, 0)),
+        PriceRule(name='Зал', adjustment_percent=10, hall_id=hall_id),
+        PriceRule(name='Спрос 50%', adjustment_percent=10, occupancy_from=50),
+        PriceRule(name='Спрос 80%', adjustment_percent=15, occupancy_from=80),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк расчета цены: разбор правил против скомпилированной таблицы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=100000,
+            help='Количество запросов цены места'
+        )
+        parser.add_argument(
+            '--showtime',
+            type=int,
+            help='ID сеанса (по умолчанию - ближайший предстоящий)'
+        )
+        parser.add_argument(
+            '--demo-rules',
+            action='store_true',
+            help='Использовать демонстрационный набор правил вместо правил из базы'
+        )
+
+    def handle(self, *args, **options):
+        showtimes = ShowTime.objects.select_related('hall')
+        if options['showtime']:
+            showtime = showtimes.filter(pk=options['showtime']).first()
+        else:
+            showtime = showtimes.filter(start_time__gt=timezone.now()).order_by('start_time').first()
+        if showtime is None:
+            raise CommandError('Сеанс не найден')
+
+        rules = list(PriceRule.objects.filter(is_active=True))
+        use_database = bool(rules) and not options['demo_rules']
+        if not use_database:
+            rules = demo_rules(showtime.hall_id)
+        promotions = list(Promotion.objects.filter(is_active=True, discount_percent__gt=0))
+
+        count = options['requests']
+        rng = random.Random(42)
+        requests = [rng.randrange(showtime.hall.total_seats) for _ in range(count)]
+        self.stdout.write(
+            f'Сеанс #{showtime.pk}, мест: {showtime.hall.total_seats}, '
+            f'правил: {len(rules)}, акций: {len(promotions)}, запросов: {count}'
+        )
+
+        started = time.perf_counter()
+        expected = [evaluate_price(showtime, booked, rules, promotions) for booked in requests]
+        naive = time.perf_counter() - started
+
+        started = time.perf_counter()
+        table = compile_price_table(showtime, rules, promotions)
+        compiled = time.perf_counter() - started
+
+        started = time.perf_counter()
+        actual = [table.price(booked) for booked in requests]
+        lookup = time.perf_counter() - started
+
+        if actual != expected:
+            raise CommandError('Цены из таблицы не совпадают с разбором правил')
+
+        self.stdout.write(f'Разбор правил:        {naive:.3f} с ({naive / count * 1e6:.2f} мкс/запрос)')
+        self.stdout.write(f'Компиляция таблицы:   {compiled * 1000:.3f} мс, интервалов: {len(table.prices)}')
+        self.stdout.write(f'Поиск в таблице:      {lookup:.3f} с ({lookup / count * 1e6:.2f} мкс/запрос)')
+
+        # Путь бронирования: версия правил из кэша и таблица в памяти процесса
+        if use_database:
+            started = time.perf_counter()
+            for booked in requests:
+                get_price_table(showtime).price(booked)
+            cached = time.perf_counter() - started
+            self.stdout.write(f'Таблица из кэша:      {cached:.3f} с ({cached / count * 1e6:.2f} мкс/запрос)')
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Ускорение: x{naive / max(lookup, 1e-9):.0f}'))
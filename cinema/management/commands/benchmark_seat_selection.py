@@ -0,0 +1,87 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cinema.layout import default_layout
+from cinema.occupancy import Occupancy
+from cinema.seat_selection import best_block, score_matrix
+
+
+def naive_best(occupancy, count):
+    """Перебор всех блоков с проверкой и суммированием каждого места"""
+    row_scores, prefixes = score_matrix(
+        occupancy.rows,
+        occupancy.seats_per_row,
+        settings.SEAT_IDEAL_ROW,
+        settings.SEAT_ROW_WEIGHT,
+    )
+    best = None
+    for row in range(1, occupancy.rows + 1):
+        prefix = prefixes[row - 1]
+        for seat in range(1, occupancy.seats_per_row - count + 2):
+            block = range(seat, seat + count)
+            if not all(occupancy.is_free(row, place) for place in block):
+                continue
+            score = row_scores[row - 1] + sum(prefix[place] - prefix[place - 1] for place in block) / count
+            if best is None or score < best:
+                best = score
+    return best
+
+
+def random_occupancy(rng, rows, seats_per_row, filled):
+    masks = []
+    for _ in range(rows):
+        mask = 0
+        for seat in range(seats_per_row):
+            if rng.random() < filled:
+                mask |= 1 << seat
+        masks.append(mask)
+    return Occupancy(default_layout(rows, seats_per_row), tuple(masks))
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк автоподбора мест: перебор блоков против битовых масок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=25, help='Рядов в зале')
+        parser.add_argument('--seats-per-row', type=int, default=40, help='Мест в ряду')
+        parser.add_argument('--requests', type=int, default=2000, help='Количество подборов')
+        parser.add_argument('--max-seats', type=int, default=8, help='Наибольший размер блока')
+
+    def handle(self, *args, **options):
+        rows, seats_per_row = options['rows'], options['seats_per_row']
+        count = options['requests']
+        rng = random.Random(42)
+        # Залы заполнены от пустого до почти полного
+        cases = [
+            (random_occupancy(rng, rows, seats_per_row, rng.choice((0.1, 0.5, 0.8, 0.95))),
+             rng.randint(1, options['max_seats']))
+            for _ in range(count)
+        ]
+        self.stdout.write(f'Зал {rows} x {seats_per_row} ({rows * seats_per_row} мест), подборов: {count}')
+
+        started = time.perf_counter()
+        expected = [naive_best(occupancy, size) for occupancy, size in cases]
+        naive = time.perf_counter() - started
+
+        started = time.perf_counter()
+        actual = [best_block(occupancy, size) for occupancy, size in cases]
+        fast = time.perf_counter() - started
+
+        for (occupancy, size), score, block in zip(cases, expected, actual):
+            if (score is None) != (block is None):
+                raise CommandError('Результаты подбора не совпадают')
+            if block is None:
+                continue
+            if abs(round(score, 4) - block.score) > 1e-4 or not all(
+                occupancy.is_free(block.row, seat) for seat in block.seats
+            ):
+                raise CommandError(f'Неверный блок {block} для {size} мест')
+
+        found = sum(block is not None for block in actual)
+        self.stdout.write(f'Перебор блоков:  {naive:.3f} с ({naive / count * 1e6:.1f} мкс/подбор)')
+        self.stdout.write(f'Битовые маски:   {fast:.3f} с ({fast / count * 1e6:.1f} мкс/подбор)')
+        self.stdout.write(f'Блок найден в {found} из {count}')
+        self.stdout.write(self.style.SUCCESS(f'✓ Ускорение: x{naive / max(fast, 1e-9):.0f}'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from cinema.recommendations import update_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчет рекомендаций "зрители также смотрели". По умолчанию учитывает '
+        'только просмотры после предыдущего запуска (для ежедневного запуска по cron); '
+        'раз в RECOMMENDER_FULL_EVERY_DAYS дней пересчет полный'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Пересчитать матрицу совместных просмотров целиком'
+        )
+
+    def handle(self, *args, **options):
+        run = update_recommendations(full=options['full'])
+        elapsed = (run.finished_at - run.started_at).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {"Полный" if run.full else "Инкрементный"} пересчет за {elapsed:.1f} с: '
+            f'новых просмотров {run.interactions}, обновлено фильмов {run.movies_updated}'
+        ))
@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cinema.checks import LOCAL_CACHE_BACKENDS
+from cinema.models import User
+from cinema.personalization import PROFILE_CACHE, build_all_profiles
+
+
+class Command(BaseCommand):
+    help = 'Пересчет профилей пользователей для персональной главной страницы (ежедневно по cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество пользователей в одном пакете'
+        )
+
+    def handle(self, *args, **options):
+        config = settings.CACHES[PROFILE_CACHE]
+        backend = config['BACKEND']
+        if backend in LOCAL_CACHE_BACKENDS:
+            # Профили хранятся только в кэше: из локального их не увидит ни один веб-воркер
+            raise CommandError(
+                f'Кэш профилей ({backend}) виден только этому процессу, профили '
+                'пропадут вместе с ним. Нужен общий кэш: DatabaseCache или Redis.'
+            )
+        max_entries = config.get('OPTIONS', {}).get('MAX_ENTRIES')
+        users = User.objects.count()
+        if max_entries and users > max_entries:
+            # При переполнении кэш удаляет треть записей, и пересчет вытеснял бы сам себя
+            raise CommandError(
+                f'Пользователей ({users}) больше, чем вмещает кэш профилей ({max_entries}). '
+                'Увеличьте PROFILE_CACHE_MAX_ENTRIES.'
+            )
+        started = time.perf_counter()
+        total = build_all_profiles(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Профилей пересчитано: {total} за {elapsed:.1f} с'
+        ))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from PIL import Image, UnidentifiedImageError
+
+from cinema.images import generate_variants, get_variants
+from cinema.models import Movie, Cinema, Promotion
+
+
+class Command(BaseCommand):
+    help = 'Генерация уменьшенных вариантов постеров и изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать варианты, даже если они уже есть'
+        )
+
+    def handle(self, *args, **options):
+        sources = [
+            (Movie, 'poster'),
+            (Cinema, 'image'),
+            (Promotion, 'image'),
+        ]
+        created = 0
+        for model, field in sources:
+            names = (
+                model.objects.exclude(**{field: ''})
+                .exclude(**{f'{field}__isnull': True})
+                .values_list(field, flat=True)
+            )
+            for name in names.iterator():
+                if not options['force'] and get_variants(name) is not None:
+                    continue
+                try:
+                    generate_variants(name)
+                except (OSError, UnidentifiedImageError, ValueError, Image.DecompressionBombError) as e:
+                    self.stdout.write(self.style.WARNING(f'⚠ {name}: {e}'))
+                    continue
+                created += 1
+                self.stdout.write(self.style.SUCCESS(f'✓ {name}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Готово, обработано изображений: {created}'))
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cinema.schedule_import import import_schedule, parse_rows, ScheduleImportError
+
+
+class Command(BaseCommand):
+    help = 'Пакетный импорт расписания сеансов из CSV или JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу CSV или JSON')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'json'],
+            default=None,
+            help='Формат файла (по умолчанию определяется по содержимому)'
+        )
+        parser.add_argument(
+            '--skip-conflicts',
+            action='store_true',
+            help='Пропускать пересекающиеся сеансы вместо отмены импорта'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только проверить расписание, ничего не сохранять'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with open(options['path'], 'rb') as fh:
+            data = fh.read()
+
+        try:
+            rows = parse_rows(data, options['format'])
+            result = import_schedule(
+                rows,
+                skip_conflicts=options['skip_conflicts'],
+                dry_run=options['dry_run'],
+            )
+        except ScheduleImportError as e:
+            for error in e.errors[:50]:
+                self.stdout.write(self.style.ERROR(error))
+            raise CommandError(f'Импорт отменен, ошибок: {len(e.errors)}')
+
+        for message in result.skipped[:50]:
+            self.stdout.write(self.style.WARNING(f'⚠ {message}'))
+
+        elapsed = time.perf_counter() - started
+        action = 'Проверено' if options['dry_run'] else 'Создано'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {action} сеансов: {len(result.showtimes)}, пропущено: {len(result.skipped)} '
+            f'({elapsed:.2f} с)'
+        ))
@@ -5,6 +5,7 @@ from cinema.models import (
     User, City, Genre, Movie, Cinema, Hall,
     ShowTime, Promotion, Rule
 )
+from cinema.scheduling import ScheduleIndex, autofill_day, day_bounds
 import requests
 from io import BytesIO
 from django.core.files import File
@@ -190,12 +191,25 @@ class Command(BaseCommand):
 
         # Создание кинотеатров
         self.stdout.write('Создание кинотеатров...')
+        # Координаты центров городов
+        city_coordinates = {
+            'Москва': (55.755826, 37.617300),
+            'Санкт-Петербург': (59.939095, 30.315868),
+            'Новосибирск': (55.030199, 82.920430),
+            'Екатеринбург': (56.838011, 60.597465),
+            'Казань': (55.796127, 49.106414),
+            'Тюмень': (57.153033, 65.534328),
+            'Томск': (56.484645, 84.947649),
+        }
         cinemas = []
         for city_name, city in cities.items():
+            latitude, longitude = city_coordinates.get(city_name, (None, None))
             cinema, created = Cinema.objects.get_or_create(
                 name=f'КиноМир {city_name}',
                 city=city,
                 defaults={
+                    'latitude': latitude,
+                    'longitude': longitude,
                     'address': f'ул. Центральная, 1, {city_name}',
                     'phone': '+7 (800) 555-35-35',
                     'description': f'Современный кинотеатр в центре города {city_name}',
@@ -226,31 +240,25 @@ class Command(BaseCommand):
 
         # Создание сеансов
         self.stdout.write('Создание сеансов...')
-        now = timezone.now()
-        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        today = timezone.localdate()
+        week_start, _ = day_bounds(today)
+        _, week_end = day_bounds(today + timedelta(days=6))
         
-        for hall in halls:  # Все залы
-            for movie in movies:  # Все фильмы
-                for day in range(7):  # На неделю вперед
-                    for hour in [10, 13, 16, 19, 21]:
-                        # Вычисляем дату и время сеанса
-                        showtime_date = today + timedelta(days=day, hours=hour)
-                        
-                        # Пропускаем прошедшие сеансы
-                        if showtime_date <= now:
-                            continue
-                        
-                        showtime, created = ShowTime.objects.get_or_create(
-                            movie=movie,
-                            hall=hall,
-                            start_time=showtime_date,
-                            defaults={
-                                'price': 300.00,
-                                'is_active': True
-                            }
-                        )
-                        if created:
-                            self.stdout.write(self.style.SUCCESS(f'✓ Создан сеанс: {movie.title} в {hall}'))
+        # Расписание всех залов на неделю, сеансы без пересечений
+        schedule_index = ScheduleIndex.load([hall.id for hall in halls], week_start, week_end)
+        new_showtimes = []
+        for hall_number, hall in enumerate(halls):
+            for day in range(7):  # На неделю вперед
+                new_showtimes.extend(autofill_day(
+                    hall,
+                    today + timedelta(days=day),
+                    movies,
+                    price=300.00,
+                    schedule=schedule_index.hall(hall.id),
+                    offset=hall_number + day,
+                ))
+        ShowTime.objects.bulk_create(new_showtimes)
+        self.stdout.write(self.style.SUCCESS(f'✓ Создано сеансов: {len(new_showtimes)}'))
 
         # Создание акций
         self.stdout.write('Создание акций...')
@@ -0,0 +1,147 @@
+import asyncio
+import resource
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+
+from cinema.broker import get_broker
+from cinema.models import ShowTime
+from cinema.occupancy import get_occupancy, record_seat_change, seat_channel
+from kino_project.asgi import application
+
+
+class SseClient:
+    """Соединение с ASGI-приложением в том же процессе (без сети)"""
+
+    def __init__(self, app, path, number):
+        self.app = app
+        self.path = path
+        self.number = number
+        self.status = None
+        self.events = []
+        self.buffer = ''
+        self.connected = asyncio.Event()
+        self.disconnect = asyncio.Event()
+        self.request_sent = False
+
+    async def receive(self):
+        if not self.request_sent:
+            self.request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        elif message['type'] == 'http.response.body':
+            self.buffer += message.get('body', b'').decode()
+            while '\n\n' in self.buffer:
+                block, self.buffer = self.buffer.split('\n\n', 1)
+                for line in block.splitlines():
+                    if line.startswith('event: '):
+                        self.events.append((line[7:], time.perf_counter()))
+            self.connected.set()
+
+    async def run(self):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': self.path,
+            'raw_path': self.path.encode(),
+            'root_path': '',
+            'query_string': b'',
+            'headers': [(b'host', b'localhost')],
+            'client': ('127.0.0.1', 10000 + self.number),
+            'server': ('localhost', 80),
+        }
+        await self.app(scope, self.receive, self.send)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест живой схемы зала: N SSE-соединений в одном процессе '
+        '(сверх SEAT_EVENTS_MAX_STREAMS соединения получают 503)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=2000, help='Одновременных соединений')
+        parser.add_argument('--events', type=int, default=20, help='Событий мест для рассылки')
+        parser.add_argument('--showtime', type=int, help='ID сеанса (по умолчанию - ближайший)')
+
+    def handle(self, *args, **options):
+        if options['connections'] < 1 or options['events'] < 1:
+            raise CommandError('Нужно хотя бы одно соединение и одно событие')
+        showtimes = ShowTime.objects.select_related('hall')
+        if options['showtime']:
+            showtime = showtimes.filter(pk=options['showtime']).first()
+        else:
+            showtime = showtimes.filter(start_time__gt=timezone.now()).order_by('start_time').first()
+        if showtime is None:
+            raise CommandError('Сеанс не найден')
+        occupancy = get_occupancy(showtime)
+        free = [
+            (row, seat)
+            for row in range(1, occupancy.rows + 1)
+            for seat in range(1, occupancy.seats_per_row + 1)
+            if occupancy.is_free(row, seat)
+        ]
+        if not free:
+            raise CommandError('В зале нет свободных мест')
+        asyncio.run(self.load_test(showtime, free, options['connections'], options['events']))
+
+    async def load_test(self, showtime, free, count, events):
+        broker = get_broker()
+        channel = seat_channel(showtime.pk)
+        path = reverse('cinema:api_seat_events', args=[showtime.pk])
+        memory_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        started = time.perf_counter()
+        clients = [SseClient(application, path, number) for number in range(count)]
+        tasks = [asyncio.create_task(client.run()) for client in clients]
+        await asyncio.wait_for(asyncio.gather(*(client.connected.wait() for client in clients)), 300)
+        connect_time = time.perf_counter() - started
+        memory_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        errors = sum(client.status not in (200, 503) for client in clients)
+        if errors:
+            raise CommandError(f'Ответов с ошибкой: {errors}')
+        streams = [client for client in clients if client.status == 200]
+        if not streams:
+            raise CommandError('Ни одного потока: проверьте SEAT_EVENTS_MAX_STREAMS')
+        self.stdout.write(
+            f'Подключено {broker.subscriber_count(channel)} из {count} за {connect_time:.2f} с '
+            f'(отказано по пределу: {count - len(streams)}), '
+            f'память +{(memory_after - memory_before) / 1024:.1f} МБ '
+            f'(~{(memory_after - memory_before) / len(streams):.1f} КБ на поток)'
+        )
+
+        latencies = []
+        for number in range(events):
+            row, seat = free[number // 2 % len(free)]
+            before = [len(client.events) for client in streams]
+            published = time.perf_counter()
+            # Тестовые события: свободное место занимается и сразу освобождается
+            await asyncio.to_thread(record_seat_change, showtime.pk, row, seat, number % 2 == 0)
+            while any(len(client.events) == seen for client, seen in zip(streams, before)):
+                await asyncio.sleep(0.001)
+            latencies.append(max(client.events[-1][1] for client in streams) - published)
+        if events % 2:
+            await asyncio.to_thread(record_seat_change, showtime.pk, row, seat, False)
+
+        for client in clients:
+            client.disconnect.set()
+        await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 60)
+
+        self.stdout.write(
+            f'Событий: {events}, доставка всем {len(streams)}: '
+            f'медиана {statistics.median(latencies) * 1000:.1f} мс, '
+            f'максимум {max(latencies) * 1000:.1f} мс'
+        )
+        self.stdout.write(f'Подписок после отключения: {broker.subscriber_count(channel)}')
+        self.stdout.write(self.style.SUCCESS('✓ Нагрузочный тест завершен'))
@@ -0,0 +1,90 @@
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cinema.waiting_room import clear_queue, join_queue, queue_status, use_pass
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест очереди на бронирование: наплыв зрителей на один сеанс'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000, help='Зрителей, пришедших одновременно')
+        parser.add_argument('--rate', type=int, default=120, help='Пропускная способность, зрителей в минуту')
+        parser.add_argument('--duration', type=int, default=300, help='Длительность (секунды модельного времени)')
+        parser.add_argument('--poll', type=int, default=5, help='Интервал опроса позиции, секунды')
+        parser.add_argument('--tickets', type=int, default=20, help='Сколько билетов пытается купить зритель')
+
+    def handle(self, *args, **options):
+        users, rate = options['users'], options['rate']
+        duration, poll = options['duration'], options['poll']
+        tickets = options['tickets']
+        if min(users, rate, duration, poll, tickets) < 1:
+            raise CommandError('Все параметры должны быть положительными')
+
+        # Модельные часы: состояние в настоящем кэше, время подставляется
+        showtime_id = f'load-test-{time.time_ns()}'
+        start = time.time()
+        admitted_at = Counter()
+        inserts_at = Counter()
+        requests = 0
+
+        def book(position, second):
+            # Как в book_ticket: без остатка по пропуску вставка не выполняется
+            for _ in range(tickets):
+                if not use_pass(showtime_id, position):
+                    break
+                inserts_at[second] += 1
+
+        started = time.perf_counter()
+        # Номера зрителей - то, что хранится у них в cookie
+        waiting = [join_queue(showtime_id, rate, now=start) for _ in range(users)]
+        requests += users
+        for second in range(duration + 1):
+            still_waiting = []
+            for position in waiting:
+                if (position + second) % poll:
+                    still_waiting.append(position)
+                    continue
+                requests += 1
+                status = queue_status(showtime_id, position, now=start + second)
+                if status is None:
+                    raise CommandError('Очередь сеанса потеряна')
+                if status.admitted:
+                    admitted_at[second] += 1
+                    book(position, second)
+                else:
+                    still_waiting.append(position)
+            waiting = still_waiting
+        elapsed = time.perf_counter() - started
+        clear_queue(showtime_id)
+
+        burst = settings.WAITING_ROOM_BURST
+        per_pass = min(tickets, settings.WAITING_ROOM_PASS_TICKETS)
+        window = min(60, duration + 1)
+        peak_window = max(
+            sum(inserts_at[second] for second in range(first, first + window))
+            for first in range(duration + 2 - window)
+        )
+        bound = (rate * window / 60 + burst) * per_pass
+        self.stdout.write(
+            f'Наплыв: {users} зрителей, пропускная способность {rate}/мин, '
+            f'запас {burst}, до {per_pass} билетов на пропуск'
+        )
+        self.stdout.write(f'Без очереди: до {users * tickets} вставок билетов сразу')
+        self.stdout.write(
+            f'С очередью за {duration} с: допущено {sum(admitted_at.values())}, '
+            f'ждут {len(waiting)}, вставок {sum(inserts_at.values())}'
+        )
+        self.stdout.write(
+            f'Вставок: максимум {max(inserts_at.values(), default=0)} за секунду, '
+            f'{peak_window} за {window} с (граница {bound:.0f})'
+        )
+        self.stdout.write(
+            f'Запросов к очереди: {requests}, {elapsed / requests * 1e6:.1f} мкс на запрос'
+        )
+        if peak_window > bound:
+            raise CommandError('Поток вставок превысил границу')
+        self.stdout.write(self.style.SUCCESS('✓ Нагрузка на базу ограничена'))
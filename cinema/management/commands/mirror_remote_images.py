@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from cinema.mirror import mirror_many, remote_image_urls
+from cinema.models import RemoteImage
+
+
+class Command(BaseCommand):
+    help = 'Загрузка локальных копий внешних постеров и изображений кинотеатров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Количество параллельных загрузок (по умолчанию MIRROR_WORKERS)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Скачать заново без проверки ETag/Last-Modified'
+        )
+
+    def handle(self, *args, **options):
+        urls = remote_image_urls()
+        self.stdout.write(f'Внешних изображений: {len(urls)}')
+
+        results = mirror_many(urls, workers=options['workers'], force=options['force'])
+
+        failed = 0
+        for url, result in results.items():
+            if isinstance(result, RemoteImage) and result.file:
+                self.stdout.write(self.style.SUCCESS(f'✓ {url} -> {result.file}'))
+            else:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'⚠ {url}: {result}'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {len(results) - failed} сохранено, {failed} с ошибками'
+        ))
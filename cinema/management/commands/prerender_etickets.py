@@ -0,0 +1,53 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from cinema.etickets import render_missing
+from cinema.models import Ticket
+from cinema.occupancy import ACTIVE_STATUSES
+
+
+class Command(BaseCommand):
+    help = 'Заранее нарисовать электронные билеты на сеансы дня (по умолчанию - завтрашнего)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Дата сеансов, ГГГГ-ММ-ДД')
+        parser.add_argument('--workers', type=int, default=None, help='Количество процессов (по умолчанию - число ядер)')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Билетов на одно задание процесса')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                day = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError('Дата в формате ГГГГ-ММ-ДД')
+        else:
+            day = timezone.localdate() + timedelta(days=1)
+        start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+        ticket_ids = list(
+            Ticket.objects.filter(
+                status__in=ACTIVE_STATUSES,
+                showtime__start_time__gte=start,
+                showtime__start_time__lt=start + timedelta(days=1),
+            ).order_by('pk').values_list('pk', flat=True)
+        )
+        size = options['chunk_size']
+        chunks = [ticket_ids[i:i + size] for i in range(0, len(ticket_ids), size)]
+        self.stdout.write(f'Билетов на {day:%d.%m.%Y}: {len(ticket_ids)}')
+
+        started = time.perf_counter()
+        # Соединения родителя не должны наследоваться процессами пула
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            rendered = sum(executor.map(render_missing, chunks))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Нарисовано билетов: {rendered} (уже готовых: {len(ticket_ids) - rendered}) '
+            f'за {elapsed:.1f} с'
+        ))
@@ -0,0 +1,45 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Удаление истекших сессий пакетами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество сессий, удаляемых за один запрос'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.0,
+            help='Пауза между пакетами в секундах, чтобы не нагружать базу'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pause = options['sleep']
+        now = timezone.now()
+        total = 0
+
+        while True:
+            # Выборка ключей идет по индексу expire_date, удаление - по первичному ключу
+            keys = list(
+                Session.objects.filter(expire_date__lt=now)
+                .values_list('session_key', flat=True)[:batch_size]
+            )
+            if not keys:
+                break
+            deleted, _ = Session.objects.filter(session_key__in=keys).delete()
+            total += deleted
+            self.stdout.write(f'Удалено сессий: {total}')
+            if pause:
+                time.sleep(pause)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Удаление завершено, всего удалено: {total}'))
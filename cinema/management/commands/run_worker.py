@@ -0,0 +1,81 @@
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from cinema.jobs import requeue_stale, work
+
+
+def _ignore_signals():
+    # Остановку процессов пула ведет родитель через общий Event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
+class Command(BaseCommand):
+    help = 'Обработчик фоновых задач: пул потоков или процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', default='default', help='Очередь задач')
+        parser.add_argument('--workers', type=int, default=4, help='Количество обработчиков')
+        parser.add_argument(
+            '--mode',
+            choices=['thread', 'process'],
+            default='thread',
+            help='Потоки (задачи ждут ввода-вывода) или процессы (задачи нагружают CPU)'
+        )
+        parser.add_argument('--batch', type=int, default=10, help='Задач за одно обращение к очереди')
+        parser.add_argument('--drain', action='store_true', help='Завершиться, когда очередь опустеет')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1 or options['batch'] < 1:
+            raise CommandError('Нужен хотя бы один обработчик и пакет из одной задачи')
+        if options['mode'] == 'process':
+            # Соединения родителя не должны наследоваться процессами пула
+            connections.close_all()
+            manager = multiprocessing.Manager()
+            stop = manager.Event()
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_ignore_signals)
+        else:
+            manager = None
+            stop = threading.Event()
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job-worker')
+
+        def shutdown(signum, frame):
+            self.stdout.write('Остановка: обработчики завершают текущие задачи...')
+            stop.set()
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        self.stdout.write(
+            f'Очередь "{options["queue"]}": {workers} обработчиков ({options["mode"]}), '
+            f'пакет {options["batch"]}'
+        )
+        started = time.perf_counter()
+        with executor:
+            futures = [
+                executor.submit(work, stop, options['queue'], options['batch'], None, options['drain'])
+                for _ in range(workers)
+            ]
+            while True:
+                finished, pending = wait(futures, timeout=settings.JOB_TIMEOUT / 4)
+                if not pending:
+                    break
+                requeued = requeue_stale()
+                if requeued:
+                    self.stdout.write(f'Возвращено в очередь зависших задач: {requeued}')
+        if manager is not None:
+            manager.shutdown()
+
+        done = sum(future.result()[0] for future in futures)
+        failed = sum(future.result()[1] for future in futures)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Выполнено задач: {done}, с ошибкой: {failed} за {elapsed:.1f} с'
+        ))
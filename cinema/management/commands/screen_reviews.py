@@ -0,0 +1,84 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from cinema.models import Review
+from cinema.screening import save_results, screen_batch
+
+
+class Command(BaseCommand):
+    help = 'Предварительная проверка накопившихся отзывов в пуле процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Проверить заново все отзывы, а не только непроверенные'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Количество процессов (по умолчанию - число ядер)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество отзывов, записываемых за одну транзакцию'
+        )
+
+    def _batches(self, queryset, batch_size):
+        last_id = 0
+        while True:
+            rows = list(
+                queryset.filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'rating', 'text', 'movie_id')[:batch_size]
+            )
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield rows
+
+    def handle(self, *args, **options):
+        queryset = Review.objects.all()
+        if not options['all']:
+            queryset = queryset.filter(screened_at__isnull=True)
+
+        batch_size = options['batch_size']
+        chunk_size = 500
+        total = flagged = 0
+        started = time.perf_counter()
+
+        # Соединения родителя не должны наследоваться процессами пула
+        connections.close_all()
+
+        def save(rows, pending):
+            nonlocal total, flagged
+            results = [result for chunk in pending for result in chunk]
+            flagged += save_results(results, {row[0]: row[3] for row in rows})
+            total += len(rows)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'Проверено: {total}, на модерацию: {flagged} ({total / elapsed:.0f} отзывов/с)')
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            previous = None
+            for rows in self._batches(queryset, batch_size):
+                # Текст проверяется в процессах, пока здесь записывается
+                # предыдущий пакет (дубликаты ищутся тоже здесь)
+                chunks = [
+                    [row[:3] for row in rows[start:start + chunk_size]]
+                    for start in range(0, len(rows), chunk_size)
+                ]
+                pending = executor.map(screen_batch, chunks)
+                if previous is not None:
+                    save(*previous)
+                previous = (rows, pending)
+            if previous is not None:
+                save(*previous)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Проверено отзывов: {total}, отправлено на модерацию: {flagged}'
+        ))
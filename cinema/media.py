@@ -0,0 +1,217 @@
+"""
+Хранение и раздача загруженных медиафайлов.
+
+``FingerprintedStorage`` добавляет в имя загружаемого файла хэш
+содержимого и заранее сжимает текстовые форматы (gzip, brotli при
+наличии модуля). ``serve_media`` отдает файлы через ``FileResponse``,
+поддерживает Range, ETag и отдает файлы с хэшем в имени с
+``Cache-Control: immutable``.
+
+Сайт работает под ASGI (uvicorn), где нет ``wsgi.file_wrapper`` и
+sendfile: Django читает файл блоками в воркере. В продакшене медиафайлы
+должен раздавать фронтовой прокси или CDN - заголовки кэширования
+позволяют им держать файлы, а представление остается запасным путем.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .images import MANIFEST_ROOT
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+
+# Имена вида poster.3f2a9c0d1e4b.jpg - содержимое по такому имени не меняется
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12,16}\.[A-Za-z0-9]+$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Форматы, которые имеет смысл сжимать (JPEG/PNG/WebP уже сжаты)
+COMPRESSIBLE_TYPES = {'image/svg+xml', 'application/json', 'application/xml', 'text/plain', 'text/csv'}
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+# Файлы, которые ищутся по фиксированному имени и не получают хэш
+UNHASHED_PREFIXES = (MANIFEST_ROOT + '/',)
+
+
+def fingerprinted_name(name, content):
+    """Имя файла с хэшем содержимого: poster.jpg -> poster.<hash>.jpg"""
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    root, ext = os.path.splitext(name)
+    return f'{root}.{hasher.hexdigest()[:12]}{ext}'
+
+
+def precompress(path):
+    """Создать .gz/.br рядом с файлом, если формат сжимается и это выгодно"""
+    content_type, _ = mimetypes.guess_type(path)
+    if content_type not in COMPRESSIBLE_TYPES and not (content_type or '').startswith('text/'):
+        return []
+    with open(path, 'rb') as fh:
+        data = fh.read()
+
+    compressors = [('.gz', lambda raw: gzip.compress(raw, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append(('.br', lambda raw: brotli.compress(raw, quality=11)))
+
+    created = []
+    for suffix, compress in compressors:
+        compressed = compress(data)
+        # Сжатая копия нужна, только если она заметно меньше оригинала
+        if len(compressed) < len(data) * settings.MEDIA_PRECOMPRESS_RATIO:
+            with open(path + suffix, 'wb') as fh:
+                fh.write(compressed)
+            created.append(path + suffix)
+    return created
+
+
+class FingerprintedStorage(FileSystemStorage):
+    """Файловое хранилище с хэшем содержимого в имени и предварительным сжатием"""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if not HASHED_NAME_RE.search(name) and not name.startswith(UNHASHED_PREFIXES):
+            name = fingerprinted_name(name, content)
+            # Файл с тем же содержимым уже сохранен
+            if self.exists(name):
+                return name
+        name = super().save(name, content, max_length=max_length)
+        precompress(self.path(name))
+        return name
+
+    def delete(self, name):
+        super().delete(name)
+        for _, suffix in PRECOMPRESSED:
+            if self.exists(name + suffix):
+                super().delete(name + suffix)
+
+
+class _RangeFile:
+    """Ограниченное чтение открытого файла (для диапазона не до конца файла)"""
+
+    def __init__(self, fh, length):
+        self._fh = fh
+        self._remaining = length
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._fh.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._fh.close()
+
+
+def _parse_range(header, size):
+    """(start, end) для одного диапазона, None - отдать файл целиком, ValueError - 416"""
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-N: последние N байт
+        length = int(end)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def serve_media(request, path, document_root=None):
+    """Отдать медиафайл с поддержкой Range, ETag и сжатых копий"""
+    document_root = document_root or settings.MEDIA_ROOT
+    path = posixpath.normpath(path).lstrip('/')
+    fullpath = Path(safe_join(document_root, path))
+    if not fullpath.is_file():
+        raise Http404('Файл не найден')
+
+    stat = fullpath.stat()
+    content_type, _ = mimetypes.guess_type(str(fullpath))
+    content_type = content_type or 'application/octet-stream'
+    cache_control = IMMUTABLE_CACHE_CONTROL if HASHED_NAME_RE.search(path) else DEFAULT_CACHE_CONTROL
+    has_compressed = any(os.path.exists(str(fullpath) + suffix) for _, suffix in PRECOMPRESSED)
+
+    # Сжатая копия выбирается только для запросов без Range
+    serve_path, encoding = str(fullpath), None
+    if has_compressed and 'Range' not in request.headers:
+        accept_encoding = request.headers.get('Accept-Encoding', '')
+        for name, suffix in PRECOMPRESSED:
+            if name in accept_encoding and os.path.exists(serve_path + suffix):
+                serve_path, encoding = serve_path + suffix, name
+                break
+
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}{"-" + encoding if encoding else ""}"'
+    if request.headers.get('If-None-Match') == etag or (
+        'If-None-Match' not in request.headers
+        and not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime)
+    ):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+
+    range_header = request.headers.get('Range')
+    if range_header and request.headers.get('If-Range', etag) != etag:
+        range_header = None
+
+    byte_range = None
+    if range_header:
+        try:
+            byte_range = _parse_range(range_header, stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    fh = open(serve_path, 'rb')
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        fh.seek(start)
+        # Диапазон до конца файла отдается самим файлом, без обертки
+        body = fh if end == stat.st_size - 1 else _RangeFile(fh, length)
+        response = FileResponse(body, status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = str(length)
+    else:
+        response = FileResponse(fh, content_type=content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    if has_compressed:
+        response['Vary'] = 'Accept-Encoding'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control
+    return response
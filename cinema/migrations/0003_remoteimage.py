@@ -0,0 +1,28 @@
+# Generated by Django 5.0 on 2026-10-19 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0002_cinema_image_cinema_image_url_movie_poster_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RemoteImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(unique=True, verbose_name='Адрес')),
+                ('file', models.CharField(blank=True, max_length=255, verbose_name='Локальный файл')),
+                ('etag', models.CharField(blank=True, max_length=255, verbose_name='ETag')),
+                ('last_modified', models.CharField(blank=True, max_length=64, verbose_name='Last-Modified')),
+                ('checked_at', models.DateTimeField(blank=True, null=True, verbose_name='Последняя проверка')),
+            ],
+            options={
+                'verbose_name': 'Внешнее изображение',
+                'verbose_name_plural': 'Внешние изображения',
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0 on 2026-10-19 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0003_remoteimage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='showtime',
+            index=models.Index(fields=['hall', 'start_time'], name='showtime_hall_start_idx'),
+        ),
+    ]
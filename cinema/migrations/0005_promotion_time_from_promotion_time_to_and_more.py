@@ -0,0 +1,50 @@
+# Generated by Django 5.0 on 2026-10-19 11:18
+
+import cinema.models
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0004_showtime_showtime_hall_start_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promotion',
+            name='time_from',
+            field=models.TimeField(blank=True, null=True, verbose_name='Сеансы с'),
+        ),
+        migrations.AddField(
+            model_name='promotion',
+            name='time_to',
+            field=models.TimeField(blank=True, null=True, verbose_name='Сеансы до'),
+        ),
+        migrations.AddField(
+            model_name='promotion',
+            name='weekdays',
+            field=models.CharField(blank=True, help_text='Дни недели сеанса через запятую (1 - пн, 7 - вс), пусто - все дни', max_length=20, validators=[cinema.models.validate_weekdays], verbose_name='Дни недели'),
+        ),
+        migrations.CreateModel(
+            name='PriceRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Название')),
+                ('adjustment_percent', models.IntegerField(help_text='Положительное значение - наценка, отрицательное - скидка', validators=[django.core.validators.MinValueValidator(-100)], verbose_name='Изменение цены (%)')),
+                ('weekdays', models.CharField(blank=True, help_text='Дни недели через запятую (1 - пн, 7 - вс), пусто - все дни', max_length=20, validators=[cinema.models.validate_weekdays], verbose_name='Дни недели')),
+                ('time_from', models.TimeField(blank=True, null=True, verbose_name='Сеансы с')),
+                ('time_to', models.TimeField(blank=True, null=True, verbose_name='Сеансы до')),
+                ('occupancy_from', models.PositiveSmallIntegerField(blank=True, help_text='Правило действует, когда занято не меньше указанного процента мест', null=True, validators=[django.core.validators.MaxValueValidator(100)], verbose_name='Заполненность от (%)')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активно')),
+                ('hall', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='price_rules', to='cinema.hall', verbose_name='Зал')),
+            ],
+            options={
+                'verbose_name': 'Правило цены',
+                'verbose_name_plural': 'Правила цен',
+                'ordering': ['name'],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0 on 2026-10-19 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0005_promotion_time_from_promotion_time_to_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='promotion',
+            index=models.Index(fields=['is_active', 'start_date', 'end_date'], name='promotion_validity_idx'),
+        ),
+    ]
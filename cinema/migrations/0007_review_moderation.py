@@ -0,0 +1,48 @@
+# Generated by Django 5.0 on 2026-10-19 11:22
+
+from django.db import migrations, models
+from django.db.models import Avg, Count
+
+
+def fill_rating_summaries(apps, schema_editor):
+    Movie = apps.get_model('cinema', 'Movie')
+    Review = apps.get_model('cinema', 'Review')
+    summaries = (
+        Review.objects.filter(is_approved=True)
+        .values('movie_id')
+        .annotate(count=Count('id'), average=Avg('rating'))
+    )
+    for summary in summaries:
+        Movie.objects.filter(pk=summary['movie_id']).update(
+            reviews_count=summary['count'],
+            reviews_rating=round(summary['average'], 1),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0006_promotion_validity_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='reviews_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Одобренных отзывов'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='reviews_rating',
+            field=models.DecimalField(decimal_places=1, default=0, editable=False, max_digits=3, verbose_name='Оценка зрителей'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['-created_at', '-id'], name='review_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_approved', False)), fields=['-created_at', '-id'], name='review_pending_idx'),
+        ),
+        migrations.RunPython(fill_rating_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0 on 2026-10-19 11:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0007_review_moderation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='screened_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата проверки'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='screening_flags',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Причины проверки'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='screening_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Оценка подозрительности'),
+        ),
+        migrations.CreateModel(
+            name='ReviewBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(db_index=True, verbose_name='Корзина')),
+                ('review', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='cinema.review', verbose_name='Отзыв')),
+            ],
+            options={
+                'verbose_name': 'Полоса подписи отзыва',
+                'verbose_name_plural': 'Полосы подписей отзывов',
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.0 on 2026-10-19 11:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0008_review_screening'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommenderRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(verbose_name='Начало')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Окончание')),
+                ('full', models.BooleanField(default=False, verbose_name='Полный пересчет')),
+                ('interactions', models.PositiveIntegerField(default=0, verbose_name='Новых просмотров')),
+                ('movies_updated', models.PositiveIntegerField(default=0, verbose_name='Обновлено фильмов')),
+            ],
+            options={
+                'verbose_name': 'Пересчет рекомендаций',
+                'verbose_name_plural': 'Пересчеты рекомендаций',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovieCooccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Зрителей')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cinema.movie', verbose_name='Фильм')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cinema.movie', verbose_name='Другой фильм')),
+            ],
+            options={
+                'verbose_name': 'Совместный просмотр',
+                'verbose_name_plural': 'Совместные просмотры',
+                'unique_together': {('movie', 'other')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MovieSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarities', to='cinema.movie', verbose_name='Фильм')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cinema.movie', verbose_name='Похожий фильм')),
+            ],
+            options={
+                'verbose_name': 'Похожий фильм',
+                'verbose_name_plural': 'Похожие фильмы',
+                'ordering': ['movie', 'rank'],
+                'unique_together': {('movie', 'similar')},
+            },
+        ),
+    ]
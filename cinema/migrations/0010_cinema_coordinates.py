@@ -0,0 +1,24 @@
+# Generated by Django 5.0 on 2026-10-19 11:35
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0009_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cinema',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)], verbose_name='Широта'),
+        ),
+        migrations.AddField(
+            model_name='cinema',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)], verbose_name='Долгота'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0 on 2026-10-19 11:43
+
+import cinema.models
+from django.db import migrations, models
+
+from cinema.layout import default_layout
+
+
+def fill_hall_layouts(apps, schema_editor):
+    # Существующие залы - прямоугольные из обычных мест
+    Hall = apps.get_model('cinema', 'Hall')
+    halls = list(Hall.objects.all())
+    for hall in halls:
+        hall.layout = default_layout(hall.rows, hall.seats_per_row)
+        hall.capacity = hall.rows * hall.seats_per_row
+    Hall.objects.bulk_update(halls, ['layout', 'capacity'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0010_cinema_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hall',
+            name='capacity',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Мест в продаже'),
+        ),
+        migrations.AddField(
+            model_name='hall',
+            name='layout',
+            field=models.TextField(blank=True, help_text='Ряды через "/", в ряду - серии вида 12S: S - обычное место, V - VIP, W - для коляски, X - неисправное, _ - проход; 5*12S - пять одинаковых рядов. Пусто - прямоугольный зал по числу рядов и мест.', validators=[cinema.models.validate_layout], verbose_name='Схема зала'),
+        ),
+        migrations.RunPython(fill_hall_layouts, migrations.RunPython.noop),
+    ]
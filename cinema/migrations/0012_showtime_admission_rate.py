@@ -0,0 +1,19 @@
+# Generated by Django 5.0 on 2026-10-19 11:54
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0011_hall_layout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='showtime',
+            name='admission_rate',
+            field=models.PositiveIntegerField(blank=True, help_text='Для популярных сеансов: сколько зрителей в минуту допускать к бронированию. Пусто - без очереди.', null=True, validators=[django.core.validators.MinValueValidator(1)], verbose_name='Очередь на бронирование (зрителей в минуту)'),
+        ),
+    ]
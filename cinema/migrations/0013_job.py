@@ -0,0 +1,38 @@
+# Generated by Django 5.0 on 2026-10-19 12:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0012_showtime_admission_rate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('queue', models.CharField(default='default', max_length=50, verbose_name='Очередь')),
+                ('task', models.CharField(max_length=200, verbose_name='Задача')),
+                ('args', models.JSONField(blank=True, default=list, verbose_name='Аргументы')),
+                ('kwargs', models.JSONField(blank=True, default=dict, verbose_name='Именованные аргументы')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('running', 'Выполняется'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Запуск не раньше')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5, verbose_name='Максимум попыток')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='Обработчик')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Взята в работу')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+            ],
+            options={
+                'verbose_name': 'Фоновая задача',
+                'verbose_name_plural': 'Фоновые задачи',
+                'ordering': ['run_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['queue', 'run_at'], name='job_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0 on 2026-10-19 12:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0013_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='checked_in_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Проход в зал'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='checked_in_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Проверил'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0 on 2026-10-19 12:14
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0014_ticket_checkin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Забронирован'), (2, 'Оплачен'), (3, 'Отменен'), (4, 'Проход в зал'), (5, 'Изменение цены')], verbose_name='Событие')),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Цена')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время')),
+                ('actor', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Кто')),
+                ('ticket', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='cinema.ticket', verbose_name='Билет')),
+            ],
+            options={
+                'verbose_name': 'Событие билета',
+                'verbose_name_plural': 'События билетов',
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['ticket', 'created_at'], name='ticket_event_timeline_idx'), models.Index(fields=['created_at'], name='ticket_event_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-19 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinema', '0016_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='moderated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата модерации'),
+        ),
+    ]
@@ -0,0 +1,242 @@
+"""
+Зеркалирование внешних изображений (Movie.poster_url, Cinema.image_url).
+
+Файл скачивается в ``MEDIA_ROOT/mirrors/`` и записывается в поле
+``poster``/``image``, если оно пустое или уже содержит зеркальную копию.
+Шаблоны выводят локальный файл и используют внешний адрес только пока
+копии нет. Повторные проверки идут с ETag/If-Modified-Since.
+
+Загрузчик подключается через настройку ``MIRROR_FETCHER`` - в тестах его
+можно заменить локальной заглушкой.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from io import BytesIO
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from PIL import Image, UnidentifiedImageError
+
+from .images import schedule_variants
+from .models import Movie, Cinema, RemoteImage
+
+logger = logging.getLogger(__name__)
+
+MIRROR_ROOT = 'mirrors'
+
+# Ошибки загрузки, после которых адрес пропускается до следующей проверки
+IMAGE_ERRORS = (
+    requests.RequestException, OSError, UnidentifiedImageError, ValueError,
+    Image.DecompressionBombError, Image.DecompressionBombWarning,
+)
+
+# Модель -> (поле с внешним адресом, поле с локальным файлом)
+REMOTE_IMAGE_FIELDS = {
+    Movie: ('poster_url', 'poster'),
+    Cinema: ('image_url', 'image'),
+}
+
+
+@dataclass
+class FetchResult:
+    status: int
+    content: bytes = b''
+    etag: str = ''
+    last_modified: str = ''
+    content_type: str = ''
+
+
+class RequestsFetcher:
+    """Загрузчик по HTTP с условными запросами и ограничением размера"""
+
+    def fetch(self, url, etag='', last_modified=''):
+        headers = {'User-Agent': 'KinoMir image mirror'}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        with requests.get(url, headers=headers, timeout=settings.MIRROR_TIMEOUT, stream=True) as response:
+            if response.status_code != 200:
+                return FetchResult(status=response.status_code)
+            content = BytesIO()
+            for chunk in response.iter_content(64 * 1024):
+                content.write(chunk)
+                if content.tell() > settings.MIRROR_MAX_BYTES:
+                    raise ValueError(f'Файл больше {settings.MIRROR_MAX_BYTES} байт')
+            return FetchResult(
+                status=200,
+                content=content.getvalue(),
+                etag=response.headers.get('ETag', ''),
+                last_modified=response.headers.get('Last-Modified', ''),
+                content_type=response.headers.get('Content-Type', ''),
+            )
+
+
+def get_fetcher():
+    return import_string(settings.MIRROR_FETCHER)()
+
+
+def _extension(url, content_type):
+    ext = mimetypes.guess_extension((content_type or '').split(';')[0].strip())
+    if not ext:
+        ext = os.path.splitext(urlparse(url).path)[1]
+    return ext.lower() if ext else '.jpg'
+
+
+def fetch(url, mirror=None, fetcher=None, force=False):
+    """Скачать изображение (условно, если есть сохраненные ETag/Last-Modified)"""
+    fetcher = fetcher or get_fetcher()
+    if mirror is None or force or not mirror.file:
+        return fetcher.fetch(url)
+    return fetcher.fetch(url, etag=mirror.etag, last_modified=mirror.last_modified)
+
+
+def attach(url, name):
+    """Записать локальную копию в модели, где поле пустое или зеркальное"""
+    for model, (url_field, image_field) in REMOTE_IMAGE_FIELDS.items():
+        replaceable = (
+            Q(**{image_field: ''}) |
+            Q(**{f'{image_field}__isnull': True}) |
+            Q(**{f'{image_field}__startswith': MIRROR_ROOT + '/'})
+        )
+        model.objects.filter(replaceable, **{url_field: url}).exclude(
+            **{image_field: name}
+        ).update(**{image_field: name})
+
+
+def _verify_image(content):
+    """
+    Проверить, что это изображение. Картинка больше Image.MAX_IMAGE_PIXELS
+    отклоняется сразу: Pillow между 1x и 2x лимита только предупреждает.
+    """
+    image = Image.open(BytesIO(content))
+    if Image.MAX_IMAGE_PIXELS and image.width * image.height > Image.MAX_IMAGE_PIXELS:
+        raise Image.DecompressionBombError(
+            f'{image.width}x{image.height} больше {Image.MAX_IMAGE_PIXELS} пикселей'
+        )
+    image.verify()
+
+
+def apply_result(url, result, mirror=None):
+    """Сохранить результат загрузки: файл, заголовки валидации и привязку к моделям"""
+    if mirror is None:
+        mirror, _ = RemoteImage.objects.get_or_create(url=url)
+    mirror.checked_at = timezone.now()
+
+    if result.status == 304:
+        mirror.save(update_fields=['checked_at'])
+        if mirror.file:
+            attach(url, mirror.file)
+        return mirror
+
+    if result.status != 200 or not result.content:
+        logger.warning('Не удалось загрузить %s: HTTP %s', url, result.status)
+        mirror.save(update_fields=['checked_at'])
+        return mirror
+
+    # Сохраняем только настоящие изображения разумного размера
+    try:
+        _verify_image(result.content)
+    except IMAGE_ERRORS:
+        mirror.save(update_fields=['checked_at'])
+        raise
+
+    url_digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+    content_digest = hashlib.sha256(result.content).hexdigest()[:12]
+    name = f'{MIRROR_ROOT}/{url_digest}.{content_digest}{_extension(url, result.content_type)}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(result.content))
+
+    mirror.file = name
+    mirror.etag = result.etag
+    mirror.last_modified = result.last_modified
+    mirror.save()
+    attach(url, name)
+    schedule_variants(name)
+    return mirror
+
+
+def mirror_many(urls, workers=None, fetcher=None, force=False):
+    """
+    Зеркалировать набор адресов. Загрузки идут в ограниченном пуле потоков,
+    запись в базу - в вызывающем потоке. Возвращает {url: RemoteImage или ошибка}.
+    """
+    urls = list(dict.fromkeys(url for url in urls if url))
+    mirrors = RemoteImage.objects.in_bulk(urls, field_name='url')
+    fetcher = fetcher or get_fetcher()
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=workers or settings.MIRROR_WORKERS) as executor:
+        futures = {
+            executor.submit(fetch, url, mirrors.get(url), fetcher, force): url
+            for url in urls
+        }
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                results[url] = apply_result(url, future.result(), mirrors.get(url))
+            except IMAGE_ERRORS as e:
+                logger.warning('Ошибка зеркалирования %s: %s', url, e)
+                results[url] = e
+    return results
+
+
+def remote_image_urls():
+    """Все внешние адреса изображений, на которые ссылаются модели"""
+    urls = []
+    for model, (url_field, _) in REMOTE_IMAGE_FIELDS.items():
+        urls.extend(
+            model.objects.exclude(**{url_field: ''})
+            .exclude(**{f'{url_field}__isnull': True})
+            .values_list(url_field, flat=True)
+            .distinct()
+        )
+    return urls
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def _mirror_in_background(url):
+    try:
+        mirror = RemoteImage.objects.filter(url=url).exclude(file='').first()
+        if mirror is not None:
+            attach(url, mirror.file)
+        else:
+            apply_result(url, fetch(url))
+    except IMAGE_ERRORS as e:
+        logger.warning('Ошибка зеркалирования %s: %s', url, e)
+    finally:
+        with _executor_lock:
+            _pending.discard(url)
+        close_old_connections()
+
+
+def schedule_mirror(url):
+    """Фоновое зеркалирование адреса после сохранения фильма или кинотеатра"""
+    global _executor
+    with _executor_lock:
+        if url in _pending:
+            return None
+        _pending.add(url)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.MIRROR_WORKERS,
+                thread_name_prefix='image-mirror',
+            )
+    return _executor.submit(_mirror_in_background, url)
@@ -1,8 +1,43 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
+from .layout import LayoutError, default_layout, parse_layout
+
+
+def parse_weekdays(value):
+    """Строка '1,6,7' -> {1, 6, 7} (ISO: 1 - понедельник)"""
+    return {int(part) for part in value.replace(' ', '').split(',') if part}
+
+
+def validate_weekdays(value):
+    try:
+        days = parse_weekdays(value)
+    except ValueError:
+        raise ValidationError('Укажите дни недели числами через запятую.')
+    if not days <= set(range(1, 8)):
+        raise ValidationError('Дни недели - числа от 1 до 7.')
+
+
+def validate_layout(value):
+    try:
+        parse_layout(value)
+    except LayoutError as e:
+        raise ValidationError(str(e))
+
+
+def matches_schedule(start, weekdays, time_from, time_to):
+    """Попадает ли начало сеанса в дни недели и интервал времени"""
+    if weekdays and start.isoweekday() not in parse_weekdays(weekdays):
+        return False
+    if time_from is not None and start.time() < time_from:
+        return False
+    if time_to is not None and start.time() >= time_to:
+        return False
+    return True
+
 
 class User(AbstractUser):
     """Расширенная модель пользователя с ролями"""
@@ -117,6 +152,18 @@ class Movie(models.Model):
         default=0,
         verbose_name='Рейтинг'
     )
+    reviews_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Одобренных отзывов'
+    )
+    reviews_rating = models.DecimalField(
+        max_digits=3,
+        decimal_places=1,
+        default=0,
+        editable=False,
+        verbose_name='Оценка зрителей'
+    )
     age_restriction = models.CharField(
         max_length=5,
         default='0+',
@@ -160,9 +207,9 @@ class Movie(models.Model):
         return self.title
     
     def get_average_rating(self):
-        reviews = self.reviews.filter(is_approved=True)
-        if reviews.exists():
-            return round(sum([r.rating for r in reviews]) / reviews.count(), 1)
+        """Средняя оценка одобренных отзывов (см. moderation.refresh_rating_summaries)"""
+        if self.reviews_count:
+            return self.reviews_rating
         return 0
 
 
@@ -205,6 +252,22 @@ class Cinema(models.Model):
         null=True,
         verbose_name='Ссылка на изображение'
     )
+    latitude = models.DecimalField(
+        max_digits=9,
+        decimal_places=6,
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)],
+        verbose_name='Широта'
+    )
+    longitude = models.DecimalField(
+        max_digits=9,
+        decimal_places=6,
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)],
+        verbose_name='Долгота'
+    )
     is_active = models.BooleanField(
         default=True,
         verbose_name='Активен'
@@ -239,6 +302,21 @@ class Hall(models.Model):
         validators=[MinValueValidator(1)],
         verbose_name='Количество мест в ряду'
     )
+    layout = models.TextField(
+        blank=True,
+        validators=[validate_layout],
+        verbose_name='Схема зала',
+        help_text=(
+            'Ряды через "/", в ряду - серии вида 12S: S - обычное место, V - VIP, '
+            'W - для коляски, X - неисправное, _ - проход; 5*12S - пять одинаковых рядов. '
+            'Пусто - прямоугольный зал по числу рядов и мест.'
+        )
+    )
+    capacity = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Мест в продаже'
+    )
     
     class Meta:
         verbose_name = 'Зал'
@@ -248,9 +326,25 @@ class Hall(models.Model):
     def __str__(self):
         return f"{self.cinema.name} - {self.name}"
     
+    def save(self, *args, **kwargs):
+        # Размеры и вместимость зала следуют из схемы
+        if not self.layout:
+            self.layout = default_layout(self.rows, self.seats_per_row)
+        seat_map = parse_layout(self.layout)
+        self.layout = seat_map.code
+        self.rows = seat_map.height
+        self.seats_per_row = seat_map.width
+        self.capacity = seat_map.capacity
+        super().save(*args, **kwargs)
+    
+    @property
+    def seat_map(self):
+        """Разобранная схема зала (HallLayout)"""
+        return parse_layout(self.layout or default_layout(self.rows, self.seats_per_row))
+    
     @property
     def total_seats(self):
-        return self.rows * self.seats_per_row
+        return self.capacity
 
 
 class ShowTime(models.Model):
@@ -280,24 +374,36 @@ class ShowTime(models.Model):
         default=True,
         verbose_name='Активен'
     )
+    admission_rate = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(1)],
+        verbose_name='Очередь на бронирование (зрителей в минуту)',
+        help_text='Для популярных сеансов: сколько зрителей в минуту допускать к '
+                  'бронированию. Пусто - без очереди.'
+    )
     
     class Meta:
         verbose_name = 'Сеанс'
         verbose_name_plural = 'Сеансы'
         ordering = ['start_time']
+        indexes = [
+            # Проверка пересечений и расписание зала на период
+            models.Index(fields=['hall', 'start_time'], name='showtime_hall_start_idx'),
+        ]
     
     def __str__(self):
         return f"{self.movie.title} - {self.start_time.strftime('%d.%m.%Y %H:%M')}"
     
     def get_available_seats(self):
         """Получить количество свободных мест"""
-        booked = self.tickets.filter(
-            status__in=['booked', 'paid']
-        ).count()
-        return self.hall.total_seats - booked
+        from .occupancy import get_occupancy  # occupancy импортирует модели
+        return get_occupancy(self).available
     
     def is_seat_available(self, row, seat):
         """Проверить доступность места"""
+        if not self.hall.seat_map.is_sellable(row, seat):
+            return False
         return not self.tickets.filter(
             row=row,
             seat=seat,
@@ -348,7 +454,20 @@ class Ticket(models.Model):
         auto_now_add=True,
         verbose_name='Дата бронирования'
     )
-    
+    checked_in_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Проход в зал'
+    )
+    checked_in_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Проверил'
+    )
+
     class Meta:
         verbose_name = 'Билет'
         verbose_name_plural = 'Билеты'
@@ -359,8 +478,110 @@ class Ticket(models.Model):
         return f"Билет #{self.id} - {self.showtime.movie.title}"
 
 
+class TicketEventQuerySet(models.QuerySet):
+    """Массовые изменения и удаления журнала запрещены, кроме архивации"""
+
+    def update(self, **kwargs):
+        raise ValueError('События билетов не изменяются')
+
+    def delete(self):
+        raise ValueError('События билетов удаляются только архивацией')
+
+    def delete_archived(self):
+        """Удалить события, уже выгруженные в архив (только archive_events)"""
+        return super().delete()
+
+
+class TicketEvent(models.Model):
+    """
+    Журнал событий билетов: записи только добавляются, старые уходят в
+    архив командой archive_ticket_events
+    """
+    BOOKED = 1
+    PAID = 2
+    CANCELLED = 3
+    CHECKED_IN = 4
+    PRICE = 5
+    KIND_CHOICES = [
+        (BOOKED, 'Забронирован'),
+        (PAID, 'Оплачен'),
+        (CANCELLED, 'Отменен'),
+        (CHECKED_IN, 'Проход в зал'),
+        (PRICE, 'Изменение цены'),
+    ]
+
+    # Без внешних ключей в базе: журнал переживает удаление билета и пользователя
+    ticket = models.ForeignKey(
+        Ticket,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='events',
+        verbose_name='Билет'
+    )
+    kind = models.PositiveSmallIntegerField(
+        choices=KIND_CHOICES,
+        verbose_name='Событие'
+    )
+    price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name='Цена'
+    )
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Кто'
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Время'
+    )
+
+    objects = TicketEventQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Событие билета'
+        verbose_name_plural = 'События билетов'
+        ordering = ['created_at', 'id']
+        indexes = [
+            # История билета
+            models.Index(fields=['ticket', 'created_at'], name='ticket_event_timeline_idx'),
+            # Выборка старых событий для архива
+            models.Index(fields=['created_at'], name='ticket_event_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"Билет #{self.ticket_id}: {self.get_kind_display()}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('События билетов не изменяются')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('События билетов удаляются только архивацией')
+
+
 class Review(models.Model):
     """Отзывы к фильмам"""
+    SCREENING_FLAGS = {
+        'stopword': 'Стоп-слова',
+        'link': 'Ссылка',
+        'contact': 'Контакты',
+        'duplicate': 'Похожий текст',
+        'mismatch': 'Оценка не совпадает с текстом',
+        'caps': 'Заглавные буквы',
+        'repeat': 'Повторы символов',
+    }
+    
     movie = models.ForeignKey(
         Movie,
         on_delete=models.CASCADE,
@@ -388,15 +609,72 @@ class Review(models.Model):
         auto_now_add=True,
         verbose_name='Дата создания'
     )
+    screened_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Дата проверки'
+    )
+    screening_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Оценка подозрительности'
+    )
+    screening_flags = models.CharField(
+        max_length=255,
+        blank=True,
+        editable=False,
+        verbose_name='Причины проверки'
+    )
+    moderated_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Дата модерации'
+    )
     
     class Meta:
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
         ordering = ['-created_at']
         unique_together = ['movie', 'user']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='review_created_idx'),
+            # Очередь модерации: индекс только по ожидающим отзывам
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='review_pending_idx',
+                condition=models.Q(is_approved=False)
+            ),
+        ]
     
     def __str__(self):
         return f"Отзыв {self.user.username} на {self.movie.title}"
+    
+    def get_screening_flags(self):
+        """Причины, по которым отзыв отмечен при проверке"""
+        return [
+            self.SCREENING_FLAGS.get(flag, flag)
+            for flag in self.screening_flags.split(',') if flag
+        ]
+
+
+class ReviewBand(models.Model):
+    """Полоса MinHash-подписи отзыва для поиска почти одинаковых текстов"""
+    review = models.ForeignKey(
+        Review,
+        on_delete=models.CASCADE,
+        related_name='bands',
+        verbose_name='Отзыв'
+    )
+    bucket = models.BigIntegerField(
+        db_index=True,
+        verbose_name='Корзина'
+    )
+    
+    class Meta:
+        verbose_name = 'Полоса подписи отзыва'
+        verbose_name_plural = 'Полосы подписей отзывов'
 
 
 class Promotion(models.Model):
@@ -429,20 +707,113 @@ class Promotion(models.Model):
         null=True,
         verbose_name='Изображение'
     )
+    weekdays = models.CharField(
+        max_length=20,
+        blank=True,
+        validators=[validate_weekdays],
+        help_text='Дни недели сеанса через запятую (1 - пн, 7 - вс), пусто - все дни',
+        verbose_name='Дни недели'
+    )
+    time_from = models.TimeField(
+        blank=True,
+        null=True,
+        verbose_name='Сеансы с'
+    )
+    time_to = models.TimeField(
+        blank=True,
+        null=True,
+        verbose_name='Сеансы до'
+    )
     
     class Meta:
         verbose_name = 'Акция'
         verbose_name_plural = 'Акции'
         ordering = ['-start_date']
+        indexes = [
+            models.Index(
+                fields=['is_active', 'start_date', 'end_date'],
+                name='promotion_validity_idx'
+            ),
+        ]
     
     def __str__(self):
         return self.title
     
-    def is_valid(self):
+    def is_valid(self, today=None):
         """Проверить действительность акции"""
-        today = timezone.now().date()
+        today = today or timezone.localdate()
         return (self.is_active and 
                 self.start_date <= today <= self.end_date)
+    
+    def applies_to(self, start):
+        """Действует ли акция на сеанс, начинающийся в start (местное время)"""
+        return (self.is_active and
+                self.start_date <= start.date() <= self.end_date and
+                matches_schedule(start, self.weekdays, self.time_from, self.time_to))
+
+
+class PriceRule(models.Model):
+    """Правило динамического ценообразования"""
+    name = models.CharField(
+        max_length=255,
+        verbose_name='Название'
+    )
+    adjustment_percent = models.IntegerField(
+        validators=[MinValueValidator(-100)],
+        help_text='Положительное значение - наценка, отрицательное - скидка',
+        verbose_name='Изменение цены (%)'
+    )
+    weekdays = models.CharField(
+        max_length=20,
+        blank=True,
+        validators=[validate_weekdays],
+        help_text='Дни недели через запятую (1 - пн, 7 - вс), пусто - все дни',
+        verbose_name='Дни недели'
+    )
+    time_from = models.TimeField(
+        blank=True,
+        null=True,
+        verbose_name='Сеансы с'
+    )
+    time_to = models.TimeField(
+        blank=True,
+        null=True,
+        verbose_name='Сеансы до'
+    )
+    hall = models.ForeignKey(
+        Hall,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='price_rules',
+        verbose_name='Зал'
+    )
+    occupancy_from = models.PositiveSmallIntegerField(
+        blank=True,
+        null=True,
+        validators=[MaxValueValidator(100)],
+        help_text='Правило действует, когда занято не меньше указанного процента мест',
+        verbose_name='Заполненность от (%)'
+    )
+    is_active = models.BooleanField(
+        default=True,
+        verbose_name='Активно'
+    )
+    
+    class Meta:
+        verbose_name = 'Правило цены'
+        verbose_name_plural = 'Правила цен'
+        ordering = ['name']
+    
+    def __str__(self):
+        sign = '+' if self.adjustment_percent > 0 else ''
+        return f"{self.name} ({sign}{self.adjustment_percent}%)"
+    
+    def applies_to(self, start, hall_id):
+        """Подходят ли условия правила (кроме заполненности) для сеанса"""
+        if self.hall_id is not None and self.hall_id != hall_id:
+            return False
+        return matches_schedule(start, self.weekdays, self.time_from, self.time_to)
 
 
 class Rule(models.Model):
@@ -470,3 +841,210 @@ class Rule(models.Model):
     
     def __str__(self):
         return self.title
+
+
+class RemoteImage(models.Model):
+    """Локальные копии внешних изображений (poster_url, image_url)"""
+    url = models.URLField(
+        unique=True,
+        verbose_name='Адрес'
+    )
+    file = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='Локальный файл'
+    )
+    etag = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='ETag'
+    )
+    last_modified = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name='Last-Modified'
+    )
+    checked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Последняя проверка'
+    )
+    
+    class Meta:
+        verbose_name = 'Внешнее изображение'
+        verbose_name_plural = 'Внешние изображения'
+    
+    def __str__(self):
+        return self.url
+
+
+class MovieCooccurrence(models.Model):
+    """
+    Число зрителей, интересовавшихся обоими фильмами (билет или отзыв).
+    Строка movie = other хранит число зрителей самого фильма.
+    """
+    movie = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Фильм'
+    )
+    other = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Другой фильм'
+    )
+    count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Зрителей'
+    )
+    
+    class Meta:
+        verbose_name = 'Совместный просмотр'
+        verbose_name_plural = 'Совместные просмотры'
+        unique_together = ['movie', 'other']
+
+
+class MovieSimilarity(models.Model):
+    """Ближайшие по зрителям фильмы ("зрители также смотрели")"""
+    movie = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='similarities',
+        verbose_name='Фильм'
+    )
+    similar = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий фильм'
+    )
+    score = models.FloatField(
+        verbose_name='Сходство'
+    )
+    rank = models.PositiveSmallIntegerField(
+        verbose_name='Место'
+    )
+    
+    class Meta:
+        verbose_name = 'Похожий фильм'
+        verbose_name_plural = 'Похожие фильмы'
+        ordering = ['movie', 'rank']
+        unique_together = ['movie', 'similar']
+    
+    def __str__(self):
+        return f"{self.movie} -> {self.similar} ({self.score:.2f})"
+
+
+class RecommenderRun(models.Model):
+    """Запуск пересчета рекомендаций; время начала - граница следующего запуска"""
+    started_at = models.DateTimeField(
+        verbose_name='Начало'
+    )
+    finished_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Окончание'
+    )
+    full = models.BooleanField(
+        default=False,
+        verbose_name='Полный пересчет'
+    )
+    interactions = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Новых просмотров'
+    )
+    movies_updated = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Обновлено фильмов'
+    )
+    
+    class Meta:
+        verbose_name = 'Пересчет рекомендаций'
+        verbose_name_plural = 'Пересчеты рекомендаций'
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"{self.started_at:%d.%m.%Y %H:%M} ({'полный' if self.full else 'инкрементный'})"
+
+
+class Job(models.Model):
+    """Фоновая задача; обработчики - команда run_worker"""
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает'),
+        ('running', 'Выполняется'),
+        ('failed', 'Ошибка'),
+    ]
+    
+    queue = models.CharField(
+        max_length=50,
+        default='default',
+        verbose_name='Очередь'
+    )
+    task = models.CharField(
+        max_length=200,
+        verbose_name='Задача'
+    )
+    args = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name='Аргументы'
+    )
+    kwargs = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Именованные аргументы'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name='Статус'
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Запуск не раньше'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        default=5,
+        verbose_name='Максимум попыток'
+    )
+    locked_by = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Обработчик'
+    )
+    locked_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Взята в работу'
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создана'
+    )
+    
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ['run_at']
+        indexes = [
+            # Выборка готовых задач очереди; выполненные задачи удаляются
+            models.Index(
+                fields=['queue', 'run_at'],
+                condition=models.Q(status='pending'),
+                name='job_pending_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.get_status_display()})"
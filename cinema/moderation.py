@@ -0,0 +1,91 @@
+"""
+Очередь модерации отзывов.
+
+Страницы очереди выбираются по ключу ``(created_at, id)`` вместо OFFSET:
+курсор следующей страницы - дата и id последнего показанного отзыва,
+поэтому выборка любой страницы идет по индексу и не зависит от глубины.
+Массовые действия выполняются одним UPDATE/DELETE, после чего сводки
+оценок затронутых фильмов пересчитываются одним запросом.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+
+from .models import Movie, Review
+
+CURSOR_SEPARATOR = '_'
+
+BULK_ACTIONS = {
+    'approve': 'одобрено',
+    'reject': 'отклонено',
+    'delete': 'удалено',
+}
+
+
+def encode_cursor(review):
+    return f'{review.created_at.isoformat()}{CURSOR_SEPARATOR}{review.pk}'
+
+
+def decode_cursor(value):
+    """(created_at, id) из курсора или None, если курсор некорректен"""
+    try:
+        created_at, pk = value.rsplit(CURSOR_SEPARATOR, 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def moderation_page(queryset, cursor=None, page_size=None):
+    """Отзывы страницы (от новых к старым) и курсор следующей страницы"""
+    page_size = page_size or settings.REVIEW_MODERATION_PAGE_SIZE
+    queryset = queryset.order_by('-created_at', '-id')
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+    reviews = list(queryset[:page_size + 1])
+    next_cursor = encode_cursor(reviews[page_size - 1]) if len(reviews) > page_size else None
+    return reviews[:page_size], next_cursor
+
+
+def refresh_rating_summaries(movie_ids):
+    """Пересчитать число и среднюю оценку одобренных отзывов фильмов"""
+    movie_ids = set(movie_ids)
+    if not movie_ids:
+        return
+    summaries = {
+        row['movie_id']: row
+        for row in Review.objects.filter(movie_id__in=movie_ids, is_approved=True)
+        .values('movie_id')
+        .annotate(count=Count('id'), average=Avg('rating'))
+    }
+    movies = []
+    for movie_id in movie_ids:
+        summary = summaries.get(movie_id)
+        movie = Movie(pk=movie_id)
+        movie.reviews_count = summary['count'] if summary else 0
+        movie.reviews_rating = round(summary['average'], 1) if summary else 0
+        movies.append(movie)
+    Movie.objects.bulk_update(movies, ['reviews_count', 'reviews_rating'])
+
+
+def apply_bulk_action(action, review_ids):
+    """Одобрить, отклонить или удалить отзывы; возвращает число затронутых"""
+    if action not in BULK_ACTIONS:
+        raise ValueError(f'Неизвестное действие: {action}')
+    with transaction.atomic():
+        reviews = Review.objects.filter(pk__in=review_ids)
+        movie_ids = set(reviews.values_list('movie_id', flat=True))
+        if action == 'delete':
+            # Общий счетчик delete() включает каскадные полосы ReviewBand
+            _, deleted = reviews.delete()
+            count = deleted.get(Review._meta.label, 0)
+        else:
+            count = reviews.update(is_approved=(action == 'approve'), moderated_at=timezone.now())
+        refresh_rating_summaries(movie_ids)
+    return count
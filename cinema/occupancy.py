@@ -0,0 +1,264 @@
+"""
+Занятость мест сеанса в виде битовых масок.
+
+Для каждого ряда хранится целое число: бит ``seat - 1`` установлен, если
+место занято. Свободные места - места схемы зала (``cinema.layout``) без
+занятых. Маски сеанса кэшируются вместе с записью схемы и сбрасываются
+при сохранении или удалении билета, поэтому поиск свободных мест по
+многим сеансам обходится одним ``get_many`` и одним запросом для
+сеансов, которых нет в кэше.
+
+У занятости сеанса есть версия - счетчик в кэше, который растет с каждым
+изменением места. Изменения хранятся под ключами версий ограниченное
+время, так что клиент может получить только изменения после известной
+ему версии; если журнала не хватает, отдается полный снимок. Каждое
+изменение также публикуется в канал сеанса (``cinema.broker``) для
+живой схемы зала.
+"""
+import base64
+import time
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .broker import get_broker
+from .layout import AISLE, CATEGORIES, SELLABLE, parse_layout
+from .models import ShowTime, Ticket
+from .seat_selection import best_block
+
+CACHE_PREFIX = 'occupancy:'
+VERSION_PREFIX = 'occupancy_version:'
+CHANGE_PREFIX = 'occupancy_change:'
+# Журнал изменений: срок хранения (секунды) и наибольшая длина дельты
+CHANGE_TIMEOUT = 3600
+MAX_DELTA = 500
+SCAN_CHUNK = 200
+ACTIVE_STATUSES = ('booked', 'paid')
+
+
+@dataclass(frozen=True)
+class Occupancy:
+    layout_code: str
+    row_masks: tuple
+    version: int = 0
+
+    @property
+    def layout(self):
+        return parse_layout(self.layout_code)
+
+    @property
+    def rows(self):
+        return self.layout.height
+
+    @property
+    def seats_per_row(self):
+        return self.layout.width
+
+    @property
+    def booked(self):
+        return sum(bin(mask).count('1') for mask in self.row_masks)
+
+    @property
+    def available(self):
+        return sum(bin(self.free_mask(row)).count('1') for row in range(1, self.rows + 1))
+
+    def is_free(self, row, seat):
+        if not 1 <= row <= self.rows or seat < 1:
+            return False
+        return bool(self.free_mask(row) >> (seat - 1) & 1)
+
+    def free_mask(self, row, categories=SELLABLE):
+        """Свободные места ряда с указанными кодами схемы"""
+        return self.layout.mask(row, categories) & ~self.row_masks[row - 1]
+
+    def packed(self):
+        """
+        Занятые места одной битовой строкой в base64: бит
+        (ряд - 1) x seats_per_row + (место - 1), младшие биты байта - первыми.
+        """
+        width = self.seats_per_row
+        bits = 0
+        for index, mask in enumerate(self.row_masks):
+            bits |= mask << (index * width)
+        size = (self.rows * width + 7) // 8
+        return base64.b64encode(bits.to_bytes(size, 'little')).decode('ascii')
+
+
+def cache_key(showtime_id):
+    return f'{CACHE_PREFIX}{showtime_id}'
+
+
+def seat_channel(showtime_id):
+    return f'seats:{showtime_id}'
+
+
+def version_key(showtime_id):
+    return f'{VERSION_PREFIX}{showtime_id}'
+
+
+def change_key(showtime_id, version):
+    return f'{CHANGE_PREFIX}{showtime_id}:{version}'
+
+
+def _initial_version():
+    # Начальная версия от времени: после очистки кэша версии не повторяются
+    return time.time_ns() // 1000
+
+
+def get_versions(showtime_ids, cached=None):
+    """{id сеанса: текущая версия занятости}"""
+    if cached is None:
+        cached = cache.get_many([version_key(pk) for pk in showtime_ids])
+    versions = {}
+    for pk in showtime_ids:
+        version = cached.get(version_key(pk))
+        if version is None:
+            cache.add(version_key(pk), _initial_version(), None)
+            version = cache.get(version_key(pk))
+        versions[pk] = version
+    return versions
+
+
+def _build(layout, seats, version):
+    masks = [0] * layout.height
+    for row, seat in seats:
+        if 1 <= row <= layout.height and 1 <= seat <= layout.width:
+            masks[row - 1] |= 1 << (seat - 1)
+    return Occupancy(layout.code, tuple(masks), version)
+
+
+def get_occupancies(showtimes):
+    """
+    {id сеанса: Occupancy} для списка сеансов (с загруженными залами).
+    Отсутствующие в кэше загружаются одним запросом.
+    """
+    showtimes = {showtime.pk: showtime for showtime in showtimes}
+    cached = cache.get_many(
+        [cache_key(pk) for pk in showtimes] + [version_key(pk) for pk in showtimes]
+    )
+    versions = get_versions(list(showtimes), cached)
+    result = {}
+    for pk, showtime in showtimes.items():
+        occupancy = cached.get(cache_key(pk))
+        # После изменения схемы зала или мест маски строятся заново
+        if (
+            occupancy is not None
+            and occupancy.version == versions[pk]
+            and occupancy.layout_code == showtime.hall.seat_map.code
+        ):
+            result[pk] = occupancy
+
+    missing = [pk for pk in showtimes if pk not in result]
+    if missing:
+        # Версия читается до билетов: снимок не старше своей версии
+        seats = {pk: [] for pk in missing}
+        for showtime_id, row, seat in Ticket.objects.filter(
+            showtime_id__in=missing,
+            status__in=ACTIVE_STATUSES
+        ).values_list('showtime_id', 'row', 'seat'):
+            seats[showtime_id].append((row, seat))
+        fresh = {pk: _build(showtimes[pk].hall.seat_map, seats[pk], versions[pk]) for pk in missing}
+        cache.set_many({cache_key(pk): occupancy for pk, occupancy in fresh.items()}, None)
+        result.update(fresh)
+    return result
+
+
+def get_occupancy(showtime):
+    return get_occupancies([showtime])[showtime.pk]
+
+
+def seat_grid(occupancy, tickets=None):
+    """
+    Схема зала для шаблонов: ряды списков позиций с кодом схемы и
+    занятостью; tickets - {(ряд, место): билет} для показа владельцев.
+    """
+    layout = occupancy.layout
+    grid = []
+    for row, codes in enumerate(layout.seat_rows, start=1):
+        cells = []
+        for seat, code in enumerate(codes, start=1):
+            cells.append({
+                'row': row,
+                'seat': seat,
+                'category': code,
+                'category_name': CATEGORIES.get(code, ''),
+                'is_seat': code != AISLE,
+                'is_booked': not occupancy.is_free(row, seat),
+                'ticket': tickets.get((row, seat)) if tickets else None,
+            })
+        grid.append(cells)
+    return grid
+
+
+def record_seat_change(showtime_id, row, seat, taken):
+    """
+    Новая версия занятости сеанса после того, как место заняли или
+    освободили; событие уходит подписчикам живой схемы зала.
+    """
+    key = version_key(showtime_id)
+    cache.add(key, _initial_version(), None)
+    version = cache.incr(key)
+    cache.set(change_key(showtime_id, version), (row, seat, taken), CHANGE_TIMEOUT)
+    cache.delete(cache_key(showtime_id))
+    get_broker().publish(
+        seat_channel(showtime_id),
+        {'version': version, 'row': row, 'seat': seat, 'taken': taken},
+    )
+    return version
+
+
+def seat_changes(showtime_id, since, version):
+    """
+    Изменения мест после версии since до version: [(ряд, место, занято)]
+    по последнему состоянию каждого места, или None, если журнала не хватает.
+    """
+    if not 0 <= version - since <= MAX_DELTA:
+        return None
+    keys = [change_key(showtime_id, number) for number in range(since + 1, version + 1)]
+    found = cache.get_many(keys)
+    if len(found) != len(keys):
+        return None
+    latest = {}
+    for key in keys:
+        row, seat, taken = found[key]
+        latest[(row, seat)] = taken
+    return [(row, seat, taken) for (row, seat), taken in latest.items()]
+
+
+def find_showtimes_with_seats(movie_id, seats, limit=5, city_id=None):
+    """
+    Ближайшие по времени сеансы фильма, где есть seats соседних свободных
+    мест: [(сеанс, лучший SeatBlock), ...]. Сеансы просматриваются
+    порциями в порядке начала, поиск останавливается на limit-м совпадении.
+    """
+    showtimes = ShowTime.objects.filter(
+        movie_id=movie_id,
+        is_active=True,
+        start_time__gt=timezone.now(),
+        hall__seats_per_row__gte=seats
+    ).select_related('hall__cinema').order_by('start_time', 'id')
+    if city_id:
+        showtimes = showtimes.filter(hall__cinema__city_id=city_id)
+
+    found = []
+    last = None
+    while len(found) < limit:
+        chunk = showtimes
+        if last is not None:
+            chunk = chunk.filter(
+                Q(start_time__gt=last.start_time) | Q(start_time=last.start_time, id__gt=last.id)
+            )
+        chunk = list(chunk[:SCAN_CHUNK])
+        if not chunk:
+            break
+        occupancies = get_occupancies(chunk)
+        for showtime in chunk:
+            block = best_block(occupancies[showtime.pk], seats)
+            if block:
+                found.append((showtime, block))
+                if len(found) == limit:
+                    break
+        last = chunk[-1]
+    return found
@@ -0,0 +1,194 @@
+"""
+Персональная главная страница.
+
+Профиль пользователя - компактный вектор, посчитанный заранее командой
+``build_user_profiles``:
+
+* город пользователя;
+* веса жанров: +1 за каждый фильм с билетом, (оценка - 5.5) / 4.5 за
+  отзыв; вектор нормирован;
+* бонусы фильмов из рекомендаций "зрители также смотрели" для
+  просмотренных фильмов;
+* просмотренные фильмы (их не предлагаем).
+
+Каталог активных фильмов (с жанрами) лежит в кэше по умолчанию, профили -
+в отдельном кэше ``profiles``, чтобы при переполнении они не вытесняли
+остальные ключи. Подбор идет в памяти, а единственный запрос - ближайшие
+сеансы рекомендованных фильмов в городе пользователя. Кэш должен быть
+общим для процессов: с локальным ``build_user_profiles`` не запускается
+(см. cinema.W001). Если профиля в кэше нет, он считается для одного
+пользователя на лету.
+"""
+import math
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils import timezone
+
+from .models import Movie, MovieSimilarity, Review, ShowTime, Ticket, User
+
+PROFILE_CACHE = 'profiles'
+CATALOG_KEY = 'home_catalog'
+PROFILE_PREFIX = 'user_profile:'
+SIMILAR_WEIGHT = 0.5
+
+
+@dataclass(frozen=True)
+class UserProfile:
+    city_id: Optional[int] = None
+    genres: dict = field(default_factory=dict)
+    boosts: dict = field(default_factory=dict)
+    seen: frozenset = frozenset()
+
+    @property
+    def is_empty(self):
+        return not self.genres and not self.boosts
+
+
+def profile_key(user_id):
+    return f'{PROFILE_PREFIX}{user_id}'
+
+
+def movie_catalog():
+    """Активные фильмы с жанрами (в порядке Movie.Meta.ordering)"""
+    movies = cache.get(CATALOG_KEY)
+    if movies is None:
+        movies = _load_catalog()
+    return movies
+
+
+def _load_catalog():
+    movies = list(Movie.objects.filter(is_active=True).prefetch_related('genres'))
+    cache.set(CATALOG_KEY, movies, None)
+    return movies
+
+
+def invalidate_catalog():
+    cache.delete(CATALOG_KEY)
+
+
+def build_profiles(users, movie_genres):
+    """
+    Профили для пакета пользователей [(id, city_id), ...].
+    movie_genres - {id фильма: [id жанров]}.
+    """
+    user_ids = [user_id for user_id, _ in users]
+    genres = defaultdict(lambda: defaultdict(float))
+    seen = defaultdict(set)
+
+    tickets = Ticket.objects.filter(user_id__in=user_ids).exclude(status='cancelled')
+    for user_id, movie_id in tickets.values_list('user_id', 'showtime__movie_id').distinct():
+        seen[user_id].add(movie_id)
+        for genre_id in movie_genres.get(movie_id, ()):
+            genres[user_id][genre_id] += 1
+    for user_id, movie_id, rating in Review.objects.filter(user_id__in=user_ids).values_list(
+        'user_id', 'movie_id', 'rating'
+    ):
+        seen[user_id].add(movie_id)
+        for genre_id in movie_genres.get(movie_id, ()):
+            genres[user_id][genre_id] += (rating - 5.5) / 4.5
+
+    neighbours = defaultdict(list)
+    watched = set().union(*seen.values()) if seen else set()
+    for movie_id, similar_id, score in MovieSimilarity.objects.filter(
+        movie_id__in=watched
+    ).values_list('movie_id', 'similar_id', 'score'):
+        neighbours[movie_id].append((similar_id, score))
+
+    profiles = {}
+    for user_id, city_id in users:
+        weights = {genre_id: weight for genre_id, weight in genres[user_id].items() if weight}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1
+        boosts = defaultdict(float)
+        for movie_id in seen[user_id]:
+            for similar_id, score in neighbours[movie_id]:
+                if similar_id not in seen[user_id]:
+                    boosts[similar_id] += score * SIMILAR_WEIGHT
+        profiles[user_id] = UserProfile(
+            city_id=city_id,
+            genres={genre_id: round(weight / norm, 3) for genre_id, weight in weights.items()},
+            boosts={movie_id: round(score, 3) for movie_id, score in boosts.items()},
+            seen=frozenset(seen[user_id]),
+        )
+    return profiles
+
+
+def catalog_genres(movies):
+    return {movie.pk: [genre.pk for genre in movie.genres.all()] for movie in movies}
+
+
+def store_profiles(profiles):
+    caches[PROFILE_CACHE].set_many(
+        {profile_key(user_id): profile for user_id, profile in profiles.items()},
+        settings.USER_PROFILE_TIMEOUT,
+    )
+
+
+def invalidate_profile(user_id):
+    caches[PROFILE_CACHE].delete(profile_key(user_id))
+
+
+def score_movies(profile, movies, limit):
+    """Фильмы каталога по убыванию близости к профилю"""
+    scored = []
+    for position, movie in enumerate(movies):
+        if movie.pk in profile.seen:
+            continue
+        score = sum(profile.genres.get(genre.pk, 0) for genre in movie.genres.all())
+        score += profile.boosts.get(movie.pk, 0)
+        if score > 0:
+            # При равном счете выше более новые фильмы (порядок каталога)
+            scored.append((-score, position, movie))
+    scored.sort(key=lambda item: item[:2])
+    return [movie for _, _, movie in scored[:limit]]
+
+
+def home_page(user, city_id=None, limit=6):
+    """
+    Каталог и персональная подборка главной страницы:
+    (фильмы каталога, [(фильм, ближайший сеанс или None), ...]).
+    """
+    movies = movie_catalog()
+    if not user.is_authenticated:
+        return movies, []
+
+    profile = caches[PROFILE_CACHE].get(profile_key(user.pk))
+    if profile is None:
+        profile = build_profiles([(user.pk, user.city_id)], catalog_genres(movies))[user.pk]
+        store_profiles({user.pk: profile})
+    if profile.is_empty:
+        return movies, []
+
+    recommended = score_movies(profile, movies, limit)
+    city_id = profile.city_id or city_id
+    showtimes = ShowTime.objects.filter(
+        movie__in=recommended,
+        is_active=True,
+        start_time__gte=timezone.now()
+    ).select_related('hall__cinema').order_by('start_time')
+    if city_id:
+        showtimes = showtimes.filter(hall__cinema__city_id=city_id)
+    nearest = {}
+    for showtime in showtimes[:limit * 20]:
+        nearest.setdefault(showtime.movie_id, showtime)
+    return movies, [(movie, nearest.get(movie.pk)) for movie in recommended]
+
+
+def build_all_profiles(batch_size=5000):
+    """Пересчитать профили всех пользователей пакетами; возвращает их число"""
+    movie_genres = catalog_genres(_load_catalog())
+    total = 0
+    last_id = 0
+    while True:
+        users = list(
+            User.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'city_id')[:batch_size]
+        )
+        if not users:
+            return total
+        store_profiles(build_profiles(users, movie_genres))
+        total += len(users)
+        last_id = users[-1][0]
@@ -0,0 +1,147 @@
+"""
+Динамические цены билетов.
+
+Цена места зависит от базовой цены сеанса, правил ``PriceRule`` (день
+недели, время начала, зал, заполненность) и лучшей действующей акции.
+Все условия, кроме заполненности, известны заранее, поэтому правила
+компилируются в ``PriceTable``: отсортированные пороги числа занятых мест
+и цену для каждого интервала. При бронировании цена берется бинарным
+поиском по числу занятых мест, без обхода правил.
+
+Таблица кэшируется по сеансу в общем кэше и в памяти процесса. Ключ
+включает версию правил, которая меняется при сохранении правил, акций и
+залов, а также цену, время и зал сеанса - изменение сеанса само дает
+новый ключ. Версия читается из общего кэша на каждый запрос, поэтому
+копии в памяти других воркеров и run_worker устаревают сразу; с
+LocMemCache версия у каждого процесса своя (см. проверку cinema.W001).
+"""
+import math
+import time
+from bisect import bisect_right
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import PriceRule, Promotion
+
+VERSION_KEY = 'pricing_version'
+CACHE_PREFIX = 'price_table:'
+CENT = Decimal('0.01')
+LOCAL_TABLES_LIMIT = 1024
+
+# Таблицы, уже полученные этим процессом: ключ кэша -> PriceTable
+_local_tables = {}
+
+
+@dataclass(frozen=True)
+class PriceTable:
+    """Цены сеанса по числу уже занятых мест"""
+    thresholds: tuple
+    prices: tuple
+    promotion_id: Optional[int] = None
+
+    def price(self, booked):
+        return self.prices[bisect_right(self.thresholds, booked)]
+
+    @property
+    def base_price(self):
+        """Цена при пустом зале"""
+        return self.prices[0]
+
+
+def occupancy_threshold(percent, total_seats):
+    """Минимальное число занятых мест, при котором заполненность >= percent"""
+    return math.ceil(percent * total_seats / 100)
+
+
+def best_promotion(start, promotions):
+    """Акция с наибольшей скидкой, действующая на начало сеанса"""
+    best = None
+    for promotion in promotions:
+        if promotion.discount_percent and promotion.applies_to(start):
+            if best is None or promotion.discount_percent > best.discount_percent:
+                best = promotion
+    return best
+
+
+def evaluate_price(showtime, booked, rules, promotions):
+    """
+    Цена места с разбором всех правил. Используется при компиляции таблицы
+    и как эталон в бенчмарке.
+    """
+    start = timezone.localtime(showtime.start_time)
+    total_seats = showtime.hall.total_seats
+    adjustment = 0
+    for rule in rules:
+        if not rule.is_active or not rule.applies_to(start, showtime.hall_id):
+            continue
+        if rule.occupancy_from is not None and booked < occupancy_threshold(rule.occupancy_from, total_seats):
+            continue
+        adjustment += rule.adjustment_percent
+
+    price = showtime.price * max(100 + adjustment, 0) / 100
+    promotion = best_promotion(start, promotions)
+    if promotion is not None:
+        price = price * (100 - promotion.discount_percent) / 100
+    return price.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def compile_price_table(showtime, rules=None, promotions=None):
+    """Скомпилировать правила и акции в таблицу цен сеанса"""
+    if rules is None:
+        rules = list(PriceRule.objects.filter(is_active=True))
+    if promotions is None:
+        promotions = list(Promotion.objects.filter(is_active=True, discount_percent__gt=0))
+
+    start = timezone.localtime(showtime.start_time)
+    total_seats = showtime.hall.total_seats
+    rules = [rule for rule in rules if rule.is_active and rule.applies_to(start, showtime.hall_id)]
+    thresholds = sorted({
+        occupancy_threshold(rule.occupancy_from, total_seats)
+        for rule in rules if rule.occupancy_from
+    })
+    # Цена постоянна между порогами, поэтому достаточно вычислить ее в каждом
+    prices = [evaluate_price(showtime, booked, rules, promotions) for booked in [0] + thresholds]
+
+    promotion = best_promotion(start, promotions)
+    return PriceTable(
+        thresholds=tuple(thresholds),
+        prices=tuple(prices),
+        promotion_id=promotion.id if promotion else None,
+    )
+
+
+def pricing_version():
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def bump_pricing_version():
+    """Сбросить все таблицы цен (после изменения правил, акций или залов)"""
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def _cache_key(showtime, version):
+    return (
+        f'{CACHE_PREFIX}{version}:{showtime.pk}:{showtime.price}:'
+        f'{int(showtime.start_time.timestamp())}:{showtime.hall_id}'
+    )
+
+
+def get_price_table(showtime):
+    """Таблица цен сеанса из кэша (компилируется при первом обращении)"""
+    key = _cache_key(showtime, pricing_version())
+    table = _local_tables.get(key)
+    if table is not None:
+        return table
+    table = cache.get(key)
+    if table is None:
+        table = compile_price_table(showtime)
+        cache.set(key, table, settings.PRICE_TABLE_TIMEOUT)
+    if len(_local_tables) >= LOCAL_TABLES_LIMIT:
+        _local_tables.clear()
+    _local_tables[key] = table
+    return table
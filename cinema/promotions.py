@@ -0,0 +1,62 @@
+"""
+Кэш действующих акций.
+
+Набор действующих акций меняется только при сохранении акции или когда
+наступает дата начала или окончания одной из них. Поэтому набор
+вычисляется один раз и хранится в кэше вместе с моментом следующей смены
+(местная полночь ближайшей границы). После этого момента запись считается
+устаревшей и пересчитывается при первом обращении; сохранение или удаление
+акции сбрасывает ее сразу.
+"""
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import Promotion
+
+CACHE_KEY = 'active_promotions'
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def _compute(today):
+    promotions = list(Promotion.objects.filter(
+        is_active=True,
+        start_date__lte=today,
+        end_date__gte=today
+    ))
+    # Ближайшая граница: окончание действующей акции или начало будущей
+    boundaries = [promotion.end_date + timedelta(days=1) for promotion in promotions]
+    next_start = Promotion.objects.filter(
+        is_active=True,
+        start_date__gt=today
+    ).aggregate(next_start=Min('start_date'))['next_start']
+    if next_start is not None:
+        boundaries.append(next_start)
+    expires_at = _local_midnight(min(boundaries)) if boundaries else None
+    return promotions, expires_at
+
+
+def active_promotions():
+    """Действующие сегодня акции (в порядке Promotion.Meta.ordering)"""
+    now = timezone.now()
+    entry = cache.get(CACHE_KEY)
+    if entry is not None:
+        promotions, expires_at = entry
+        if expires_at is None or now < expires_at:
+            return promotions
+
+    promotions, expires_at = _compute(timezone.localdate(now))
+    timeout = None
+    if expires_at is not None:
+        timeout = max(int((expires_at - now).total_seconds()), 1)
+    cache.set(CACHE_KEY, (promotions, expires_at), timeout)
+    return promotions
+
+
+def invalidate_active_promotions():
+    cache.delete(CACHE_KEY)
@@ -0,0 +1,118 @@
+"""
+Ограничение частоты запросов к представлениям.
+
+Скользящее окно по двум счетчикам: оценка числа запросов за последний
+период - текущее окно плюс доля предыдущего, еще не вышедшая за период.
+Оба числа упакованы в один ключ кэша окна (предыдущее - в старших
+битах), поэтому запрос делает одно обращение к кэшу - ``cache.incr``;
+только первый запрос нового окна переносит в него счетчик предыдущего.
+
+Лимиты задаются в ``RATE_LIMITS`` строками вида ``'10/m'`` (s, m, h, d);
+пустое значение отключает лимит представления. Превышение - ответ 429 с
+Retry-After; отклоненные запросы тоже считаются, так что непрерывный
+поток бота не пропускается. Счетчики общие для процессов только на общем
+кэше (см. cinema.W001): с локальным лимит умножается на число воркеров.
+"""
+import math
+import time
+from dataclasses import dataclass
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import render
+
+RATE_LIMIT_PREFIX = 'ratelimit:'
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+COUNT_BITS = 32
+COUNT_MASK = (1 << COUNT_BITS) - 1
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    retry_after: int = 0
+
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60)"""
+    count, _, period = rate.partition('/')
+    try:
+        return int(count), PERIODS[period.strip().lower()[:1]]
+    except (KeyError, ValueError):
+        raise ValueError(f'Некорректный лимит {rate!r}, ожидается вид "10/m"')
+
+
+def client_ip(request):
+    """
+    Адрес клиента. За RATE_LIMIT_PROXY_COUNT доверенными прокси он берется
+    из X-Forwarded-For: левее записей прокси клиент может написать что угодно.
+    """
+    proxies = settings.RATE_LIMIT_PROXY_COUNT
+    if proxies:
+        forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _retry_after(previous, current, elapsed, limit, period):
+    """Секунд до момента, когда следующий запрос уложится в лимит"""
+    if current < limit:
+        # Ждем, пока вклад предыдущего окна уменьшится
+        needed = 1 - (limit - current - 1) / previous
+        return (needed - elapsed) * period
+    # Текущее окно исчерпано: оно станет предыдущим для следующего
+    return (1 - elapsed + max(0, 1 - (limit - 1) / current)) * period
+
+
+def hit(scope, ident, limit, period, now=None):
+    """Учесть запрос клиента ident к scope и проверить лимит"""
+    now = time.time() if now is None else now
+    window, elapsed = divmod(now / period, 1)
+    key = f'{RATE_LIMIT_PREFIX}{scope}:{ident}:{int(window)}'
+    try:
+        packed = cache.incr(key)
+    except ValueError:
+        # Первый запрос окна: переносим счетчик предыдущего
+        previous = cache.get(f'{RATE_LIMIT_PREFIX}{scope}:{ident}:{int(window) - 1}', 0) & COUNT_MASK
+        cache.add(key, previous << COUNT_BITS, period * 2)
+        packed = cache.incr(key)
+
+    previous, current = packed >> COUNT_BITS, packed & COUNT_MASK
+    if previous * (1 - elapsed) + current <= limit:
+        return RateLimitResult(allowed=True)
+    retry_after = _retry_after(previous, current, elapsed, limit, period)
+    return RateLimitResult(allowed=False, retry_after=max(1, math.ceil(retry_after)))
+
+
+def rate_limit(scope, key='user', methods=('POST',)):
+    """
+    Декоратор представления с лимитом RATE_LIMITS[scope].
+
+    key='user' - счетчик на пользователя (анонимный - по IP), 'ip' - на
+    адрес; methods - какие запросы учитываются.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            rate = settings.RATE_LIMITS.get(scope)
+            if not settings.RATE_LIMIT_ENABLED or not rate or request.method not in methods:
+                return view_func(request, *args, **kwargs)
+            if key == 'user' and request.user.is_authenticated:
+                ident = f'user:{request.user.pk}'
+            else:
+                ident = f'ip:{client_ip(request)}'
+            result = hit(scope, ident, *parse_rate(rate))
+            if result.allowed:
+                return view_func(request, *args, **kwargs)
+            response = render(
+                request,
+                'cinema/rate_limited.html',
+                {'retry_after': result.retry_after},
+                status=429,
+            )
+            response['Retry-After'] = str(result.retry_after)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,225 @@
+"""
+Рекомендации "зрители также смотрели".
+
+Интерес зрителя к фильму - купленный (не отмененный) билет или отзыв.
+Из пар (зритель, фильм) строится разреженная матрица совместных
+просмотров C = XᵀX, где X - бинарная матрица зритель x фильм; C хранится
+в ``MovieCooccurrence`` только ненулевыми элементами, на диагонали - число
+зрителей фильма. Сходство фильмов - косинусное:
+
+    sim(i, j) = C[i][j] / sqrt(C[i][i] * C[j][j])
+
+Для каждого фильма сохраняются ``RECOMMENDER_TOP_K`` ближайших
+(``MovieSimilarity``). Матрица считается в памяти словарями строк
+(каталог фильмов небольшой, число зрителей не ограничено - они
+обрабатываются потоком, сгруппированными по пользователю).
+
+Инкрементный пересчет берет только просмотры после начала предыдущего
+запуска: для каждого такого зрителя к C добавляются пары "новый фильм x
+все его фильмы", после чего top-K пересчитывается только для фильмов,
+чьи строки или диагональ изменились, и их соседей. Он только прибавляет:
+отмененные после учета билеты и удаленные отзывы из матрицы не
+вычитаются. Поэтому не реже раза в ``RECOMMENDER_FULL_EVERY_DAYS`` дней
+запуск автоматически становится полным.
+"""
+import heapq
+import math
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Movie, MovieCooccurrence, MovieSimilarity, RecommenderRun, Review, Ticket
+
+VERSION_KEY = 'recommendations_version'
+CACHE_PREFIX = 'similar_movies:'
+USER_CHUNK = 1000
+
+
+def _interaction_querysets(since=None, until=None, user_ids=None):
+    tickets = Ticket.objects.exclude(status='cancelled')
+    reviews = Review.objects.all()
+    if since is not None:
+        tickets = tickets.filter(booking_date__gte=since)
+        reviews = reviews.filter(created_at__gte=since)
+    if until is not None:
+        tickets = tickets.filter(booking_date__lt=until)
+        reviews = reviews.filter(created_at__lt=until)
+    if user_ids is not None:
+        tickets = tickets.filter(user_id__in=user_ids)
+        reviews = reviews.filter(user_id__in=user_ids)
+    return (
+        tickets.values_list('user_id', 'showtime__movie_id').distinct().order_by('user_id'),
+        reviews.values_list('user_id', 'movie_id').distinct().order_by('user_id'),
+    )
+
+
+def baskets(since=None, until=None, user_ids=None):
+    """Потоком: (id зрителя, множество фильмов) в порядке id зрителя"""
+    tickets, reviews = _interaction_querysets(since, until, user_ids)
+    merged = heapq.merge(tickets.iterator(chunk_size=5000), reviews.iterator(chunk_size=5000))
+    for user_id, rows in groupby(merged, key=lambda row: row[0]):
+        yield user_id, {movie_id for _, movie_id in rows}
+
+
+def add_basket(matrix, movies, known=()):
+    """
+    Добавить в матрицу пары зрителя: новые фильмы между собой и с уже
+    учтенными (known). Матрица - {фильм: Counter{фильм: зрителей}}.
+    """
+    movies = set(movies) - set(known)
+    for movie in movies:
+        row = matrix[movie]
+        for other in movies:
+            row[other] += 1
+        for other in known:
+            row[other] += 1
+            matrix[other][movie] += 1
+    return len(movies)
+
+
+def top_neighbours(movie_id, row, diagonal, allowed, k, min_support):
+    """Top-K фильмов по косинусному сходству для строки матрицы"""
+    own = diagonal.get(movie_id)
+    if not own:
+        return []
+    scores = []
+    for other, count in row.items():
+        if other == movie_id or other not in allowed or count < min_support:
+            continue
+        scores.append((count / math.sqrt(own * diagonal[other]), other))
+    return heapq.nlargest(k, scores)
+
+
+def _save_cooccurrence(matrix, replace=False):
+    """Записать строки матрицы (replace - целиком, иначе прибавить к текущим)"""
+    with transaction.atomic():
+        if replace:
+            MovieCooccurrence.objects.all().delete()
+            existing = {}
+        else:
+            existing = {
+                (row.movie_id, row.other_id): row
+                for row in MovieCooccurrence.objects.filter(movie_id__in=list(matrix))
+            }
+        created, updated = [], []
+        for movie_id, row in matrix.items():
+            for other_id, count in row.items():
+                current = existing.get((movie_id, other_id))
+                if current is None:
+                    created.append(MovieCooccurrence(movie_id=movie_id, other_id=other_id, count=count))
+                else:
+                    current.count += count
+                    updated.append(current)
+        MovieCooccurrence.objects.bulk_create(created, batch_size=2000)
+        MovieCooccurrence.objects.bulk_update(updated, ['count'], batch_size=2000)
+
+
+def _rebuild_similarities(movie_ids=None):
+    """Пересчитать top-K по сохраненной матрице (для указанных фильмов или всех)"""
+    k = settings.RECOMMENDER_TOP_K
+    min_support = settings.RECOMMENDER_MIN_SUPPORT
+    allowed = set(Movie.objects.filter(is_active=True).values_list('id', flat=True))
+    diagonal = dict(
+        MovieCooccurrence.objects.filter(movie=F('other')).values_list('movie_id', 'count')
+    )
+    rows = MovieCooccurrence.objects.exclude(movie=F('other'))
+    if movie_ids is not None:
+        rows = rows.filter(movie_id__in=movie_ids)
+    matrix = defaultdict(dict)
+    for movie_id, other_id, count in rows.values_list('movie_id', 'other_id', 'count').iterator():
+        matrix[movie_id][other_id] = count
+
+    targets = set(matrix) if movie_ids is None else set(movie_ids)
+    similarities = []
+    for movie_id in targets:
+        neighbours = top_neighbours(movie_id, matrix.get(movie_id, {}), diagonal, allowed, k, min_support)
+        similarities.extend(
+            MovieSimilarity(movie_id=movie_id, similar_id=other, score=score, rank=rank)
+            for rank, (score, other) in enumerate(neighbours, start=1)
+        )
+
+    with transaction.atomic():
+        stale = MovieSimilarity.objects.all()
+        if movie_ids is not None:
+            stale = stale.filter(movie_id__in=targets)
+        stale.delete()
+        MovieSimilarity.objects.bulk_create(similarities, batch_size=2000)
+    return len(targets)
+
+
+def build_full(run):
+    """Полный пересчет матрицы по всем просмотрам"""
+    matrix = defaultdict(Counter)
+    for _, movies in baskets(until=run.started_at):
+        run.interactions += add_basket(matrix, movies)
+    _save_cooccurrence(matrix, replace=True)
+    run.movies_updated = _rebuild_similarities()
+
+
+def build_incremental(run, since):
+    """Добавить просмотры с момента since и пересчитать затронутые фильмы"""
+    matrix = defaultdict(Counter)
+    new = list(baskets(since=since, until=run.started_at))
+    for start in range(0, len(new), USER_CHUNK):
+        chunk = dict(new[start:start + USER_CHUNK])
+        known = dict(baskets(until=since, user_ids=list(chunk)))
+        for user_id, movies in chunk.items():
+            run.interactions += add_basket(matrix, movies, known.get(user_id, ()))
+    if not matrix:
+        return
+
+    _save_cooccurrence(matrix)
+    # Изменение диагонали меняет сходство со всеми соседями фильма
+    grown = [movie_id for movie_id, row in matrix.items() if row.get(movie_id)]
+    affected = set(matrix) | set(
+        MovieCooccurrence.objects.filter(other_id__in=grown).values_list('movie_id', flat=True)
+    )
+    run.movies_updated = _rebuild_similarities(affected)
+
+
+def update_recommendations(full=False):
+    """Пересчитать рекомендации (полностью при первом запуске и раз в период)"""
+    now = timezone.now()
+    finished = RecommenderRun.objects.filter(finished_at__isnull=False)
+    previous = finished.first()
+    # Полный пересчет убирает отмененные билеты и удаленные отзывы
+    last_full = finished.filter(full=True).first()
+    outdated = last_full is None or (
+        last_full.started_at < now - timedelta(days=settings.RECOMMENDER_FULL_EVERY_DAYS)
+    )
+    run = RecommenderRun.objects.create(started_at=now, full=full or previous is None or outdated)
+    if run.full:
+        build_full(run)
+    else:
+        build_incremental(run, previous.started_at)
+    run.finished_at = timezone.now()
+    run.save()
+    bump_recommendations_version()
+    return run
+
+
+def bump_recommendations_version():
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def similar_movies(movie_id, limit=None):
+    """Похожие фильмы из кэша (жанры загружены заранее)"""
+    version = cache.get_or_set(VERSION_KEY, time.time_ns, None)
+    key = f'{CACHE_PREFIX}{version}:{movie_id}'
+    movies = cache.get(key)
+    if movies is None:
+        ids = list(
+            MovieSimilarity.objects.filter(movie_id=movie_id)
+            .order_by('rank').values_list('similar_id', flat=True)
+        )
+        by_id = Movie.objects.filter(id__in=ids, is_active=True).prefetch_related('genres').in_bulk()
+        movies = [by_id[pk] for pk in ids if pk in by_id]
+        cache.set(key, movies, settings.RECOMMENDER_CACHE_TIMEOUT)
+    return movies[:limit] if limit else movies
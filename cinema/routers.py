@@ -0,0 +1,122 @@
+"""
+Маршрутизация запросов чтения на реплику базы данных.
+
+Представления, помеченные декоратором ``read_replica``, читают данные
+с алиаса ``replica``. Все записи идут в ``default``. После бронирования
+или отзыва пользователь на время ``REPLICA_STICKY_SECONDS`` закрепляется
+за основной базой, чтобы сразу видеть свои изменения.
+"""
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+REPLICA_ALIAS = 'replica'
+STICKY_SESSION_KEY = 'primary_pinned_until'
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+_lag_state = {'checked_at': 0.0, 'lag': 0.0}
+
+# Если реплика догнала основную базу, отставание равно нулю, иначе
+# считаем его по времени последней применённой транзакции
+PG_LAG_SQL = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def replica_configured():
+    """Настроен ли алиас реплики"""
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def replica_lag():
+    """Отставание реплики в секундах (замер кэшируется на REPLICA_LAG_CHECK_INTERVAL)"""
+    now = time.monotonic()
+    if now - _lag_state['checked_at'] < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return _lag_state['lag']
+
+    lag = 0.0
+    connection = connections[REPLICA_ALIAS]
+    if connection.vendor == 'postgresql':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(PG_LAG_SQL)
+                lag = float(cursor.fetchone()[0] or 0)
+        except DatabaseError:
+            # Недоступная реплика считается бесконечно отстающей
+            lag = float('inf')
+
+    _lag_state['checked_at'] = now
+    _lag_state['lag'] = lag
+    return lag
+
+
+def pin_to_primary(request):
+    """Закрепить пользователя за основной базой после записи (read-your-writes)"""
+    request.session[STICKY_SESSION_KEY] = time.time() + settings.REPLICA_STICKY_SECONDS
+
+
+def is_pinned_to_primary(request):
+    """Проверить, действует ли закрепление за основной базой"""
+    session = getattr(request, 'session', None)
+    if session is None:
+        return False
+    return session.get(STICKY_SESSION_KEY, 0) > time.time()
+
+
+def can_use_replica(request):
+    """Можно ли обслужить запрос с реплики"""
+    if not replica_configured():
+        return False
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if is_pinned_to_primary(request):
+        return False
+    return replica_lag() <= settings.REPLICA_MAX_LAG
+
+
+def read_replica(view_func):
+    """Декоратор: все чтения внутри представления идут на реплику"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not can_use_replica(request):
+            return view_func(request, *args, **kwargs)
+        token = _read_from_replica.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _read_from_replica.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Роутер базы данных: чтение с реплики внутри read_replica, запись в default"""
+
+    def db_for_read(self, model, **hints):
+        # Таблица кэша должна читаться без отставания реплики
+        if model._meta.app_label == 'django_cache':
+            return 'default'
+        if _read_from_replica.get():
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика содержит те же данные, что и основная база
+        databases = {'default', REPLICA_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплики приходит с основной базы через репликацию
+        if db == REPLICA_ALIAS:
+            return False
+        return None
@@ -0,0 +1,228 @@
+"""
+Пакетный импорт расписания сеансов из CSV/JSON.
+
+Каждая строка - шаблон: фильм в указанное время в нескольких залах
+кинотеатра на каждый день периода, например::
+
+    movie,cinema,halls,times,date_from,date_to,price
+    Матрица,КиноМир Москва,"Зал 1,Зал 2",10:00/13:00/16:00,2025-10-06,2025-10-12,350
+
+Фильм и кинотеатр задаются id или названием, залы - названиями внутри
+кинотеатра (или id, если кинотеатр не указан). Справочники загружаются
+заранее, пересечения проверяются в памяти через ScheduleIndex, а все
+сеансы записываются одним bulk_create в одной транзакции.
+"""
+import csv
+import io
+import json
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Movie, Cinema, Hall, ShowTime
+from .scheduling import ScheduleConflict, ScheduleIndex, make_slot
+
+HALL_SEPARATOR = re.compile(r'\s*[,|]\s*')
+TIME_SEPARATOR = re.compile(r'[\s/,;|]+')
+BATCH_SIZE = 2000
+
+
+class ScheduleImportError(ValueError):
+    """Ошибки разбора или проверки расписания"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(errors[:5]))
+
+
+@dataclass
+class ImportResult:
+    showtimes: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+    created: int = 0
+
+
+def parse_rows(data, fmt=None):
+    """Строки шаблонов из CSV или JSON (формат определяется автоматически)"""
+    if isinstance(data, bytes):
+        try:
+            data = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ScheduleImportError(['Файл должен быть в кодировке UTF-8'])
+    text = data.strip()
+    if fmt == 'json' or (fmt is None and text[:1] in '[{'):
+        try:
+            rows = json.loads(text)
+        except ValueError as e:
+            raise ScheduleImportError([f'Некорректный JSON: {e}'])
+        if isinstance(rows, dict):
+            return [rows]
+        if not isinstance(rows, list):
+            raise ScheduleImportError(['Ожидается JSON-массив объектов'])
+        return rows
+    try:
+        dialect = csv.Sniffer().sniff(text.split('\n', 1)[0], delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    return list(csv.DictReader(io.StringIO(text), dialect=dialect))
+
+
+class _Catalog:
+    """Справочники фильмов и залов, загруженные одним проходом"""
+
+    def __init__(self):
+        self.movies = {}
+        for movie in Movie.objects.only('id', 'title', 'duration', 'release_date'):
+            self.movies[str(movie.id)] = movie
+            self.movies.setdefault(movie.title.casefold(), movie)
+        self.cinemas = {}
+        for cinema in Cinema.objects.only('id', 'name'):
+            self.cinemas[str(cinema.id)] = cinema
+            self.cinemas.setdefault(cinema.name.casefold(), cinema)
+        self.halls_by_id = {}
+        self.halls = {}
+        for hall in Hall.objects.only('id', 'name', 'cinema_id'):
+            self.halls_by_id[str(hall.id)] = hall
+            self.halls[(hall.cinema_id, hall.name.casefold())] = hall
+
+    def movie(self, value):
+        return self.movies.get(str(value).strip().casefold())
+
+    def cinema(self, value):
+        return self.cinemas.get(str(value).strip().casefold())
+
+    def hall(self, cinema, value):
+        value = str(value).strip()
+        if cinema is None:
+            return self.halls_by_id.get(value)
+        return self.halls.get((cinema.id, value.casefold()))
+
+
+def _split(value, separator):
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item for item in separator.split(str(value or '').strip()) if item]
+
+
+def _parse_date(value):
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value).strip(), '%Y-%m-%d').date()
+
+
+def _parse_time(value):
+    return datetime.strptime(value, '%H:%M').time()
+
+
+def expand(rows):
+    """
+    Развернуть шаблоны в список (номер строки, зал, фильм, начало, цена).
+    Ошибки всех строк собираются и выбрасываются вместе.
+    """
+    catalog = _Catalog()
+    tz = timezone.get_current_timezone()
+    candidates = []
+    errors = []
+
+    for number, row in enumerate(rows, start=1):
+        # JSON-массив может содержать что угодно, не только объекты
+        if not isinstance(row, dict):
+            errors.append(f'Строка {number}: ожидается объект с полями movie, halls, times, date_from, price')
+            continue
+        row = {key.strip().lower(): value for key, value in row.items() if key}
+        try:
+            movie = catalog.movie(row.get('movie', ''))
+            if movie is None:
+                raise ValueError(f'фильм "{row.get("movie")}" не найден')
+
+            cinema = None
+            if row.get('cinema'):
+                cinema = catalog.cinema(row['cinema'])
+                if cinema is None:
+                    raise ValueError(f'кинотеатр "{row["cinema"]}" не найден')
+
+            halls = []
+            for name in _split(row.get('halls'), HALL_SEPARATOR):
+                hall = catalog.hall(cinema, name)
+                if hall is None:
+                    raise ValueError(f'зал "{name}" не найден')
+                halls.append(hall)
+            if not halls:
+                raise ValueError('не указаны залы')
+
+            times = [_parse_time(value) for value in _split(row.get('times'), TIME_SEPARATOR)]
+            if not times:
+                raise ValueError('не указано время')
+
+            date_from = _parse_date(row.get('date_from'))
+            date_to = _parse_date(row['date_to']) if row.get('date_to') else date_from
+            if date_to < date_from:
+                raise ValueError('date_to раньше date_from')
+
+            price = Decimal(str(row.get('price')).strip())
+            if price < 0:
+                raise ValueError('отрицательная цена')
+        except (ValueError, KeyError, TypeError, InvalidOperation) as e:
+            errors.append(f'Строка {number}: {e}')
+            continue
+
+        day = date_from
+        while day <= date_to:
+            for show_time in times:
+                start = timezone.make_aware(datetime.combine(day, show_time), tz)
+                for hall in halls:
+                    candidates.append((number, hall, movie, start, price))
+            day += timedelta(days=1)
+
+    if errors:
+        raise ScheduleImportError(errors)
+    return candidates
+
+
+def import_schedule(rows, skip_conflicts=False, dry_run=False):
+    """
+    Проверить и создать сеансы. Если есть пересечения и skip_conflicts не
+    задан, ничего не записывается и выбрасывается ScheduleImportError.
+    """
+    candidates = expand(rows)
+    result = ImportResult()
+    if not candidates:
+        return result
+
+    hall_ids = {hall.id for _, hall, _, _, _ in candidates}
+    period_start = min(start for _, _, _, start, _ in candidates)
+    period_end = max(
+        make_slot(start, movie.duration).end for _, _, movie, start, _ in candidates
+    )
+
+    with transaction.atomic():
+        if not dry_run:
+            # Блокируем залы, чтобы параллельный импорт не создал пересечений
+            list(Hall.objects.select_for_update().filter(id__in=hall_ids).values_list('id'))
+        index = ScheduleIndex.load(hall_ids, period_start, period_end)
+
+        errors = []
+        for number, hall, movie, start, price in sorted(candidates, key=lambda item: item[3]):
+            try:
+                index.add(hall.id, make_slot(start, movie.duration, movie_id=movie.id))
+            except ScheduleConflict as e:
+                message = f'Строка {number}: {movie.title}, {hall.name}, {timezone.localtime(start):%d.%m %H:%M} - {e}'
+                if skip_conflicts:
+                    result.skipped.append(message)
+                    continue
+                errors.append(message)
+                continue
+            result.showtimes.append(
+                ShowTime(movie=movie, hall=hall, start_time=start, price=price, is_active=True)
+            )
+
+        if errors:
+            raise ScheduleImportError(errors)
+        if not dry_run:
+            ShowTime.objects.bulk_create(result.showtimes, batch_size=BATCH_SIZE)
+            result.created = len(result.showtimes)
+    return result
@@ -0,0 +1,252 @@
+"""
+Планирование сеансов без пересечений.
+
+Для каждого зала хранится отсортированный по началу список интервалов
+``[начало, конец фильма + уборка)``. Новый сеанс ищется бинарным
+поиском: из следующих интервалов достаточно сравнить ближайший, из
+предыдущих - те, что начались не раньше, чем за длину самого длинного
+интервала зала. Старые данные могут содержать пересекающиеся сеансы, и
+ближайшего предыдущего соседа для них мало: более ранний длинный сеанс
+может закончиться позже него.
+
+``HallSchedule`` - расписание одного зала, ``ScheduleIndex`` - набор
+расписаний для пакетной проверки (импорт, генерация недели).
+"""
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Movie, ShowTime
+
+
+def cleaning_buffer():
+    """Перерыв на уборку зала после сеанса"""
+    return timedelta(minutes=settings.SCHEDULE_CLEANING_MINUTES)
+
+
+@dataclass(frozen=True)
+class Slot:
+    """Интервал занятости зала (конец включает уборку)"""
+    start: datetime
+    end: datetime
+    showtime_id: Optional[int] = None
+    movie_id: Optional[int] = None
+
+
+class ScheduleConflict(ValueError):
+    """Сеанс пересекается с уже запланированным"""
+
+    def __init__(self, slot, conflict):
+        self.slot = slot
+        self.conflict = conflict
+        super().__init__(
+            f'Зал занят с {timezone.localtime(conflict.start):%d.%m.%Y %H:%M} '
+            f'до {timezone.localtime(conflict.end):%H:%M} (с учетом уборки)'
+        )
+
+
+def make_slot(start, duration_minutes, showtime_id=None, movie_id=None):
+    return Slot(
+        start=start,
+        end=start + timedelta(minutes=duration_minutes) + cleaning_buffer(),
+        showtime_id=showtime_id,
+        movie_id=movie_id,
+    )
+
+
+def max_movie_duration():
+    return Movie.objects.aggregate(longest=Max('duration'))['longest'] or 0
+
+
+def load_window(start, end):
+    """
+    Окно выборки сеансов, способных пересечься с интервалом [start, end):
+    сеанс, начавшийся раньше start не более чем на длину самого длинного
+    фильма с уборкой, может еще идти.
+    """
+    lookbehind = timedelta(minutes=max_movie_duration()) + cleaning_buffer()
+    return start - lookbehind, end
+
+
+class HallSchedule:
+    """Отсортированные интервалы сеансов одного зала"""
+
+    def __init__(self, hall_id):
+        self.hall_id = hall_id
+        self._starts = []
+        self._slots = []
+        # Самый длинный интервал: раньше start - longest пересечений нет
+        self._longest = timedelta(0)
+
+    @classmethod
+    def load(cls, hall_id, start, end):
+        """Загрузить активные сеансы зала, которые могут пересечься с [start, end)"""
+        return ScheduleIndex.load([hall_id], start, end).hall(hall_id)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __iter__(self):
+        return iter(self._slots)
+
+    def _neighbour(self, index, step, exclude_id):
+        # Пропускаем редактируемый сеанс
+        while 0 <= index < len(self._slots):
+            slot = self._slots[index]
+            if exclude_id is None or slot.showtime_id != exclude_id:
+                return slot
+            index += step
+        return None
+
+    def find_conflict(self, start, end, exclude_id=None):
+        """Первый интервал, пересекающийся с [start, end), или None"""
+        index = bisect_right(self._starts, start)
+        earliest = start - self._longest
+        for position in range(index - 1, -1, -1):
+            previous = self._slots[position]
+            if previous.start < earliest:
+                break
+            if previous.end > start and (exclude_id is None or previous.showtime_id != exclude_id):
+                return previous
+        following = self._neighbour(index, 1, exclude_id)
+        if following is not None and following.start < end:
+            return following
+        return None
+
+    def insert(self, slot):
+        """Добавить интервал без проверки (для загрузки из базы)"""
+        index = bisect_right(self._starts, slot.start)
+        self._starts.insert(index, slot.start)
+        self._slots.insert(index, slot)
+        self._longest = max(self._longest, slot.end - slot.start)
+
+    def add(self, slot):
+        """Добавить интервал; ScheduleConflict, если он пересекается с другим"""
+        conflict = self.find_conflict(slot.start, slot.end, exclude_id=slot.showtime_id)
+        if conflict is not None:
+            raise ScheduleConflict(slot, conflict)
+        if slot.showtime_id is not None:
+            self.remove(slot.showtime_id)
+        self.insert(slot)
+        return slot
+
+    def remove(self, showtime_id):
+        for index, slot in enumerate(self._slots):
+            if slot.showtime_id == showtime_id:
+                del self._starts[index]
+                del self._slots[index]
+                return slot
+        return None
+
+    def earliest_start(self, not_before, length, step):
+        """
+        Самое раннее начало >= not_before (кратное step от полуночи), при
+        котором интервал длиной length не пересекается с остальными.
+        """
+        start = _round_up(not_before, step)
+        while True:
+            conflict = self.find_conflict(start, start + length)
+            if conflict is None:
+                return start
+            start = _round_up(conflict.end, step)
+
+
+class ScheduleIndex:
+    """Расписания нескольких залов для пакетной проверки в памяти"""
+
+    def __init__(self):
+        self._halls = {}
+
+    @classmethod
+    def load(cls, hall_ids, start, end):
+        """Загрузить активные сеансы залов за период одним запросом"""
+        index = cls()
+        hall_ids = list(hall_ids)
+        for hall_id in hall_ids:
+            index.hall(hall_id)
+        window_start, window_end = load_window(start, end)
+        rows = ShowTime.objects.filter(
+            hall_id__in=hall_ids,
+            is_active=True,
+            start_time__gt=window_start,
+            start_time__lt=window_end,
+        ).values_list('id', 'hall_id', 'movie_id', 'start_time', 'movie__duration')
+        for showtime_id, hall_id, movie_id, start_time, duration in rows.iterator():
+            index.hall(hall_id).insert(make_slot(start_time, duration, showtime_id, movie_id))
+        return index
+
+    def hall(self, hall_id):
+        if hall_id not in self._halls:
+            self._halls[hall_id] = HallSchedule(hall_id)
+        return self._halls[hall_id]
+
+    def add(self, hall_id, slot):
+        return self.hall(hall_id).add(slot)
+
+
+def _round_up(moment, step):
+    """Округлить время вверх до шага сетки (от полуночи по местному времени)"""
+    local = timezone.localtime(moment)
+    midnight = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    steps, remainder = divmod(local - midnight, step)
+    if remainder:
+        steps += 1
+    return midnight + steps * step
+
+
+def find_showtime_conflict(hall, movie, start_time, exclude_id=None):
+    """Проверить сеанс перед сохранением: конфликтующий интервал или None"""
+    slot = make_slot(start_time, movie.duration, exclude_id, movie.id)
+    schedule = HallSchedule.load(hall.id, slot.start, slot.end)
+    return schedule.find_conflict(slot.start, slot.end, exclude_id=exclude_id)
+
+
+def day_bounds(day, opening=None, closing=None):
+    """Время открытия и закрытия зала в указанный день (закрытие может быть после полуночи)"""
+    opening = opening or settings.SCHEDULE_OPENING_TIME
+    closing = closing or settings.SCHEDULE_CLOSING_TIME
+    tz = timezone.get_current_timezone()
+    day_start = timezone.make_aware(datetime.combine(day, opening), tz)
+    day_end = timezone.make_aware(datetime.combine(day, closing), tz)
+    if day_end <= day_start:
+        day_end += timedelta(days=1)
+    return day_start, day_end
+
+
+def autofill_day(hall, day, movies, price, opening=None, closing=None, schedule=None, offset=0):
+    """
+    Заполнить день зала сеансами по кругу из списка фильмов.
+
+    Сеансы начинаются по сетке ``SCHEDULE_SLOT_MINUTES`` между открытием и
+    закрытием, не раньше текущего момента и не раньше даты выхода фильма,
+    с уборкой между сеансами. Возвращает несохраненные ShowTime для
+    bulk_create; принятые интервалы добавляются в schedule.
+    """
+    day_start, day_end = day_bounds(day, opening, closing)
+    if schedule is None:
+        schedule = HallSchedule.load(hall.id, day_start, day_end)
+    movies = [movie for movie in movies if movie.release_date <= day]
+    if not movies:
+        return []
+
+    step = timedelta(minutes=settings.SCHEDULE_SLOT_MINUTES)
+    cursor = max(day_start, timezone.now())
+    showtimes = []
+    position = offset
+    while True:
+        movie = movies[position % len(movies)]
+        position += 1
+        length = timedelta(minutes=movie.duration) + cleaning_buffer()
+        start = schedule.earliest_start(cursor, length, step)
+        # Последний сеанс должен начаться до закрытия
+        if start >= day_end:
+            break
+        slot = schedule.add(Slot(start, start + length, None, movie.id))
+        showtimes.append(ShowTime(movie=movie, hall=hall, start_time=start, price=price))
+        cursor = slot.end
+    return showtimes
@@ -0,0 +1,304 @@
+"""
+Предварительная проверка отзывов.
+
+Каждый новый отзыв получает оценку подозрительности из нескольких
+признаков:
+
+* стоп-слова и шаблоны (ссылки, телефоны, реклама, оскорбления) - все
+  словари собраны в одно регулярное выражение в виде префиксного дерева,
+  поэтому текст просматривается за один проход;
+* почти одинаковые тексты - MinHash-подпись по словесным шинглам,
+  разбитая на полосы (LSH); совпадение полосы с полосой другого отзыва
+  означает близкий текст. Полосы хранятся в ``ReviewBand``;
+* расхождение оценки и тона текста (10 баллов и "ужасно скучный фильм").
+
+Отзыв с оценкой не ниже ``REVIEW_SCREENING_THRESHOLD`` снимается с
+публикации и попадает в очередь модерации, остальные остаются
+опубликованными. Решение модератора (``moderated_at``) повторная проверка
+не меняет, только обновляет оценку. Новые отзывы проверяются в пуле потоков после ответа,
+накопившиеся - командой ``screen_reviews`` в пуле процессов.
+"""
+import hashlib
+import logging
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from random import Random
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Review, ReviewBand
+from .moderation import refresh_rating_summaries
+
+logger = logging.getLogger(__name__)
+
+# Основы слов: совпадение с началом слова, окончания не важны
+STOP_WORDS = [
+    'казино', 'букмекер', 'займ',
+    'крипт', 'биткоин', 'промокод', 'телеграм', 'ватсап', 'whatsapp',
+    'viagra', 'виагр', 'порн', 'эскорт', 'интим',
+    'дерьм', 'говн', 'идиот', 'дебил', 'урод', 'мраз', 'сдохн', 'тварь',
+]
+# Слова, основы которых встречаются и в обычных отзывах ("доходчиво",
+# "подписи", "заработали в прокате") - только эти формы целиком
+STOP_FORMS = [
+    'ставки', 'ставок', 'ставку',
+    'заработок', 'заработка', 'заработком', 'заработать', 'зарабатывай', 'зарабатывайте',
+    'доход', 'дохода', 'доходы', 'доходов', 'доходом',
+    'кредит', 'кредиты', 'кредитов', 'кредитка', 'кредитку',
+    'подпишись', 'подпишитесь', 'подписывайтесь', 'подписчиков',
+]
+PATTERNS = {
+    'link': r'https?://|www\.|t\.me/|\b[\w-]+\.(?:ru|com|net|org|io|me|xyz|info)\b',
+    'contact': r'(?:\+7|\b8)[\s(-]*\d{3}[\s)-]*\d{3}[\s-]*\d{2}[\s-]*\d{2}|\b[\w.+-]+@[\w-]+\.\w+',
+    'repeat': r'(?P<char>\S)(?P=char){5,}',
+}
+POSITIVE_WORDS = [
+    'отличн', 'прекрасн', 'великолепн', 'шедевр', 'восхит', 'восторг', 'понрав',
+    'рекоменд', 'любим', 'лучш', 'супер', 'класс', 'потрясающ', 'замечательн',
+]
+NEGATIVE_WORDS = [
+    'ужасн', 'скучн', 'отврат', 'разочаров', 'худш', 'провал', 'бред',
+    'кошмар', 'бездарн', 'нудн', 'зря', 'потрачен', 'жаль', 'слаб',
+]
+
+WEIGHTS = {
+    'stopword': 1.0,
+    'link': 1.0,
+    'contact': 1.0,
+    'duplicate': 1.0,
+    'mismatch': 1.0,
+    'caps': 0.5,
+    'repeat': 0.3,
+}
+
+SHINGLE_SIZE = 3
+MIN_SHINGLE_TOKENS = 6
+MINHASH_BANDS = 8
+MINHASH_ROWS = 4
+_MASKS = [Random(1000 + i).getrandbits(32) for i in range(MINHASH_BANDS * MINHASH_ROWS)]
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def trie_pattern(words):
+    """Регулярное выражение в виде префиксного дерева: общие префиксы не повторяются"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        if '' in node and len(node) == 1:
+            return ''
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        optional = '' in node
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        pattern = '(?:' + '|'.join(branches) + ')'
+        return pattern + '?' if optional else pattern
+
+    return build(trie)
+
+
+def _compile_lexicon():
+    stop_words = STOP_WORDS + list(getattr(settings, 'REVIEW_SCREENING_STOP_WORDS', []))
+    lexicon = [
+        rf'\b(?P<stopword>{trie_pattern(word.lower() for word in stop_words)}'
+        rf'|{trie_pattern(STOP_FORMS)}\b)'
+    ]
+    lexicon += [f'(?P<{name}>{pattern})' for name, pattern in PATTERNS.items()]
+    return re.compile('|'.join(lexicon), re.IGNORECASE)
+
+
+LEXICON_RE = _compile_lexicon()
+POSITIVE_RE = re.compile(rf'\b(не\s+)?{trie_pattern(POSITIVE_WORDS)}')
+NEGATIVE_RE = re.compile(rf'\b(не\s+)?{trie_pattern(NEGATIVE_WORDS)}')
+
+
+@dataclass
+class ScreeningResult:
+    score: float = 0
+    flags: list = field(default_factory=list)
+    buckets: list = field(default_factory=list)
+
+    def flag(self, name):
+        if name not in self.flags:
+            self.flags.append(name)
+            self.score += WEIGHTS[name]
+
+
+def normalize(text):
+    return text.lower().replace('ё', 'е')
+
+
+def sentiment(text):
+    """Разница положительных и отрицательных слов с учетом частицы "не" """
+    value = 0
+    for match in POSITIVE_RE.finditer(text):
+        value += -1 if match.group(1) else 1
+    for match in NEGATIVE_RE.finditer(text):
+        value += 1 if match.group(1) else -1
+    return value
+
+
+def minhash_buckets(tokens):
+    """Корзины LSH по полосам MinHash-подписи (пусто для слишком коротких текстов)"""
+    if len(tokens) < MIN_SHINGLE_TOKENS:
+        return []
+    hashes = {
+        zlib.crc32(' '.join(tokens[i:i + SHINGLE_SIZE]).encode('utf-8'))
+        for i in range(len(tokens) - SHINGLE_SIZE + 1)
+    }
+    signature = [min(map(mask.__xor__, hashes)) for mask in _MASKS]
+    buckets = []
+    for band in range(MINHASH_BANDS):
+        rows = signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]
+        digest = hashlib.blake2b(repr((band, rows)).encode('ascii'), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
+
+
+def screen_text(text, rating):
+    """Признаки, не зависящие от других отзывов (без проверки на дубликаты)"""
+    result = ScreeningResult()
+    normalized = normalize(text)
+
+    for match in LEXICON_RE.finditer(normalized):
+        result.flag(match.lastgroup)
+
+    letters = [char for char in text if char.isalpha()]
+    if len(letters) >= 20 and sum(char.isupper() for char in letters) > len(letters) * 0.6:
+        result.flag('caps')
+
+    tone = sentiment(normalized)
+    if (rating >= 8 and tone <= -2) or (rating <= 3 and tone >= 2):
+        result.flag('mismatch')
+
+    result.buckets = minhash_buckets(_TOKEN_RE.findall(normalized))
+    return result
+
+
+def screen_batch(items):
+    """Проверка пакета [(id, rating, text), ...] - выполняется в процессах пула"""
+    results = []
+    for review_id, rating, text in items:
+        result = screen_text(text, rating)
+        results.append((review_id, result.score, result.flags, result.buckets))
+    return results
+
+
+def find_duplicates(results):
+    """
+    Id отзывов, у которых есть более ранний отзыв с общей корзиной LSH.
+    results - [(id, score, flags, buckets), ...] в порядке возрастания id.
+    """
+    buckets = {bucket for _, _, _, review_buckets in results for bucket in review_buckets}
+    owners = {}
+    bucket_list = list(buckets)
+    for start in range(0, len(bucket_list), 1000):
+        for bucket, review_id in ReviewBand.objects.filter(
+            bucket__in=bucket_list[start:start + 1000]
+        ).values_list('bucket', 'review_id'):
+            owners[bucket] = min(owners.get(bucket, review_id), review_id)
+
+    duplicates = set()
+    for review_id, _, _, review_buckets in results:
+        for bucket in review_buckets:
+            owner = owners.get(bucket)
+            if owner is not None and owner < review_id:
+                duplicates.add(review_id)
+            else:
+                owners[bucket] = review_id
+    return duplicates
+
+
+def save_results(results, movie_ids):
+    """
+    Записать результаты пакета: дубликаты, полосы, оценки и снятие с
+    публикации подозрительных. movie_ids - {id отзыва: id фильма}.
+    Возвращает число отзывов, отправленных на модерацию.
+    """
+    threshold = settings.REVIEW_SCREENING_THRESHOLD
+    duplicates = find_duplicates(results)
+    now = timezone.now()
+    flagged = []
+    bands = []
+    for review_id, score, flags, buckets in results:
+        if review_id in duplicates and 'duplicate' not in flags:
+            flags = flags + ['duplicate']
+            score += WEIGHTS['duplicate']
+        bands.extend(ReviewBand(review_id=review_id, bucket=bucket) for bucket in buckets)
+        if flags:
+            flagged.append(Review(pk=review_id, screening_score=score, screening_flags=','.join(flags)))
+
+    ids = [review_id for review_id, _, _, _ in results]
+    with transaction.atomic():
+        ReviewBand.objects.filter(review_id__in=ids).delete()
+        ReviewBand.objects.bulk_create(bands, batch_size=2000)
+        Review.objects.filter(pk__in=ids).update(
+            screened_at=now, screening_score=0, screening_flags=''
+        )
+        # Отзывы, уже разобранные модератором, с публикации не снимаем
+        moderated = set(
+            Review.objects.filter(pk__in=[review.pk for review in flagged], moderated_at__isnull=False)
+            .values_list('pk', flat=True)
+        )
+        # Подозрительных немного - только для них пишем оценку и статус
+        suspicious = []
+        for review in flagged:
+            if review.screening_score >= threshold and review.pk not in moderated:
+                review.is_approved = False
+                suspicious.append(review)
+        Review.objects.bulk_update(
+            [review for review in flagged if review.is_approved],
+            ['screening_score', 'screening_flags'],
+            batch_size=500,
+        )
+        Review.objects.bulk_update(
+            suspicious,
+            ['screening_score', 'screening_flags', 'is_approved'],
+            batch_size=500,
+        )
+        refresh_rating_summaries(movie_ids[review.pk] for review in suspicious)
+    return len(suspicious)
+
+
+def screen_review(review_id):
+    """Проверить один отзыв (после add_review)"""
+    row = Review.objects.filter(pk=review_id).values_list('id', 'rating', 'text', 'movie_id').first()
+    if row is None:
+        return 0
+    results = screen_batch([row[:3]])
+    return save_results(results, {row[0]: row[3]})
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _screen_safely(review_id):
+    try:
+        screen_review(review_id)
+    except Exception:
+        logger.exception('Не удалось проверить отзыв %s', review_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_screening(review_id):
+    """Поставить проверку отзыва в пул потоков"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.REVIEW_SCREENING_WORKERS,
+                thread_name_prefix='review-screening',
+            )
+    return _executor.submit(_screen_safely, review_id)
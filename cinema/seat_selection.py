@@ -0,0 +1,107 @@
+"""
+Автоподбор лучших мест.
+
+Каждому месту зала назначается штраф: удаление от центра ряда (0 в
+центре, 1 у края) плюс ``SEAT_ROW_WEIGHT`` x удаление ряда от лучшего
+(доля ``SEAT_IDEAL_ROW`` глубины зала от экрана). Матрица штрафов
+зависит только от размеров зала и хранится в памяти процесса в виде
+префиксных сумм по рядам, поэтому штраф любого блока считается за O(1).
+
+Свободные блоки из N соседних мест находятся сдвигами битовой маски
+свободных мест ряда, так что поиск лучшего блока - O(рядов x мест).
+Места для колясок и неисправные места автоподбор не предлагает.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+
+from .layout import AUTO_SELECT
+
+
+@dataclass(frozen=True)
+class SeatBlock:
+    row: int
+    seat: int
+    count: int
+    score: float
+
+    @property
+    def seats(self):
+        return list(range(self.seat, self.seat + self.count))
+
+
+def find_run(free, length):
+    """
+    Маска начал непрерывных серий из length свободных мест в ряду:
+    бит i установлен, если свободны места i+1 .. i+length.
+    """
+    starts = free
+    span = 1
+    # Удвоение: после шага starts покрывает серии длины span
+    while span < length:
+        step = min(span, length - span)
+        starts &= starts >> step
+        span += step
+    return starts
+
+
+def set_bits(mask):
+    """Номера установленных битов по возрастанию"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+@lru_cache(maxsize=256)
+def score_matrix(rows, seats_per_row, ideal_row, row_weight):
+    """
+    (штрафы рядов, префиксные суммы штрафов мест по рядам).
+    Префиксная сумма ряда p: штраф мест a+1 .. b равен p[b] - p[a].
+    """
+    ideal = 1 + ideal_row * (rows - 1)
+    row_span = max(ideal - 1, rows - ideal, 1)
+    row_scores = tuple(row_weight * abs(row - ideal) / row_span for row in range(1, rows + 1))
+
+    centre = (seats_per_row + 1) / 2
+    seat_span = max(centre - 1, 1)
+    prefix = [0.0]
+    for seat in range(1, seats_per_row + 1):
+        prefix.append(prefix[-1] + abs(seat - centre) / seat_span)
+    # Пока штраф места не зависит от ряда, префиксы у всех рядов общие
+    return row_scores, (tuple(prefix),) * rows
+
+
+def best_block(occupancy, count):
+    """
+    Лучший блок из count соседних свободных мест (SeatBlock) или None.
+    Штраф блока - средний штраф его мест; при равенстве выбирается
+    ближний к экрану ряд и левый блок.
+    """
+    if not 1 <= count <= occupancy.seats_per_row:
+        return None
+    row_scores, prefixes = score_matrix(
+        occupancy.rows,
+        occupancy.seats_per_row,
+        settings.SEAT_IDEAL_ROW,
+        settings.SEAT_ROW_WEIGHT,
+    )
+    best = None
+    for row in range(1, occupancy.rows + 1):
+        row_score = row_scores[row - 1]
+        # Штраф блока не меньше штрафа ряда: хуже найденного - пропускаем
+        if best is not None and row_score >= best[0]:
+            continue
+        starts = find_run(occupancy.free_mask(row, AUTO_SELECT), count)
+        if not starts:
+            continue
+        prefix = prefixes[row - 1]
+        for bit in set_bits(starts):
+            score = row_score + (prefix[bit + count] - prefix[bit]) / count
+            if best is None or score < best[0]:
+                best = (score, row, bit + 1)
+    if best is None:
+        return None
+    score, row, seat = best
+    return SeatBlock(row=row, seat=seat, count=count, score=round(score, 4))
@@ -0,0 +1,103 @@
+"""
+Хранилище сессий и выбор города.
+
+``SessionStore`` - кэшируемые сессии (cached_db) с замером задержек
+хранилища. Выбранный город хранится в подписанной cookie, поэтому
+анонимный посетитель не создает запись в ``django_session``.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+logger = logging.getLogger(__name__)
+
+CITY_COOKIE = 'selected_city'
+CITY_COOKIE_SALT = 'cinema.selected_city'
+CITY_COOKIE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class LatencyStats:
+    """Потокобезопасная статистика задержек по операциям"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, operation, elapsed_ms):
+        with self._lock:
+            stat = self._stats.setdefault(
+                operation, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            )
+            stat['count'] += 1
+            stat['total_ms'] += elapsed_ms
+            stat['max_ms'] = max(stat['max_ms'], elapsed_ms)
+
+    def snapshot(self):
+        """Копия статистики со средним временем операции"""
+        with self._lock:
+            return {
+                operation: {
+                    'count': stat['count'],
+                    'avg_ms': round(stat['total_ms'] / stat['count'], 3),
+                    'max_ms': round(stat['max_ms'], 3),
+                }
+                for operation, stat in self._stats.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+session_metrics = LatencyStats()
+
+
+def _timed(operation):
+    """Декоратор метода хранилища: замер времени и запись в session_metrics"""
+    def decorator(method):
+        def wrapper(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                session_metrics.record(operation, elapsed_ms)
+                if elapsed_ms >= settings.SESSION_SLOW_MS:
+                    logger.warning('Медленная операция сессии %s: %.1f мс', operation, elapsed_ms)
+        return wrapper
+    return decorator
+
+
+class SessionStore(CachedDBStore):
+    """Сессии cached_db с метриками задержек"""
+
+    load = _timed('load')(CachedDBStore.load)
+    save = _timed('save')(CachedDBStore.save)
+    exists = _timed('exists')(CachedDBStore.exists)
+    delete = _timed('delete')(CachedDBStore.delete)
+
+
+def get_selected_city_id(request):
+    """ID выбранного города из подписанной cookie"""
+    value = request.get_signed_cookie(CITY_COOKIE, default=None, salt=CITY_COOKIE_SALT)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def remember_city(response, city):
+    """Сохранить выбранный город в подписанной cookie"""
+    response.set_signed_cookie(
+        CITY_COOKIE,
+        str(city.id),
+        salt=CITY_COOKIE_SALT,
+        max_age=CITY_COOKIE_MAX_AGE,
+        httponly=True,
+        samesite='Lax',
+        secure=settings.SESSION_COOKIE_SECURE,
+    )
+    return response
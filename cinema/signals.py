@@ -0,0 +1,116 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .images import get_variants, schedule_variants
+from .mirror import MIRROR_ROOT, REMOTE_IMAGE_FIELDS, schedule_mirror
+from .models import Movie, Cinema, Hall, Promotion, PriceRule, RemoteImage, Ticket
+from .pricing import bump_pricing_version
+from .promotions import invalidate_active_promotions
+from .recommendations import bump_recommendations_version
+from .personalization import invalidate_catalog
+from .geo import reset_geo_index
+from .occupancy import ACTIVE_STATUSES, record_seat_change
+
+# Поля с загружаемыми изображениями, для которых нужны варианты
+IMAGE_FIELDS = {
+    Movie: 'poster',
+    Cinema: 'image',
+    Promotion: 'image',
+}
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_save, sender=Cinema)
+@receiver(post_save, sender=Promotion)
+def generate_image_variants(sender, instance, raw=False, **kwargs):
+    """Запуск генерации вариантов изображения после сохранения"""
+    if raw:
+        return
+    image = getattr(instance, IMAGE_FIELDS[sender])
+    if image and get_variants(image.name) is None:
+        name = image.name
+        transaction.on_commit(lambda: schedule_variants(name))
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_save, sender=Cinema)
+def mirror_remote_image(sender, instance, raw=False, **kwargs):
+    """Фоновое зеркалирование внешнего изображения после сохранения"""
+    if raw:
+        return
+    url_field, image_field = REMOTE_IMAGE_FIELDS[sender]
+    url = getattr(instance, url_field)
+    image = getattr(instance, image_field)
+
+    # Зеркальная копия старого адреса больше не актуальна - до загрузки
+    # новой шаблоны покажут внешний адрес
+    if image and image.name.startswith(MIRROR_ROOT + '/'):
+        if not url or not RemoteImage.objects.filter(url=url, file=image.name).exists():
+            sender.objects.filter(pk=instance.pk).update(**{image_field: ''})
+            setattr(instance, image_field, '')
+            image = None
+
+    if url and not image:
+        transaction.on_commit(lambda: schedule_mirror(url))
+
+
+@receiver(post_save, sender=PriceRule)
+@receiver(post_delete, sender=PriceRule)
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+@receiver(post_save, sender=Hall)
+@receiver(post_delete, sender=Hall)
+def reset_price_tables(sender, raw=False, **kwargs):
+    """Новая версия цен - скомпилированные таблицы сеансов устаревают"""
+    if raw:
+        return
+    transaction.on_commit(bump_pricing_version)
+
+
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def reset_active_promotions(sender, raw=False, **kwargs):
+    """Пересчитать набор действующих акций после изменения акции"""
+    if raw:
+        return
+    transaction.on_commit(invalidate_active_promotions)
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def reset_similar_movies(sender, raw=False, **kwargs):
+    """Кэшированные списки похожих фильмов содержат данные фильмов"""
+    if raw:
+        return
+    transaction.on_commit(bump_recommendations_version)
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(m2m_changed, sender=Movie.genres.through)
+def reset_movie_catalog(sender, raw=False, **kwargs):
+    """Каталог главной страницы хранит фильмы вместе с жанрами"""
+    if raw:
+        return
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=Cinema)
+@receiver(post_delete, sender=Cinema)
+def reset_cinema_index(sender, raw=False, **kwargs):
+    """Перестроить пространственный индекс кинотеатров"""
+    if raw:
+        return
+    transaction.on_commit(reset_geo_index)
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def record_ticket_seat(sender, instance, signal, raw=False, **kwargs):
+    """Новая версия занятости сеанса: место билета заняли или освободили"""
+    if raw:
+        return
+    taken = signal is post_save and instance.status in ACTIVE_STATUSES
+    showtime_id, row, seat = instance.showtime_id, instance.row, instance.seat
+    transaction.on_commit(lambda: record_seat_change(showtime_id, row, seat, taken))
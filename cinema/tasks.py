@@ -0,0 +1,34 @@
+"""
+Фоновые задачи, которые ставятся в очередь через ``jobs.enqueue``.
+
+Аргументы - только JSON-значения (обычно id): к выполнению данные могли
+измениться, поэтому задача перечитывает их сама и молча завершается,
+если объекта уже нет.
+"""
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.template.loader import render_to_string
+
+from .etickets import eticket_storage, get_eticket
+from .models import Ticket
+
+
+def send_ticket_confirmation(ticket_id):
+    """Письмо с подтверждением покупки и электронным билетом во вложении"""
+    ticket = (
+        Ticket.objects.select_related('user', 'showtime__movie', 'showtime__hall__cinema')
+        .filter(pk=ticket_id, status__in=['booked', 'paid'])
+        .first()
+    )
+    if ticket is None or not ticket.user.email:
+        return
+    message = EmailMessage(
+        subject=f'Билет #{ticket.pk}: {ticket.showtime.movie.title}',
+        body=render_to_string('cinema/emails/ticket_confirmation.txt', {'ticket': ticket}),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[ticket.user.email],
+    )
+    # Билет рисуется здесь, в обработчике очереди, и сразу попадает в хранилище
+    with eticket_storage().open(get_eticket(ticket)) as fh:
+        message.attach(f'ticket-{ticket.pk}.png', fh.read(), 'image/png')
+    message.send()
@@ -0,0 +1,38 @@
+from django import template
+
+from ..images import get_variants, schedule_missing_variants, srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_srcset(image, fmt='jpeg'):
+    """srcset для загруженного изображения (пусто, пока варианты не готовы)"""
+    if not image:
+        return ''
+    return srcset(image.name, fmt)
+
+
+@register.inclusion_tag('cinema/includes/responsive_image.html')
+def responsive_image(image, alt='', css_class='', style='', sizes='100vw'):
+    """
+    Тег <picture> с вариантами WebP/JPEG. Если варианты еще не созданы,
+    выводит оригинал и ставит генерацию в очередь (не чаще раза в
+    IMAGE_VARIANT_RETRY_SECONDS).
+    """
+    webp = jpeg = ''
+    if image:
+        if get_variants(image.name) is None:
+            schedule_missing_variants(image.name)
+        else:
+            webp = srcset(image.name, 'webp')
+            jpeg = srcset(image.name, 'jpeg')
+    return {
+        'src': image.url if image else '',
+        'webp_srcset': webp,
+        'jpeg_srcset': jpeg,
+        'alt': alt,
+        'css_class': css_class,
+        'style': style,
+        'sizes': sizes,
+    }
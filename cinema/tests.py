@@ -0,0 +1,22 @@
+from datetime import date
+
+from django.test import TestCase
+
+from .models import Movie, Review, ReviewBand, User
+from .moderation import apply_bulk_action
+
+
+class BulkModerationTests(TestCase):
+    def setUp(self):
+        self.movie = Movie.objects.create(
+            title='Фильм', duration=100, release_date=date(2024, 1, 1), director='Режиссер'
+        )
+        self.user = User.objects.create_user('viewer', password='secret')
+
+    def test_delete_counts_reviews_without_cascaded_bands(self):
+        review = Review.objects.create(movie=self.movie, user=self.user, rating=5, text='Отлично')
+        ReviewBand.objects.bulk_create(ReviewBand(review=review, bucket=bucket) for bucket in range(3))
+
+        self.assertEqual(apply_bulk_action('delete', [review.pk]), 1)
+        self.assertFalse(Review.objects.exists())
+        self.assertFalse(ReviewBand.objects.exists())
@@ -0,0 +1,134 @@
+"""
+Журнал событий билетов (``TicketEvent``).
+
+Событие пишется в той же транзакции, что и изменение билета: отмена без
+записи в журнале не сохранится, и наоборот. Запись - несколько чисел
+(билет, вид события, цена, кто, время), история билета читается по
+индексу (билет, время).
+
+Старые события выгружаются ``archive_events`` в сжатые CSV в
+``TICKET_EVENT_ARCHIVE_ROOT`` - каталог на месяц, файл на пакет - и
+только после записи файла удаляются из базы. Найти билет в архиве:
+``zgrep ',<id билета>,' <каталог>/*/*.csv.gz``.
+"""
+import csv
+import gzip
+import io
+import os
+from itertools import groupby
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import TicketEvent
+
+STATUS_EVENTS = {
+    'booked': TicketEvent.BOOKED,
+    'paid': TicketEvent.PAID,
+    'cancelled': TicketEvent.CANCELLED,
+}
+KIND_CODES = {
+    TicketEvent.BOOKED: 'booked',
+    TicketEvent.PAID: 'paid',
+    TicketEvent.CANCELLED: 'cancelled',
+    TicketEvent.CHECKED_IN: 'checked_in',
+    TicketEvent.PRICE: 'price',
+}
+ARCHIVE_FIELDS = ['id', 'ticket_id', 'kind', 'price', 'actor_id', 'created_at']
+DELETE_BATCH = 1000
+
+
+def _event(ticket_id, kind, actor=None, price=None, at=None):
+    event = TicketEvent(ticket_id=ticket_id, kind=kind, price=price, actor_id=getattr(actor, 'pk', None))
+    if at is not None:
+        event.created_at = at
+    return event
+
+
+def log_event(ticket, kind, actor=None, price=None, at=None):
+    """Записать событие билета; вызывать в транзакции изменения билета"""
+    event = _event(ticket.pk, kind, actor, price, at)
+    event.save()
+    return event
+
+
+def log_status(ticket, actor=None):
+    """Событие текущего статуса билета (отмена, оплата)"""
+    return log_event(ticket, STATUS_EVENTS[ticket.status], actor)
+
+
+def log_created(ticket, actor=None):
+    """Новый билет: бронирование с ценой и, если он сразу оплачен, оплата"""
+    events = [_event(ticket.pk, TicketEvent.BOOKED, actor, ticket.price, ticket.booking_date)]
+    if ticket.status != 'booked':
+        events.append(_event(ticket.pk, STATUS_EVENTS[ticket.status], actor, ticket.price, ticket.booking_date))
+    TicketEvent.objects.bulk_create(events)
+
+
+def log_check_ins(ticket_times, actor=None):
+    """События прохода: {id билета: время}"""
+    TicketEvent.objects.bulk_create(
+        [_event(ticket_id, TicketEvent.CHECKED_IN, actor, at=at) for ticket_id, at in ticket_times.items()]
+    )
+
+
+def ticket_timeline(ticket_id):
+    """События билета по времени (из базы; архивные - в файлах)"""
+    return list(TicketEvent.objects.filter(ticket_id=ticket_id).select_related('actor').order_by('created_at', 'id'))
+
+
+def _write_archive(month, rows, root):
+    """Записать события одного месяца в сжатый CSV; путь файла"""
+    directory = Path(root) / month
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'ticket-events-{rows[0][0]}-{rows[-1][0]}.csv.gz'
+    temporary = path.with_suffix('.tmp')
+    with open(temporary, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6, mtime=0) as compressed:
+            text = io.TextIOWrapper(compressed, encoding='utf-8', newline='')
+            writer = csv.writer(text)
+            writer.writerow(ARCHIVE_FIELDS)
+            for event_id, ticket_id, kind, price, actor_id, created_at in rows:
+                writer.writerow([
+                    event_id,
+                    ticket_id,
+                    KIND_CODES[kind],
+                    '' if price is None else price,
+                    actor_id or '',
+                    created_at.isoformat(),
+                ])
+            text.flush()
+            text.detach()
+        raw.flush()
+        # Строки удаляются из базы только после записи файла на диск
+        os.fsync(raw.fileno())
+    os.replace(temporary, path)
+    return path
+
+
+def archive_events(before, chunk_size=50000, root=None):
+    """
+    Выгрузить события до before в архив и удалить их из базы пакетами по
+    chunk_size. Возвращает (событий, файлов).
+    """
+    root = root or settings.TICKET_EVENT_ARCHIVE_ROOT
+    archived = files = 0
+    last_id = 0
+    while True:
+        rows = list(
+            TicketEvent.objects.filter(created_at__lt=before, id__gt=last_id)
+            .order_by('id')
+            .values_list(*ARCHIVE_FIELDS)[:chunk_size]
+        )
+        if not rows:
+            return archived, files
+        for month, month_rows in groupby(rows, key=lambda row: row[-1].strftime('%Y-%m')):
+            _write_archive(month, list(month_rows), root)
+            files += 1
+        ids = [row[0] for row in rows]
+        with transaction.atomic():
+            for start in range(0, len(ids), DELETE_BATCH):
+                TicketEvent.objects.filter(id__in=ids[start:start + DELETE_BATCH]).delete_archived()
+        archived += len(rows)
+        last_id = ids[-1]
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'cinema'
 
@@ -39,17 +39,32 @@ urlpatterns = [
     path('profile/edit/', views.edit_profile, name='edit_profile'),
     path('profile/change-password/', views.change_password, name='change_password'),
     path('my-tickets/', views.my_tickets, name='my_tickets'),
+    path('my-tickets/<int:pk>/eticket.png', views.eticket, name='eticket'),
     path('my-reviews/', views.my_reviews, name='my_reviews'),
     path('review/<int:pk>/delete/', views.delete_review, name='delete_review'),
     
     # Бронирование билетов
     path('showtime/<int:pk>/book/', views.book_ticket, name='book_ticket'),
+    path('showtime/<int:pk>/queue/', views.waiting_room, name='waiting_room'),
     path('ticket/<int:pk>/cancel/', views.cancel_ticket, name='cancel_ticket'),
     
+    # API
+    path('api/cinemas/nearest/', api.nearest_cinemas_api, name='api_nearest_cinemas'),
+    path('api/showtimes/nearest/', api.nearest_showtimes_api, name='api_nearest_showtimes'),
+    path('api/showtimes/available/', api.available_showtimes_api, name='api_available_showtimes'),
+    path('api/showtimes/<int:pk>/best-seats/', api.best_seats_api, name='api_best_seats'),
+    path('api/showtimes/<int:pk>/seats/', api.seat_map_api, name='api_seat_map'),
+    path('api/showtimes/<int:pk>/seats/events/', api.seat_events_api, name='api_seat_events'),
+    path('api/showtimes/<int:pk>/queue/', api.queue_status_api, name='api_queue_status'),
+    path('api/checkin/', api.checkin_api, name='api_checkin'),
+    path('api/checkin/sync/', api.checkin_sync_api, name='api_checkin_sync'),
+    
     # Панель сотрудника
     path('staff/', views.staff_dashboard, name='staff_dashboard'),
     path('staff/seats/<int:showtime_id>/', views.staff_seats, name='staff_seats'),
+    path('staff/checkin/', views.staff_checkin, name='staff_checkin'),
     path('staff/reviews/', views.staff_reviews, name='staff_reviews'),
+    path('staff/reviews/bulk/', views.staff_reviews_bulk, name='staff_reviews_bulk'),
     path('staff/review/<int:pk>/toggle/', views.toggle_review_approval, name='toggle_review_approval'),
     path('staff/review/<int:pk>/delete/', views.staff_delete_review, name='staff_delete_review'),
     
@@ -65,6 +80,8 @@ urlpatterns = [
     # Управление сеансами
     path('admin-panel/showtimes/', views.admin_showtimes, name='admin_showtimes'),
     path('admin-panel/showtime/create/', views.admin_showtime_create, name='admin_showtime_create'),
+    path('admin-panel/showtime/autofill/', views.admin_showtime_autofill, name='admin_showtime_autofill'),
+    path('admin-panel/showtime/import/', views.admin_showtime_import, name='admin_showtime_import'),
     path('admin-panel/showtime/<int:pk>/edit/', views.admin_showtime_edit, name='admin_showtime_edit'),
     path('admin-panel/showtime/<int:pk>/delete/', views.admin_showtime_delete, name='admin_showtime_delete'),
     
@@ -102,6 +119,7 @@ urlpatterns = [
     # Управление билетами
     path('admin-panel/tickets/', views.admin_tickets, name='admin_tickets'),
     path('admin-panel/ticket/<int:pk>/cancel/', views.admin_ticket_cancel, name='admin_ticket_cancel'),
+    path('admin-panel/ticket/<int:pk>/history/', views.admin_ticket_history, name='admin_ticket_history'),
     
     # Аналитика
     path('admin-panel/analytics/', views.admin_analytics, name='admin_analytics'),
@@ -2,8 +2,11 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, update_session_auth_hash
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Q, Count, Sum, Avg
+from django.http import FileResponse, Http404
 from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
 from datetime import datetime, timedelta
 from .models import (
     City, Movie, Cinema, Hall, ShowTime, Ticket, 
@@ -12,22 +15,40 @@ from .models import (
 from .forms import (
     UserRegistrationForm, UserLoginForm, UserProfileForm,
     ReviewForm, MovieForm, ShowTimeForm, CinemaForm,
-    HallForm, PromotionForm, RuleForm
+    HallForm, PromotionForm, RuleForm, ShowTimeAutofillForm, ShowTimeImportForm
 )
+from .routers import read_replica, pin_to_primary
+from .sessions import get_selected_city_id, remember_city, session_metrics
+from .scheduling import autofill_day
+from .pricing import get_price_table
+from .promotions import active_promotions
+from .ratelimit import rate_limit
+from .jobs import enqueue
+from .tasks import send_ticket_confirmation
+from .etickets import eticket_storage, get_eticket
+from .ticket_events import log_created, log_status, ticket_timeline
+from .moderation import BULK_ACTIONS, apply_bulk_action, moderation_page, refresh_rating_summaries
+from .screening import schedule_screening
+from .recommendations import similar_movies
+from .personalization import home_page, invalidate_profile
+from .occupancy import get_occupancy, seat_grid
+from .seat_selection import best_block
+from .waiting_room import (
+    get_pass, get_position, grant_pass, join_queue, queue_status, remember_position,
+    requires_queue, revoke_pass, use_pass,
+)
+from .schedule_import import import_schedule, parse_rows, ScheduleImportError
 
 
 def index(request):
     """Главная страница"""
-    movies = Movie.objects.filter(is_active=True)[:6]
-    promotions = Promotion.objects.filter(
-        is_active=True,
-        start_date__lte=timezone.now().date(),
-        end_date__gte=timezone.now().date()
-    )[:3]
+    catalog, recommendations = home_page(request.user, get_selected_city_id(request))
+    promotions = active_promotions()[:3]
     
     context = {
-        'movies': movies,
+        'movies': catalog[:6],
         'promotions': promotions,
+        'recommendations': recommendations,
     }
     return render(request, 'cinema/index.html', context)
 
@@ -35,11 +56,12 @@ def index(request):
 def select_city(request, city_id):
     """Выбор города"""
     city = get_object_or_404(City, id=city_id, is_active=True)
-    request.session['selected_city_id'] = city.id
     messages.success(request, f'Выбран город: {city.name}')
-    return redirect('cinema:index')
+    # Город хранится в подписанной cookie, без записи в сессию
+    return remember_city(redirect('cinema:index'), city)
 
 
+@read_replica
 def movie_list(request):
     """Список фильмов с фильтрацией"""
     movies = Movie.objects.filter(is_active=True)
@@ -73,6 +95,7 @@ def movie_list(request):
     return render(request, 'cinema/movie_list.html', context)
 
 
+@read_replica
 def movie_detail(request, pk):
     """Детальная информация о фильме"""
     movie = get_object_or_404(Movie, pk=pk)
@@ -87,7 +110,7 @@ def movie_detail(request, pk):
             pass
     
     # Получаем сеансы фильма
-    selected_city = request.session.get('selected_city_id')
+    selected_city = get_selected_city_id(request)
     showtimes = ShowTime.objects.filter(
         movie=movie,
         is_active=True,
@@ -103,11 +126,13 @@ def movie_detail(request, pk):
         'user_review': user_review,
         'showtimes': showtimes[:10],
         'average_rating': movie.get_average_rating(),
+        'similar_movies': similar_movies(movie.pk, limit=6),
     }
     return render(request, 'cinema/movie_detail.html', context)
 
 
 @login_required
+@rate_limit('add_review')
 def add_review(request, pk):
     """Добавление отзыва к фильму"""
     movie = get_object_or_404(Movie, pk=pk)
@@ -124,6 +149,11 @@ def add_review(request, pk):
             review.movie = movie
             review.user = request.user
             review.save()
+            refresh_rating_summaries([movie.pk])
+            # Проверка текста идет в фоне; подозрительный отзыв уйдет на модерацию
+            transaction.on_commit(lambda: schedule_screening(review.pk))
+            invalidate_profile(request.user.pk)
+            pin_to_primary(request)
             messages.success(request, 'Отзыв успешно добавлен!')
             return redirect('cinema:movie_detail', pk=pk)
     else:
@@ -136,9 +166,10 @@ def add_review(request, pk):
     return render(request, 'cinema/add_review.html', context)
 
 
+@read_replica
 def schedule(request):
     """Расписание сеансов"""
-    selected_city = request.session.get('selected_city_id')
+    selected_city = get_selected_city_id(request)
     
     # Фильтрация по дате
     date_str = request.GET.get('date')
@@ -194,7 +225,7 @@ def schedule(request):
 
 def cinema_list(request):
     """Список кинотеатров"""
-    selected_city = request.session.get('selected_city_id')
+    selected_city = get_selected_city_id(request)
     
     cinemas = Cinema.objects.filter(is_active=True)
     if selected_city:
@@ -228,11 +259,7 @@ def cinema_detail(request, pk):
 
 def promotion_list(request):
     """Список акций"""
-    promotions = Promotion.objects.filter(
-        is_active=True,
-        start_date__lte=timezone.now().date(),
-        end_date__gte=timezone.now().date()
-    )
+    promotions = active_promotions()
     
     context = {
         'promotions': promotions,
@@ -260,6 +287,7 @@ def rules(request):
     return render(request, 'cinema/rules.html', context)
 
 
+@rate_limit('register', key='ip')
 def register(request):
     """Регистрация пользователя"""
     if request.user.is_authenticated:
@@ -281,6 +309,7 @@ def register(request):
     return render(request, 'cinema/register.html', context)
 
 
+@rate_limit('login', key='ip')
 def user_login(request):
     """Вход пользователя"""
     if request.user.is_authenticated:
@@ -379,6 +408,24 @@ def my_tickets(request):
     return render(request, 'cinema/my_tickets.html', context)
 
 
+@login_required
+def eticket(request, pk):
+    """Электронный билет (PNG с QR-кодом)"""
+    ticket = get_object_or_404(
+        Ticket.objects.select_related('showtime__movie', 'showtime__hall__cinema'),
+        pk=pk,
+        user=request.user,
+    )
+    name = get_eticket(ticket)
+    if name is None:
+        raise Http404('Билет отменен')
+    response = FileResponse(eticket_storage().open(name), content_type='image/png')
+    if request.GET.get('download'):
+        response['Content-Disposition'] = f'attachment; filename="ticket-{ticket.pk}.png"'
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
 @login_required
 def my_reviews(request):
     """Мои отзывы"""
@@ -396,11 +443,14 @@ def delete_review(request, pk):
     review = get_object_or_404(Review, pk=pk, user=request.user)
     movie_pk = review.movie.pk
     review.delete()
+    refresh_rating_summaries([movie_pk])
+    pin_to_primary(request)
     messages.success(request, 'Отзыв успешно удален.')
     return redirect('cinema:movie_detail', pk=movie_pk)
 
 
 @login_required
+@rate_limit('book_ticket', methods=('GET', 'POST'))
 def book_ticket(request, pk):
     """Бронирование билета"""
     showtime = get_object_or_404(ShowTime, pk=pk)
@@ -410,6 +460,12 @@ def book_ticket(request, pk):
         messages.error(request, 'Невозможно забронировать билет на прошедший сеанс.')
         return redirect('cinema:schedule')
     
+    # На популярный сеанс - только по пропуску из очереди
+    queued = requires_queue(showtime)
+    pass_position = get_pass(request, showtime.pk, request.user.pk) if queued else None
+    if queued and pass_position is None:
+        return redirect('cinema:waiting_room', pk=pk)
+    
     if request.method == 'POST':
         row = int(request.POST.get('row'))
         seat = int(request.POST.get('seat'))
@@ -419,45 +475,78 @@ def book_ticket(request, pk):
             messages.error(request, 'Это место уже занято.')
             return redirect('cinema:book_ticket', pk=pk)
         
-        # Создаем билет
-        ticket = Ticket.objects.create(
-            showtime=showtime,
-            user=request.user,
-            row=row,
-            seat=seat,
-            price=showtime.price,
-            status='paid'
-        )
+        if queued and not use_pass(showtime.pk, pass_position):
+            messages.error(request, 'Лимит покупок по пропуску исчерпан. Встаньте в очередь снова.')
+            return revoke_pass(redirect('cinema:waiting_room', pk=pk), showtime.pk)
+        
+        # Цена зависит от заполненности зала на момент покупки
+        booked = showtime.tickets.filter(status__in=['booked', 'paid']).count()
+        
+        # Создаем билет; письмо отправит обработчик очереди после ответа
+        with transaction.atomic():
+            ticket = Ticket.objects.create(
+                showtime=showtime,
+                user=request.user,
+                row=row,
+                seat=seat,
+                price=get_price_table(showtime).price(booked),
+                status='paid'
+            )
+            log_created(ticket, request.user)
+            enqueue(send_ticket_confirmation, ticket.pk)
+        invalidate_profile(request.user.pk)
+        pin_to_primary(request)
         
         messages.success(request, f'Билет успешно куплен! Ряд {row}, место {seat}')
         return redirect('cinema:my_tickets')
     
-    # Получаем занятые места
-    booked_seats = Ticket.objects.filter(
-        showtime=showtime,
-        status__in=['booked', 'paid']
-    ).values_list('row', 'seat')
-    
-    # Создаем схему зала
-    seats = []
-    for row in range(1, showtime.hall.rows + 1):
-        row_seats = []
-        for seat in range(1, showtime.hall.seats_per_row + 1):
-            is_booked = (row, seat) in booked_seats
-            row_seats.append({
-                'row': row,
-                'seat': seat,
-                'is_booked': is_booked
-            })
-        seats.append(row_seats)
+    # Занятые места - из кэшированных масок сеанса
+    occupancy = get_occupancy(showtime)
     
     context = {
         'showtime': showtime,
-        'seats': seats,
+        'seats': seat_grid(occupancy),
+        'best_seat': best_block(occupancy, 1),
+        'seat_version': occupancy.version,
+        'current_price': get_price_table(showtime).price(occupancy.booked),
     }
     return render(request, 'cinema/book_ticket.html', context)
 
 
+@login_required
+def waiting_room(request, pk):
+    """Очередь на бронирование популярного сеанса"""
+    showtime = get_object_or_404(ShowTime.objects.select_related('movie', 'hall__cinema'), pk=pk)
+    
+    if showtime.start_time <= timezone.now():
+        messages.error(request, 'Невозможно забронировать билет на прошедший сеанс.')
+        return redirect('cinema:schedule')
+    if not requires_queue(showtime):
+        return redirect('cinema:book_ticket', pk=pk)
+    
+    # Номер из cookie сохраняется при обновлении страницы
+    position = get_position(request, showtime.pk, request.user.pk)
+    status = queue_status(showtime.pk, position) if position else None
+    # Очередь может быть вытеснена из кэша сразу после выдачи номера -
+    # тогда встаем еще раз, а если не вышло, страница повторит попытку
+    for _ in range(2):
+        if status is not None:
+            break
+        position = join_queue(showtime.pk, showtime.admission_rate)
+        status = queue_status(showtime.pk, position)
+    if status is None:
+        return render(request, 'cinema/waiting_room.html', {'showtime': showtime}, status=503)
+    if status.admitted:
+        return grant_pass(redirect('cinema:book_ticket', pk=pk), showtime.pk, request.user.pk, position)
+    
+    context = {
+        'showtime': showtime,
+        'status': status,
+    }
+    response = render(request, 'cinema/waiting_room.html', context)
+    return remember_position(response, showtime.pk, request.user.pk, position)
+
+
 @login_required
 def cancel_ticket(request, pk):
     """Отмена билета"""
@@ -479,8 +568,10 @@ def cancel_ticket(request, pk):
         messages.error(request, 'Невозможно отменить билет менее чем за 1 час до сеанса.')
         return redirect('cinema:my_tickets')
     
-    ticket.status = 'cancelled'
-    ticket.save()
+    with transaction.atomic():
+        ticket.status = 'cancelled'
+        ticket.save()
+        log_status(ticket, request.user)
     messages.success(request, f'Билет #{ticket.id} успешно отменен. Возврат средств будет произведен в течение 3-5 рабочих дней.')
     return redirect('cinema:my_tickets')
 
@@ -530,63 +621,105 @@ def staff_seats(request, showtime_id):
     showtime = get_object_or_404(ShowTime, pk=showtime_id)
     
     # Получаем занятые места
-    booked_tickets = Ticket.objects.filter(
-        showtime=showtime,
-        status__in=['booked', 'paid']
-    ).select_related('user')
-    
-    # Создаем схему зала с информацией о билетах
-    seats = []
-    for row in range(1, showtime.hall.rows + 1):
-        row_seats = []
-        for seat in range(1, showtime.hall.seats_per_row + 1):
-            ticket = booked_tickets.filter(row=row, seat=seat).first()
-            row_seats.append({
-                'row': row,
-                'seat': seat,
-                'ticket': ticket,
-                'is_booked': ticket is not None
-            })
-        seats.append(row_seats)
+    booked_tickets = {
+        (ticket.row, ticket.seat): ticket
+        for ticket in Ticket.objects.filter(
+            showtime=showtime,
+            status__in=['booked', 'paid']
+        ).select_related('user')
+    }
+    occupancy = get_occupancy(showtime)
     
     context = {
         'showtime': showtime,
-        'seats': seats,
-        'available_seats': showtime.get_available_seats(),
+        'seats': seat_grid(occupancy, booked_tickets),
+        'available_seats': occupancy.available,
         'total_seats': showtime.hall.total_seats,
     }
     return render(request, 'cinema/staff/seats.html', context)
 
 
+@staff_required
+def staff_checkin(request):
+    """Проверка билетов на входе в зал"""
+    today = timezone.now().date()
+    showtimes = ShowTime.objects.filter(
+        start_time__date=today,
+        is_active=True
+    ).select_related('movie', 'hall__cinema').order_by('start_time')
+
+    showtime = None
+    if request.GET.get('showtime', '').isdigit():
+        showtime = get_object_or_404(ShowTime, pk=request.GET['showtime'])
+
+    context = {
+        'showtimes': showtimes,
+        'showtime': showtime,
+    }
+    if showtime:
+        tickets = showtime.tickets.filter(status='paid')
+        context['paid_count'] = tickets.count()
+        context['checked_in_count'] = tickets.filter(checked_in_at__isnull=False).count()
+    return render(request, 'cinema/staff/checkin.html', context)
+
+
 @staff_required
 def staff_reviews(request):
-    """Панель модерации отзывов для сотрудников"""
-    status_filter = request.GET.get('status', 'all')
-    
-    reviews = Review.objects.all().select_related('user', 'movie').order_by('-created_at')
+    """Очередь модерации отзывов для сотрудников"""
+    status_filter = request.GET.get('status', 'pending')
     
+    reviews = Review.objects.select_related('user', 'movie')
     if status_filter == 'pending':
         reviews = reviews.filter(is_approved=False)
     elif status_filter == 'approved':
         reviews = reviews.filter(is_approved=True)
     
+    cursor = request.GET.get('after')
+    reviews, next_cursor = moderation_page(reviews, cursor)
+    
     context = {
         'reviews': reviews,
         'status_filter': status_filter,
         'pending_count': Review.objects.filter(is_approved=False).count(),
+        'next_cursor': next_cursor,
+        'is_first_page': not cursor,
     }
     return render(request, 'cinema/staff/reviews.html', context)
 
 
+@staff_required
+def staff_reviews_bulk(request):
+    """Массовое одобрение, отклонение или удаление отзывов"""
+    back = request.POST.get('next')
+    # Возврат только на страницы этого сайта
+    if not back or not url_has_allowed_host_and_scheme(
+        back, allowed_hosts={request.get_host()}, require_https=request.is_secure()
+    ):
+        back = 'cinema:staff_reviews'
+    if request.method != 'POST':
+        messages.error(request, 'Неверный метод запроса.')
+        return redirect('cinema:staff_reviews')
+    
+    action = request.POST.get('action')
+    review_ids = [int(pk) for pk in request.POST.getlist('reviews') if pk.isdigit()]
+    if action not in BULK_ACTIONS or not review_ids:
+        messages.warning(request, 'Выберите отзывы и действие.')
+        return redirect(back)
+    
+    count = apply_bulk_action(action, review_ids)
+    pin_to_primary(request)
+    messages.success(request, f'Отзывов {BULK_ACTIONS[action]}: {count}.')
+    return redirect(back)
+
+
 @staff_required
 def toggle_review_approval(request, pk):
     """Одобрение/отклонение отзыва"""
     review = get_object_or_404(Review, pk=pk)
-    review.is_approved = not review.is_approved
-    review.save()
+    action = 'reject' if review.is_approved else 'approve'
+    apply_bulk_action(action, [review.pk])
     
-    status = 'одобрен' if review.is_approved else 'отклонен'
-    messages.success(request, f'Отзыв {status}.')
+    messages.success(request, f'Отзыв {"одобрен" if action == "approve" else "отклонен"}.')
     
     return redirect(request.META.get('HTTP_REFERER', 'cinema:staff_dashboard'))
 
@@ -596,7 +729,7 @@ def staff_delete_review(request, pk):
     """Удаление некорректного отзыва сотрудником"""
     review = get_object_or_404(Review, pk=pk)
     movie_title = review.movie.title
-    review.delete()
+    apply_bulk_action('delete', [review.pk])
     messages.success(request, f'Отзыв к фильму "{movie_title}" удален.')
     return redirect(request.META.get('HTTP_REFERER', 'cinema:staff_reviews'))
 
@@ -645,6 +778,7 @@ def admin_dashboard(request):
         'today_tickets': today_tickets,
         'recent_tickets': recent_tickets,
         'pending_reviews': pending_reviews,
+        'session_metrics': session_metrics.snapshot(),
     }
     return render(request, 'cinema/admin/dashboard.html', context)
 
@@ -786,6 +920,79 @@ def admin_showtime_create(request):
     return render(request, 'cinema/admin/showtime_form.html', context)
 
 
+@admin_required
+def admin_showtime_autofill(request):
+    """Автозаполнение дня зала сеансами без пересечений"""
+    if request.method == 'POST':
+        form = ShowTimeAutofillForm(request.POST)
+        if form.is_valid():
+            hall = form.cleaned_data['hall']
+            with transaction.atomic():
+                # Блокируем зал, чтобы параллельное заполнение не создало пересечений
+                Hall.objects.select_for_update().get(pk=hall.pk)
+                showtimes = autofill_day(
+                    hall,
+                    form.cleaned_data['date'],
+                    list(form.cleaned_data['movies']),
+                    form.cleaned_data['price'],
+                    opening=form.cleaned_data['opening_time'],
+                    closing=form.cleaned_data['closing_time'],
+                )
+                ShowTime.objects.bulk_create(showtimes)
+            if showtimes:
+                messages.success(request, f'Создано сеансов: {len(showtimes)}')
+            else:
+                messages.warning(request, 'Свободного времени в зале не найдено.')
+            return redirect('cinema:admin_showtimes')
+    else:
+        form = ShowTimeAutofillForm()
+    
+    context = {
+        'form': form,
+        'title': 'Автозаполнение дня',
+    }
+    return render(request, 'cinema/admin/showtime_form.html', context)
+
+
+@admin_required
+def admin_showtime_import(request):
+    """Пакетный импорт расписания из CSV/JSON"""
+    errors = []
+    skipped = []
+    if request.method == 'POST':
+        form = ShowTimeImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                result = import_schedule(
+                    parse_rows(form.get_data()),
+                    skip_conflicts=form.cleaned_data['skip_conflicts'],
+                    dry_run=form.cleaned_data['dry_run'],
+                )
+            except ScheduleImportError as e:
+                errors = e.errors
+            except (ValueError, UnicodeDecodeError) as e:
+                errors = [f'Не удалось разобрать файл: {e}']
+            else:
+                skipped = result.skipped
+                if form.cleaned_data['dry_run']:
+                    messages.info(request, f'Проверка пройдена: {len(result.showtimes)} сеансов, пропущено {len(skipped)}.')
+                else:
+                    messages.success(request, f'Импортировано сеансов: {result.created}, пропущено: {len(skipped)}.')
+                    if not skipped:
+                        return redirect('cinema:admin_showtimes')
+    else:
+        form = ShowTimeImportForm()
+    
+    context = {
+        'form': form,
+        'errors': errors[:200],
+        'errors_total': len(errors),
+        'skipped': skipped[:200],
+        'skipped_total': len(skipped),
+    }
+    return render(request, 'cinema/admin/showtime_import.html', context)
+
+
 @admin_required
 def admin_showtime_edit(request, pk):
     """Редактирование сеанса"""
@@ -946,6 +1153,7 @@ def admin_promotions(request):
     
     context = {
         'promotions': promotions,
+        'active_ids': {promotion.id for promotion in active_promotions()},
     }
     return render(request, 'cinema/admin/promotions.html', context)
 
@@ -1166,6 +1374,7 @@ def admin_user_delete(request, pk):
 
 
 @admin_required
+@read_replica
 def admin_analytics(request):
     """Аналитика и отчеты"""
     today = timezone.now().date()
@@ -1279,8 +1488,24 @@ def admin_ticket_cancel(request, pk):
         messages.warning(request, 'Билет уже отменен.')
     else:
         old_status = ticket.get_status_display()
-        ticket.status = 'cancelled'
-        ticket.save()
+        with transaction.atomic():
+            ticket.status = 'cancelled'
+            ticket.save()
+            log_status(ticket, request.user)
         messages.success(request, f'Билет #{ticket.id} пользователя {ticket.user.username} успешно отменен! (был: {old_status})')
     
     return redirect('cinema:admin_tickets')
+
+
+@admin_required
+def admin_ticket_history(request, pk):
+    """История билета по журналу событий"""
+    ticket = get_object_or_404(
+        Ticket.objects.select_related('user', 'showtime__movie', 'showtime__hall__cinema', 'checked_in_by'),
+        pk=pk
+    )
+    context = {
+        'ticket': ticket,
+        'events': ticket_timeline(ticket.pk),
+    }
+    return render(request, 'cinema/admin/ticket_history.html', context)
@@ -0,0 +1,155 @@
+"""
+Виртуальная очередь на бронирование популярных сеансов.
+
+Если у сеанса задана пропускная способность (``ShowTime.admission_rate``,
+зрителей в минуту), в ``book_ticket`` попадают только зрители с
+пропуском. Зритель встает в очередь и получает номер (``cache.incr``)
+в подписанной cookie. Номера и счетчики покупок точны, только если incr
+атомарен: ``cinema.cache.DatabaseCache`` (по умолчанию) блокирует строку
+счетчика, Redis считает сам; стандартные DatabaseCache и FileBasedCache
+читают и пишут без блокировки и отклоняются проверкой cinema.E002, а у
+LocMemCache очередь своя в каждом процессе (cinema.W001). Граница
+допуска движется как token bucket: жетоны копятся со скоростью
+admission_rate в минуту, но не больше ``WAITING_ROOM_BURST``, и каждый
+жетон допускает следующий номер.
+
+Допущенный получает пропуск - тоже подписанную cookie - на
+``WAITING_ROOM_PASS_TTL`` секунд и не больше
+``WAITING_ROOM_PASS_TICKETS`` покупок, поэтому вставки билетов сеанса
+ограничены (admission_rate + burst) x WAITING_ROOM_PASS_TICKETS в минуту
+при любом наплыве. В кэше на сеанс - только счетчик номеров, состояние
+ведра и счетчики покупок допущенных; опрос позиции не обращается к базе.
+"""
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+
+QUEUE_PREFIX = 'waiting_room:'
+QUEUE_COOKIE_SALT = 'cinema.waiting_room'
+
+
+@dataclass(frozen=True)
+class QueueStatus:
+    admitted: bool
+    position: int
+    ahead: int = 0
+    wait_seconds: int = 0
+
+
+def _key(showtime_id, name):
+    return f'{QUEUE_PREFIX}{showtime_id}:{name}'
+
+
+def requires_queue(showtime):
+    return bool(showtime.admission_rate)
+
+
+def join_queue(showtime_id, rate, now=None):
+    """Выдать следующий номер очереди сеанса"""
+    now = time.time() if now is None else now
+    timeout = settings.WAITING_ROOM_TIMEOUT
+    bucket_key = _key(showtime_id, 'bucket')
+    # Первый зритель открывает очередь с полным запасом жетонов
+    if not cache.add(bucket_key, (0, settings.WAITING_ROOM_BURST, now, rate), timeout):
+        bucket = cache.get(bucket_key)
+        if bucket is not None and bucket[3] != rate:
+            cache.set(bucket_key, bucket[:3] + (rate,), timeout)
+    tail_key = _key(showtime_id, 'tail')
+    cache.add(tail_key, 0, timeout)
+    return cache.incr(tail_key)
+
+
+def queue_status(showtime_id, position, now=None):
+    """
+    Состояние номера в очереди; None, если очередь сеанса истекла.
+    Заодно пополняет жетоны и сдвигает границу допуска: гонка двух
+    процессов может лишь ненадолго отодвинуть ее назад.
+    """
+    now = time.time() if now is None else now
+    tail_key, bucket_key = _key(showtime_id, 'tail'), _key(showtime_id, 'bucket')
+    found = cache.get_many([tail_key, bucket_key])
+    if bucket_key not in found or position > found.get(tail_key, 0):
+        return None
+
+    head, tokens, updated, rate = found[bucket_key]
+    tokens = min(settings.WAITING_ROOM_BURST, tokens + max(now - updated, 0) * rate / 60)
+    admitted = min(int(tokens), found[tail_key] - head)
+    head += admitted
+    cache.set(bucket_key, (head, tokens - admitted, now, rate), settings.WAITING_ROOM_TIMEOUT)
+
+    if position <= head:
+        return QueueStatus(admitted=True, position=position)
+    ahead = position - head
+    return QueueStatus(
+        admitted=False,
+        position=position,
+        ahead=ahead,
+        wait_seconds=int(ahead * 60 / rate),
+    )
+
+
+def use_pass(showtime_id, position):
+    """Учесть покупку по пропуску; False, если лимит пропуска исчерпан"""
+    key = _key(showtime_id, f'used:{position}')
+    cache.add(key, 0, settings.WAITING_ROOM_PASS_TTL)
+    try:
+        return cache.incr(key) <= settings.WAITING_ROOM_PASS_TICKETS
+    except ValueError:
+        # Счетчик вытеснен из кэша между add и incr
+        return True
+
+
+def clear_queue(showtime_id):
+    """Удалить очередь сеанса"""
+    cache.delete_many([_key(showtime_id, 'tail'), _key(showtime_id, 'bucket')])
+
+
+# Номер и пропуск хранятся у зрителя в подписанных cookie, привязанных к
+# пользователю: кэш не растет с длиной очереди
+
+def _read_cookie(request, name, max_age, user_id):
+    value = request.get_signed_cookie(name, default=None, salt=QUEUE_COOKIE_SALT, max_age=max_age)
+    try:
+        owner, position = map(int, (value or '').split(':'))
+    except ValueError:
+        return None
+    return position if owner == user_id else None
+
+
+def _set_cookie(response, name, user_id, position, max_age):
+    response.set_signed_cookie(
+        name,
+        f'{user_id}:{position}',
+        salt=QUEUE_COOKIE_SALT,
+        max_age=max_age,
+        httponly=True,
+        samesite='Lax',
+        secure=settings.SESSION_COOKIE_SECURE,
+    )
+    return response
+
+
+def get_position(request, showtime_id, user_id):
+    return _read_cookie(request, f'queue_{showtime_id}', settings.WAITING_ROOM_TIMEOUT, user_id)
+
+
+def remember_position(response, showtime_id, user_id, position):
+    return _set_cookie(response, f'queue_{showtime_id}', user_id, position, settings.WAITING_ROOM_TIMEOUT)
+
+
+def get_pass(request, showtime_id, user_id):
+    """Номер, по которому выдан действующий пропуск, или None"""
+    return _read_cookie(request, f'queue_pass_{showtime_id}', settings.WAITING_ROOM_PASS_TTL, user_id)
+
+
+def grant_pass(response, showtime_id, user_id, position):
+    """Выдать пропуск вместо номера в очереди"""
+    response.delete_cookie(f'queue_{showtime_id}')
+    return _set_cookie(response, f'queue_pass_{showtime_id}', user_id, position, settings.WAITING_ROOM_PASS_TTL)
+
+
+def revoke_pass(response, showtime_id):
+    response.delete_cookie(f'queue_pass_{showtime_id}')
+    return response
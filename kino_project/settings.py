@@ -3,6 +3,7 @@ Django settings for kino_project project.
 """
 
 from pathlib import Path
+from datetime import time
 import os
 import dj_database_url
 
@@ -93,6 +94,69 @@ else:
         }
     }
 
+# Реплика для чтения (каталог, расписание, аналитика)
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = dj_database_url.config(
+        env='DATABASE_REPLICA_URL',
+        conn_max_age=600,
+        conn_health_checks=True,
+    )
+    # В тестах реплика смотрит в ту же базу, что и default
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['cinema.routers.ReplicaRouter']
+
+# Допустимое отставание реплики (сек.), при превышении чтение идет с основной базы
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', '5'))
+# Как часто перепроверять отставание реплики (сек.)
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', '2'))
+# Сколько секунд после бронирования/отзыва читать только с основной базы
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '15'))
+
+
+# Cache
+# Кэш общий для всех процессов (веб-воркеры, run_worker): в нем версии цен,
+# схем залов и геоиндекса, журнал мест, очередь и счетчики лимитов. По
+# умолчанию - таблица в базе (создается миграцией) с атомарным incr, для
+# нагрузки - Redis:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache, CACHE_LOCATION=redis://...
+# LocMemCache у каждого процесса свой - только для разработки в один процесс.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'cinema.cache.DatabaseCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'kino_cache'),
+    }
+}
+if not CACHE_BACKEND.endswith('RedisCache'):
+    # Redis вытесняет ключи сам, остальным бэкендам нужен запас: при 300
+    # записях (по умолчанию) несвязанные ключи вытесняли бы друг друга
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '100000'))}
+
+# Профили персональной главной - в своем кэше (своя таблица): при
+# переполнении DatabaseCache удаляет треть всех записей, и профили
+# вытесняли бы очередь, версии мест и счетчики лимитов. С Redis -
+# тот же сервер с отдельным префиксом ключей.
+CACHES['profiles'] = {
+    'BACKEND': CACHE_BACKEND,
+    'LOCATION': os.environ.get(
+        'PROFILE_CACHE_LOCATION',
+        CACHES['default']['LOCATION'] if CACHE_BACKEND.endswith('RedisCache') else 'kino_profile_cache'
+    ),
+    'KEY_PREFIX': 'profiles',
+}
+if not CACHE_BACKEND.endswith('RedisCache'):
+    CACHES['profiles']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.environ.get('PROFILE_CACHE_MAX_ENTRIES', '1000000'))
+    }
+
+
+# Sessions
+# Сессии читаются из кэша и пишутся в базу только при изменении
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'cinema.sessions')
+# Порог (мс), после которого операция с сессией пишется в лог как медленная
+SESSION_SLOW_MS = float(os.environ.get('SESSION_SLOW_MS', '50'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -136,6 +200,119 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Загрузки получают хэш содержимого в имени и отдаются с долгим кэшированием
+DEFAULT_FILE_STORAGE = 'cinema.media.FingerprintedStorage'
+# Сжатая копия сохраняется, если она меньше этой доли оригинала
+MEDIA_PRECOMPRESS_RATIO = 0.9
+
+# Варианты изображений: ширины (px), качество, число потоков генерации
+# и пауза (сек) перед повторной генерацией с показа страницы
+IMAGE_VARIANT_WIDTHS = [320, 640, 1024]
+IMAGE_VARIANT_QUALITY = int(os.environ.get('IMAGE_VARIANT_QUALITY', '80'))
+IMAGE_PIPELINE_WORKERS = int(os.environ.get('IMAGE_PIPELINE_WORKERS', '2'))
+IMAGE_VARIANT_RETRY_SECONDS = int(os.environ.get('IMAGE_VARIANT_RETRY_SECONDS', '600'))
+
+# Зеркалирование внешних изображений (poster_url, image_url)
+MIRROR_FETCHER = os.environ.get('MIRROR_FETCHER', 'cinema.mirror.RequestsFetcher')
+MIRROR_WORKERS = int(os.environ.get('MIRROR_WORKERS', '8'))
+MIRROR_TIMEOUT = float(os.environ.get('MIRROR_TIMEOUT', '10'))
+MIRROR_MAX_BYTES = int(os.environ.get('MIRROR_MAX_BYTES', str(10 * 1024 * 1024)))
+
+# Планирование сеансов: уборка зала между сеансами, шаг сетки начала (минуты)
+# и часы работы залов по умолчанию для автозаполнения
+SCHEDULE_CLEANING_MINUTES = int(os.environ.get('SCHEDULE_CLEANING_MINUTES', '15'))
+SCHEDULE_SLOT_MINUTES = int(os.environ.get('SCHEDULE_SLOT_MINUTES', '5'))
+SCHEDULE_OPENING_TIME = time(9, 0)
+SCHEDULE_CLOSING_TIME = time(0, 0)
+
+# Динамические цены: срок хранения скомпилированной таблицы цен сеанса (секунды)
+PRICE_TABLE_TIMEOUT = int(os.environ.get('PRICE_TABLE_TIMEOUT', '3600'))
+
+# Модерация отзывов: отзывов на странице очереди
+REVIEW_MODERATION_PAGE_SIZE = int(os.environ.get('REVIEW_MODERATION_PAGE_SIZE', '50'))
+
+# Предварительная проверка отзывов: порог снятия с публикации, потоки
+# проверки новых отзывов и дополнительные стоп-слова (основы слов)
+REVIEW_SCREENING_THRESHOLD = float(os.environ.get('REVIEW_SCREENING_THRESHOLD', '1.0'))
+REVIEW_SCREENING_WORKERS = int(os.environ.get('REVIEW_SCREENING_WORKERS', '2'))
+REVIEW_SCREENING_STOP_WORDS = []
+
+# Рекомендации "зрители также смотрели": соседей на фильм, минимум общих
+# зрителей, срок хранения списка в кэше (секунды) и период полного пересчета (дни)
+RECOMMENDER_TOP_K = int(os.environ.get('RECOMMENDER_TOP_K', '10'))
+RECOMMENDER_MIN_SUPPORT = int(os.environ.get('RECOMMENDER_MIN_SUPPORT', '2'))
+RECOMMENDER_CACHE_TIMEOUT = int(os.environ.get('RECOMMENDER_CACHE_TIMEOUT', str(24 * 3600)))
+RECOMMENDER_FULL_EVERY_DAYS = int(os.environ.get('RECOMMENDER_FULL_EVERY_DAYS', '7'))
+
+# Персональная главная: срок хранения профилей пользователей (пересчет - ежедневно)
+USER_PROFILE_TIMEOUT = int(os.environ.get('USER_PROFILE_TIMEOUT', str(2 * 24 * 3600)))
+
+# Автоподбор мест: лучший ряд как доля глубины зала от экрана и вес
+# удаления от него относительно удаления от центра ряда
+SEAT_IDEAL_ROW = float(os.environ.get('SEAT_IDEAL_ROW', '0.6'))
+SEAT_ROW_WEIGHT = float(os.environ.get('SEAT_ROW_WEIGHT', '1.0'))
+
+# Живая схема зала (SSE): бэкенд доставки событий между процессами,
+# интервал keepalive (секунды), очередь непрочитанных событий соединения
+# и предел потоков на процесс (каждый держит поток ОС, ~280 КБ; сверх
+# предела страница опрашивает схему зала)
+SEAT_EVENTS_BACKEND = os.environ.get('SEAT_EVENTS_BACKEND', 'cinema.broker.LocalBackend')
+SEAT_EVENTS_KEEPALIVE = float(os.environ.get('SEAT_EVENTS_KEEPALIVE', '20'))
+SEAT_EVENTS_QUEUE_SIZE = int(os.environ.get('SEAT_EVENTS_QUEUE_SIZE', '100'))
+SEAT_EVENTS_MAX_STREAMS = int(os.environ.get('SEAT_EVENTS_MAX_STREAMS', '500'))
+
+# Виртуальная очередь на популярные сеансы: запас жетонов на всплеск,
+# срок пропуска (секунды), покупок по одному пропуску и время жизни очереди
+WAITING_ROOM_BURST = int(os.environ.get('WAITING_ROOM_BURST', '20'))
+WAITING_ROOM_PASS_TTL = int(os.environ.get('WAITING_ROOM_PASS_TTL', '600'))
+WAITING_ROOM_PASS_TICKETS = int(os.environ.get('WAITING_ROOM_PASS_TICKETS', '10'))
+WAITING_ROOM_TIMEOUT = int(os.environ.get('WAITING_ROOM_TIMEOUT', str(6 * 60 * 60)))
+
+# Ограничение частоты запросов: лимиты представлений ('10/m', s/m/h/d;
+# пусто - без лимита) и число доверенных прокси перед приложением (на Railway
+# и Render - 1, иначе все клиенты считаются одним адресом прокси)
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'True') == 'True'
+RATE_LIMITS = {
+    'login': os.environ.get('RATE_LIMIT_LOGIN', '10/m'),
+    'register': os.environ.get('RATE_LIMIT_REGISTER', '5/h'),
+    'book_ticket': os.environ.get('RATE_LIMIT_BOOK_TICKET', '60/m'),
+    'add_review': os.environ.get('RATE_LIMIT_ADD_REVIEW', '10/h'),
+}
+RATE_LIMIT_PROXY_COUNT = int(os.environ.get('RATE_LIMIT_PROXY_COUNT', '0'))
+
+# Фоновые задачи (run_worker): попыток на задачу, задержка первого повтора
+# и предел задержки (секунды), срок, после которого зависшая задача
+# возвращается в очередь, и интервал опроса пустой очереди
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_DELAY = float(os.environ.get('JOB_RETRY_DELAY', '10'))
+JOB_RETRY_MAX_DELAY = float(os.environ.get('JOB_RETRY_MAX_DELAY', '3600'))
+JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', '600'))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', '1'))
+
+# Электронные билеты: закрытый каталог готовых PNG и шрифты с кириллицей
+# (по умолчанию - DejaVu из репозитория, в образе nixpacks системных шрифтов нет)
+ETICKET_ROOT = os.environ.get('ETICKET_ROOT', str(BASE_DIR / 'etickets'))
+ETICKET_FONT = os.environ.get('ETICKET_FONT', str(BASE_DIR / 'cinema' / 'fonts' / 'DejaVuSans.ttf'))
+ETICKET_FONT_BOLD = os.environ.get('ETICKET_FONT_BOLD', str(BASE_DIR / 'cinema' / 'fonts' / 'DejaVuSans-Bold.ttf'))
+
+# Проверка билетов на входе: сколько офлайн-сканов принимается за одну синхронизацию,
+# за сколько минут до начала сеанса и до скольких минут после него пускают
+CHECKIN_SYNC_MAX_SCANS = int(os.environ.get('CHECKIN_SYNC_MAX_SCANS', '1000'))
+CHECKIN_EARLY_MINUTES = int(os.environ.get('CHECKIN_EARLY_MINUTES', '60'))
+CHECKIN_LATE_MINUTES = int(os.environ.get('CHECKIN_LATE_MINUTES', '180'))
+
+# Журнал событий билетов: сколько дней события хранятся в базе и куда уходят в архив
+TICKET_EVENT_RETENTION_DAYS = int(os.environ.get('TICKET_EVENT_RETENTION_DAYS', '365'))
+TICKET_EVENT_ARCHIVE_ROOT = os.environ.get('TICKET_EVENT_ARCHIVE_ROOT', str(BASE_DIR / 'archive' / 'ticket_events'))
+
+# Почта: без настроенного SMTP письма выводятся в консоль
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'False') == 'True'
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'КиноМир <noreply@kinomir.local>')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field